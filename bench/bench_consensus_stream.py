@@ -0,0 +1,120 @@
+"""Benchmark work feeding in fc_consensus on a synthetic pile stream.
+
+Usage:
+    python bench/bench_consensus_stream.py --n-piles 100000 --n-core 4
+    python bench/bench_consensus_stream.py --n-piles 100000 --n-core 4 --stream
+    python bench/bench_consensus_stream.py --n-piles 100000 --n-core 4 --stream --engine=threads
+
+Run each mode in its own process, since maxrss is a high-water mark.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import multiprocessing
+import random
+import resource
+import sys
+import time
+import falcon_kit.mains.consensus as consensus
+
+
+class SyntheticPiles(object):
+    """File-like stand-in for LA4Falcon -H output, generated lazily.
+    """
+
+    def __init__(self, n_piles, n_reads, read_len, seed=42):
+        rng = random.Random(seed)
+        self.n_piles = n_piles
+        self.n_reads = n_reads
+        self.reads = [''.join(rng.choice('ACGT') for _ in range(read_len))
+                      for _ in range(n_reads + 7)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        # multiprocessing closes sys.stdin in each new worker.
+        pass
+
+    def __iter__(self):
+        nr = len(self.reads)
+        for p in range(self.n_piles):
+            for r in range(self.n_reads):
+                yield '{:09d} {}\n'.format(p * self.n_reads + r, self.reads[(p + r) % nr])
+            yield '+ +\n'
+        yield '- -\n'
+
+
+class NullWriter(object):
+    def write(self, s):
+        pass
+
+    def flush(self):
+        pass
+
+
+def maxrss_mb(who):
+    # ru_maxrss is in KB on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+
+def largest_child_mb():
+    """The pool is never joined, so its workers are still alive (and not
+    in RUSAGE_CHILDREN); read their high-water marks from /proc.
+    """
+    peak = maxrss_mb(resource.RUSAGE_CHILDREN)
+    for child in multiprocessing.active_children():
+        try:
+            with open('/proc/{}/status'.format(child.pid)) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak = max(peak, int(line.split()[1]) / 1024.0)
+        except IOError:
+            pass
+    return peak
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-piles', type=int, default=100000)
+    parser.add_argument('--n-reads', type=int, default=11,
+                        help='reads per pile, including the seed')
+    parser.add_argument('--read-len', type=int, default=1000)
+    parser.add_argument('--n-core', type=int, default=4)
+    parser.add_argument('--engine', choices=['processes', 'threads'], default='processes')
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--max-pending', type=int, default=0)
+    args = parser.parse_args(argv[1:])
+
+    cargs = consensus.parse_args([
+        'fc_consensus', '--n-core={}'.format(args.n_core),
+        '--engine={}'.format(args.engine),
+        '--min-n-read=2', '--min-cov-aln=0', '-v=3',
+        '--max-pending={}'.format(args.max_pending),
+    ] + (['--stream'] if args.stream else []))
+
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin = SyntheticPiles(args.n_piles, args.n_reads, args.read_len)
+    sys.stdout = NullWriter()
+    start = time.time()
+    try:
+        consensus.run(cargs)
+    finally:
+        sys.stdin, sys.stdout = stdin, stdout
+    elapsed = time.time() - start
+
+    print('mode={} engine={} n_core={} piles={} elapsed={:.1f}s seeds/sec={:.0f}'.format(
+        'stream' if args.stream else 'slurp', args.engine, args.n_core, args.n_piles,
+        elapsed, args.n_piles / elapsed))
+    print('maxrss parent={:.1f}MB largest-child={:.1f}MB'.format(
+        maxrss_mb(resource.RUSAGE_SELF), largest_child_mb()))
+
+
+if __name__ == '__main__':
+    main()
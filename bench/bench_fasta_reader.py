@@ -0,0 +1,138 @@
+"""Benchmark reading a FASTA file of preads, with the original
+FastaReader (open_fasta_reader) and with the bytes-based open_fasta_seqs(),
+memory-mapped and streamed; and scanning just the lengths (fasta_lengths()).
+
+Usage:
+    python bench/bench_fasta_reader.py                        # a synthetic 2 GB file
+    python bench/bench_fasta_reader.py --size-mb 4096 --width 80
+    python bench/bench_fasta_reader.py --fasta preads4falcon.fasta
+
+Each reader must yield as many records and bases; with --check, the same
+names and sequences, too (checked after the timing).
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import falcon_kit.FastaReader as FastaReader
+
+
+def write_synthetic_fasta(fn, size_mb, width, seed=42):
+    """Write reads of 5-30 kb, wrapped at 'width' (0 for one line), until
+    the file is 'size_mb' MB.
+    """
+    rng = random.Random(seed)
+    pool = ''.join(rng.choice('ACGT') for _ in range(1 << 20))
+    size = 0
+    i = 0
+    with open(fn, 'w') as stream:
+        while size < size_mb * 1e6:
+            length = rng.randint(5000, 30000)
+            start = rng.randint(0, len(pool) - length)
+            seq = pool[start:start + length]
+            if width:
+                seq = '\n'.join(seq[pos:pos + width] for pos in range(0, length, width))
+            rec = '>{:09d}\n{}\n'.format(i, seq)
+            stream.write(rec)
+            size += len(rec)
+            i += 1
+
+
+def old_reader(fn):
+    with FastaReader.open_fasta_reader(fn, log=lambda msg: None) as reader:
+        for r in reader:
+            yield (r.name, r.sequence)
+
+
+def mmap_reader(fn):
+    with FastaReader.open_fasta_seqs(fn, log=lambda msg: None) as reader:
+        for r in reader:
+            yield r
+
+
+def view_reader(fn):
+    with FastaReader.open_fasta_seqs(fn, as_view=True, log=lambda msg: None) as reader:
+        for r in reader:
+            yield r
+
+
+def stream_reader(fn):
+    with open(fn, 'rb') as stream:
+        for r in FastaReader.yield_fasta_seqs(stream, fn, log=lambda msg: None):
+            yield r
+
+
+def lengths_reader(fn):
+    lens = FastaReader.fasta_lengths(fn)
+    return len(lens), int(lens.sum())
+
+
+def bench(name, reader, fn):
+    start = time.time()
+    n = 0
+    total = 0
+    if reader is lengths_reader:
+        n, total = reader(fn)
+    else:
+        for (name_, seq) in reader(fn):
+            n += 1
+            total += len(seq)
+    elapsed = time.time() - start
+    size_mb = os.path.getsize(fn) / 1e6
+    print('{:>8} {:9,d} records {:15,d} bp {:8.2f}s {:8.1f} MB/s'.format(
+        name, n, total, elapsed, size_mb / elapsed))
+    return (n, total)
+
+
+def checksum(reader, fn):
+    digest = hashlib.md5()
+    for (name, seq) in reader(fn):
+        digest.update(name)
+        digest.update(seq)
+    return digest.hexdigest()
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fasta',
+                        help='FASTA file to read (else write a synthetic one)')
+    parser.add_argument('--size-mb', type=int, default=2048,
+                        help='size of the synthetic file')
+    parser.add_argument('--width', type=int, default=0,
+                        help='line width of the synthetic file (0: each sequence on one line)')
+    parser.add_argument('--readers', default='old,mmap,view,stream,lengths',
+                        help='comma-separated readers to time')
+    parser.add_argument('--check', action='store_true',
+                        help='also compare the names and sequences of the readers')
+    args = parser.parse_args(argv[1:])
+    readers = dict(old=old_reader, mmap=mmap_reader, view=view_reader, stream=stream_reader,
+                   lengths=lengths_reader)
+    tmpdir = None
+    fn = args.fasta
+    if not fn:
+        tmpdir = tempfile.mkdtemp()
+        fn = os.path.join(tmpdir, 'synthetic.fasta')
+        write_synthetic_fasta(fn, args.size_mb, args.width)
+    try:
+        names = args.readers.split(',')
+        counts = set(bench(name, readers[name], fn) for name in names)
+        assert len(counts) == 1, 'The readers differ.'
+        if args.check:
+            digests = set(checksum(readers[name], fn) for name in names if name != 'lengths')
+            assert len(digests) == 1, 'The readers differ.'
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
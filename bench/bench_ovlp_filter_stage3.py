@@ -0,0 +1,112 @@
+"""Benchmark best-n selection in fc_ovlp_filter stage 3 on a synthetic,
+repeat-heavy LA4Falcon -mo dump.
+
+Usage:
+    python bench/bench_ovlp_filter_stage3.py
+    python bench/bench_ovlp_filter_stage3.py --n-reads 20000 --n-repeat-ovlps 50000 --bestn 10
+
+'reference' is the original algorithm (a full sort of each read end's
+overlaps), for comparison; both must give the same output.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import random
+import sys
+import time
+import falcon_kit.mains.ovlp_filter as ovlp_filter
+
+
+def synthetic_lines(n_reads, n_ovlps, repeat_fraction, n_repeat_ovlps, seed=42):
+    """Return LA4Falcon -mo lines, sorted by q_id. A 'repeat_fraction' of
+    the reads have 'n_repeat_ovlps' overlaps each, mostly partial ones.
+    """
+    rng = random.Random(seed)
+    lens = [rng.randint(3000, 20000) for _ in range(n_reads)]
+    lines = []
+    for q_id in range(n_reads):
+        q_l = lens[q_id]
+        repeat = rng.random() < repeat_fraction
+        for _ in range(n_repeat_ovlps if repeat else n_ovlps):
+            t_id = rng.randrange(n_reads)
+            t_l = lens[t_id]
+            ovlp_len = rng.randint(500, min(q_l, t_l))
+            if rng.random() < 0.5:
+                q_s, q_e = 0, ovlp_len
+            else:
+                q_s, q_e = q_l - ovlp_len, q_l
+            if repeat and rng.random() < 0.9:
+                # Repeat hits end inside the target, so m_range is large.
+                t_s = rng.randint(0, t_l - ovlp_len)
+            else:
+                t_s = rng.choice([0, t_l - ovlp_len])
+            lines.append('%09d %09d %d %.2f 0 %d %d %d %d %d %d %d overlap' % (
+                q_id, t_id, -ovlp_len, rng.uniform(88, 100), q_s, q_e, q_l,
+                rng.randint(0, 1), t_s, t_s + ovlp_len, t_l))
+    return lines
+
+
+def reference_stage3(lines, min_len, bestn):
+    """The original filter_stage3(), without ignore/contained sets.
+    """
+    ovlp_output = []
+    by_q = {}
+    order = []
+    for l in lines:
+        l = l.split()
+        if l[0] not in by_q:
+            by_q[l[0]] = ([], [])
+            order.append(l[0])
+        idt = float(l[3])
+        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
+        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
+        if idt < 90:
+            continue
+        if q_l < min_len or t_l < min_len:
+            continue
+        if q_s == 0:
+            by_q[l[0]][0].append((int(l[2]), t_l - (t_e - t_s), l))
+        elif q_e == q_l:
+            by_q[l[0]][1].append((int(l[2]), t_l - (t_e - t_s), l))
+    for q_id in order:
+        for end in by_q[q_id]:
+            end.sort()
+            for i in range(len(end)):
+                score, m_range, ovlp = end[i]
+                ovlp_output.append(ovlp)
+                if i >= bestn and m_range > 1000:
+                    break
+    return ovlp_output
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-reads', type=int, default=10000)
+    parser.add_argument('--n-ovlps', type=int, default=30,
+                        help='overlaps per ordinary read')
+    parser.add_argument('--repeat-fraction', type=float, default=0.01)
+    parser.add_argument('--n-repeat-ovlps', type=int, default=20000,
+                        help='overlaps per repeat read')
+    parser.add_argument('--min-len', type=int, default=2500)
+    parser.add_argument('--bestn', type=int, default=10)
+    args = parser.parse_args(argv[1:])
+
+    lines = synthetic_lines(args.n_reads, args.n_ovlps, args.repeat_fraction, args.n_repeat_ovlps)
+    print('{} overlap lines'.format(len(lines)))
+
+    beg = time.time()
+    expected = reference_stage3(lines, args.min_len, args.bestn)
+    print('reference: {:.2f}s, {} kept'.format(time.time() - beg, len(expected)))
+
+    beg = time.time()
+    got = ovlp_filter.filter_stage3(lambda: iter(lines), 0, 0, 0, args.min_len,
+                                    set(), set(), args.bestn)
+    print('filter_stage3: {:.2f}s, {} kept'.format(time.time() - beg, len(got)))
+    assert expected == got
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark the transitive reduction in fc_ovlp_to_graph
+(StringGraph.mark_tr_edges) on a synthetic, repeat-rich string graph.
+
+Usage:
+    python bench/bench_ovlp_to_graph_tr.py
+    python bench/bench_ovlp_to_graph_tr.py --n-core 8
+    python bench/bench_ovlp_to_graph_tr.py --n-reads 50000 --n-repeat-reads 200 --repeat-degree 2000
+
+'reference' is the original algorithm (re-sorting a node's out-edges by
+length each time they are visited), for comparison; both must reduce the
+same edges.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import falcon_kit.mains.ovlp_to_graph as ovlp_to_graph
+
+
+def synthetic_graph(n_reads, coverage, n_repeat_reads, repeat_degree, seed=42):
+    """Return a frozen StringGraph of reads tiling a genome, each
+    overlapping the next 'coverage' reads, plus 'n_repeat_reads' repeat
+    reads overlapping 'repeat_degree' random reads each.
+    """
+    rng = random.Random(seed)
+    sg = ovlp_to_graph.StringGraph()
+    reads = [sg.add_read('%09d' % i) for i in range(n_reads)]
+    starts = sorted(rng.randint(0, 300 * n_reads) for _ in range(n_reads))
+
+    def add(f, g, length):
+        # f.E -> g.E, and its reverse g.B -> f.B
+        sg.add_edge(2 * f + 1, 2 * g + 1, label=(g, 0, length), length=length,
+                    score=-length, identity=99.0)
+        sg.add_edge(2 * g, 2 * f, label=(f, length, 0), length=length,
+                    score=-length, identity=99.0)
+    for i in range(n_reads):
+        for j in range(i + 1, min(i + 1 + coverage, n_reads)):
+            add(reads[i], reads[j], max(1, starts[j] - starts[i]))
+    for i in rng.sample(range(n_reads), n_repeat_reads):
+        for j in rng.sample(range(n_reads), repeat_degree):
+            if i != j:
+                add(reads[i], reads[j], rng.randint(1, 10000))
+    sg.freeze()
+    return sg
+
+
+def reference_tr(sg):
+    """The original mark_tr_edges(); return the eliminated edges.
+    """
+    FUZZ = 500
+    VACANT, INPLAY, ELIMINATED = 0, 1, 2
+    n_mark = bytearray(sg.n_nodes)
+    eliminated = []
+
+    def sort_out_edges_by_length(v):
+        out_edges = sg.out_edges_of(v).copy()
+        out_edges = out_edges[np.argsort(sg.length[out_edges], kind='mergesort')]
+        return out_edges.tolist(), sg.dst[out_edges].tolist(), sg.length[out_edges].tolist()
+
+    for v in sg.nodes.tolist():
+        out_edges, out_nodes, out_lens = sort_out_edges_by_length(v)
+        if len(out_edges) == 0:
+            continue
+        for w in out_nodes:
+            n_mark[w] = INPLAY
+        max_len = out_lens[-1] + FUZZ
+        for (w, e_len) in zip(out_nodes, out_lens):
+            if n_mark[w] == INPLAY:
+                _, w_out_nodes, w_out_lens = sort_out_edges_by_length(w)
+                for (x, e2_len) in zip(w_out_nodes, w_out_lens):
+                    if e2_len + e_len < max_len:
+                        if n_mark[x] == INPLAY:
+                            n_mark[x] = ELIMINATED
+        for w in out_nodes:
+            _, w_out_nodes, w_out_lens = sort_out_edges_by_length(w)
+            if len(w_out_nodes) > 0:
+                x = w_out_nodes[0]
+                if n_mark[x] == INPLAY:
+                    n_mark[x] = ELIMINATED
+            for (x, e2_len) in zip(w_out_nodes, w_out_lens):
+                if e2_len < FUZZ:
+                    if n_mark[x] == INPLAY:
+                        n_mark[x] = ELIMINATED
+        for (e, w) in zip(out_edges, out_nodes):
+            if n_mark[w] == ELIMINATED:
+                eliminated.append(e)
+            n_mark[w] = VACANT
+    return eliminated
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-reads', type=int, default=20000)
+    parser.add_argument('--coverage', type=int, default=20,
+                        help='overlaps per ordinary read')
+    parser.add_argument('--n-repeat-reads', type=int, default=100)
+    parser.add_argument('--repeat-degree', type=int, default=1000,
+                        help='overlaps per repeat read')
+    parser.add_argument('--n-core', type=int, default=4,
+                        help='workers for the parallel run of mark_tr_edges')
+    args = parser.parse_args(argv[1:])
+
+    sg = synthetic_graph(args.n_reads, args.coverage, args.n_repeat_reads, args.repeat_degree)
+    print('{} nodes, {} edges'.format(sg.n_nodes, len(sg.src)))
+
+    beg = time.time()
+    expected = sg.reduce_edges(np.array(reference_tr(sg), dtype=np.int64))
+    expected = np.flatnonzero(sg.edge_mask([expected]))
+    print('reference: {:.2f}s, {} reduced'.format(time.time() - beg, len(expected)))
+
+    sg.e_reduce[:] = False
+    beg = time.time()
+    sg.mark_tr_edges()
+    got = np.flatnonzero(sg.e_reduce)
+    print('mark_tr_edges: {:.2f}s, {} reduced'.format(time.time() - beg, len(got)))
+    assert np.array_equal(expected, got)
+
+    sg.e_reduce[:] = False
+    beg = time.time()
+    sg.mark_tr_edges(args.n_core)
+    got = np.flatnonzero(sg.e_reduce)
+    print('mark_tr_edges(n_core={}): {:.2f}s, {} reduced'.format(
+        args.n_core, time.time() - beg, len(got)))
+    assert np.array_equal(expected, got)
+
+
+if __name__ == '__main__':
+    main()
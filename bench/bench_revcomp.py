@@ -0,0 +1,51 @@
+"""Benchmark reverse-complementing a sequence, per base through a dict
+(as graph_to_contig used to) and with falcon_kit.util.seq.revcomp().
+
+Usage:
+    python bench/bench_revcomp.py
+    python bench/bench_revcomp.py --length 50000000
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import random
+import sys
+import time
+from falcon_kit.util.seq import revcomp
+
+RCMAP = dict(zip("ACGTacgtNn-", "TGCAtgcaNn-"))
+
+
+def revcomp_per_base(seq):
+    return "".join([RCMAP[c] for c in seq[::-1]])
+
+
+def bench(name, func, seq, genome):
+    start = time.time()
+    result = func(seq)
+    elapsed = time.time() - start
+    rate = len(seq) / elapsed / 1e6
+    print('{:>10} {:8.3f}s {:10.1f} Mb/s  ({:.1f}s for {:.0f} Gb)'.format(
+        name, elapsed, rate, genome / (rate * 1e6), genome / 1e9))
+    return result
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=10000000,
+                        help='length of the random sequence')
+    parser.add_argument('--genome', type=float, default=3e9,
+                        help='extrapolate the time to this many bases')
+    args = parser.parse_args(argv[1:])
+    rng = random.Random(42)
+    seq = ''.join(rng.choice('ACGT') for _ in range(args.length))
+    expected = bench('per-base', revcomp_per_base, seq, args.genome)
+    got = bench('translate', revcomp, seq, args.genome)
+    assert got == expected
+
+
+if __name__ == '__main__':
+    main()
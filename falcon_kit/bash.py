@@ -244,9 +244,11 @@ def script_run_DB2Falcon(config, preads4falcon_fn, preads_db):
     params.update(locals())
     script = """\
 # Given preads.db,
-# write preads4falcon.fasta (implicitly) in CWD.
+# write preads4falcon.fasta (implicitly) in CWD,
+# and its index, preads4falcon.fasta.fai.
 time DB2Falcon -U {preads_db}
 [ -f preads4falcon.fasta ] || exit 1
+time python -m falcon_kit.mains.fasta_index preads4falcon.fasta
 """.format(**params)
     return script
 
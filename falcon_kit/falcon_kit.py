@@ -2,7 +2,8 @@ from __future__ import absolute_import
 
 __all__ = [
     'kup', 'DWA', 'falcon',
-    'KmerLookup', 'KmerMatch', 'AlnRange', 'ConsensusData',
+    'KmerLookup', 'KmerMatch', 'AlnRange', 'ConsensusData', 'ConsensusBatchData',
+    'MsaWorkspace', 'KmerIndex',
     'Alignment', 'get_alignment',
 ]
 
@@ -41,6 +42,13 @@ class ConsensusData(Structure):
                 ("eff_cov", POINTER(c_uint))]
 
 
+class ConsensusBatchData(Structure):
+    _fields_ = [("n_piles", c_uint),
+                ("offsets", POINTER(c_uint)),
+                ("sequence", POINTER(c_char)),
+                ("eff_cov", POINTER(c_int))]
+
+
 try:
     falcon_dll = CDLL(ext_falcon.__file__)
 except OSError:
@@ -120,6 +128,75 @@ falcon.generate_consensus.argtypes = [
     POINTER(c_char_p), c_uint, c_uint, c_uint, c_uint, c_uint, c_double]
 falcon.generate_consensus.restype = POINTER(ConsensusData)
 falcon.free_consensus_data.argtypes = [POINTER(ConsensusData)]
+falcon.allocate_msa_workspace.argtypes = []
+falcon.allocate_msa_workspace.restype = c_void_p
+falcon.free_msa_workspace.argtypes = [c_void_p]
+falcon.generate_consensus_ws.argtypes = [
+    c_void_p, POINTER(c_char_p), c_uint, c_uint, c_uint, c_double]
+falcon.generate_consensus_ws.restype = POINTER(ConsensusData)
+falcon.generate_consensus_batch.argtypes = [
+    c_void_p, c_char_p, POINTER(c_uint), POINTER(c_uint), c_uint, c_uint, c_uint, c_double]
+falcon.generate_consensus_batch.restype = POINTER(ConsensusBatchData)
+falcon.free_consensus_batch_data.argtypes = [POINTER(ConsensusBatchData)]
+
+
+class MsaWorkspace(object):
+    """Owns the C working space for generate_consensus_ws() and
+    generate_consensus_batch(). It grows to the longest seed seen
+    and is reused across piles. Use one per thread.
+    """
+
+    def __init__(self):
+        self.falcon = falcon  # Still needed by __del__() at exit.
+        self.ptr = self.falcon.allocate_msa_workspace()
+
+    def __del__(self):
+        if self.ptr:
+            self.falcon.free_msa_workspace(self.ptr)
+            self.ptr = None
+
+
+class KmerIndex(object):
+    """Owns a K-mer lookup table, for finding the K-mer matches of many
+    reads against one sequence (e.g. the seed of a pile). The table is
+    reset and reused by each call to index(). Use one per thread.
+    """
+
+    def __init__(self, K=8):
+        self.kup = kup  # Still needed by __del__() at exit.
+        self.K = K
+        self.size = 1 << (K * 2)
+        self.lk_ptr = self.kup.allocate_kmer_lookup(self.size)
+        self.sa_ptr = None
+        self.sda_ptr = None
+
+    def index(self, seq, mask_threshold=16):
+        """Index 'seq', dropping K-mers seen more than 'mask_threshold' times.
+        """
+        self._free_seq()
+        self.kup.init_kmer_lookup(self.lk_ptr, self.size)
+        self.sa_ptr = self.kup.allocate_seq(len(seq))
+        self.sda_ptr = self.kup.allocate_seq_addr(len(seq))
+        self.kup.add_sequence(0, self.K, seq, len(seq), self.sda_ptr, self.sa_ptr, self.lk_ptr)
+        self.kup.mask_k_mer(self.size, self.lk_ptr, mask_threshold)
+
+    def find_kmer_pos(self, seq):
+        """Return the KmerMatch of 'seq' against the indexed sequence.
+        The caller frees it with kup.free_kmer_match().
+        """
+        return self.kup.find_kmer_pos_for_seq(seq, len(seq), self.K, self.sda_ptr, self.lk_ptr)
+
+    def _free_seq(self):
+        if self.sda_ptr:
+            self.kup.free_seq_addr_array(self.sda_ptr)
+            self.kup.free_seq_array(self.sa_ptr)
+            self.sa_ptr = self.sda_ptr = None
+
+    def __del__(self):
+        self._free_seq()
+        if self.lk_ptr:
+            self.kup.free_kmer_lookup(self.lk_ptr)
+            self.lk_ptr = None
 
 
 def get_alignment(seq1, seq0):
@@ -0,0 +1,226 @@
+"""Random access to the records of a FASTA file, by a samtools-compatible
+.fai index.
+
+The index of FASTA file F is F.fai, one line per record:
+NAME LENGTH OFFSET LINEBASES LINEWIDTH (the name up to the first
+whitespace; the number of bases; the byte offset of the first base; the
+bases per line; the bytes per line, with the line-break). Within a record,
+every line but the last must be the same length. 'samtools faidx F' writes
+the same file, and write_index() does too.
+
+IndexedFasta uses F.fai if it is at least as new as F, and otherwise
+indexes F in memory, in one pass. Either way, F is memory-mapped, so
+fetching a record (or a part of one) reads just that record. Given the
+names of the records wanted, it keeps only their entries.
+"""
+from __future__ import absolute_import
+
+from builtins import object
+from .util.seq import revcomp
+import collections
+import logging
+import mmap
+import os
+
+LOG = logging.getLogger(__name__)
+
+FaiEntry = collections.namedtuple('FaiEntry', 'name length offset linebases linewidth')
+
+
+def fai_fn(fasta_fn):
+    return fasta_fn + '.fai'
+
+
+def _line_end(data, eol):
+    """Return the length of the line-break ending at 'eol' (1 for '\\n',
+    2 for '\\r\\n').
+    """
+    return 2 if eol > 0 and data[eol - 1:eol] == b'\r' else 1
+
+
+def index_buffer(data, fn):
+    """Yield a FaiEntry per record of the FASTA in 'data' (bytes, or an mmap).
+    'fn' is for exceptions.
+    """
+    n = len(data)
+    if n and data[0:1] != b'>':
+        raise Exception('Invalid FASTA file {!r}'.format(fn))
+    find = data.find
+    pos = 0
+    while pos < n:
+        eol = find(b'\n', pos)
+        if eol < 0:
+            eol = n
+        header = data[pos + 1:eol].split(None, 1)
+        name = header[0] if header else b''
+        if not isinstance(name, str):
+            name = name.decode('ascii')
+        seq_start = eol + 1
+        if seq_start >= n or data[seq_start:seq_start + 1] == b'>':
+            yield FaiEntry(name, 0, seq_start, 0, 0)
+            pos = seq_start
+            continue
+        nl = find(b'\n', seq_start)
+        if nl < 0:
+            nl = n
+        linewidth = nl + 1 - seq_start
+        linebases = linewidth - (_line_end(data, nl) if nl < n else 1)
+        if nl + 1 >= n or data[nl + 1:nl + 2] == b'>':
+            # The whole sequence is on one line, as usual for preads.
+            yield FaiEntry(name, linebases, seq_start, linebases, linewidth)
+            pos = nl + 1
+            continue
+        nxt = find(b'\n>', nl)
+        rec_end = n if nxt < 0 else nxt + 1
+        chunk = data[seq_start:rec_end].rstrip(b'\r\n')
+        n_lines = chunk.count(b'\n') + 1
+        length = len(chunk) - (n_lines - 1) * (linewidth - linebases)
+        # Every line but the last is 'linewidth' bytes.
+        n_full = (length - 1) // linebases if linebases else -1
+        if (n_full != n_lines - 1 or
+                (n_full and chunk[n_full * linewidth - 1:n_full * linewidth] != b'\n')):
+            raise Exception('Different line length in sequence {!r} of {!r}'.format(name, fn))
+        yield FaiEntry(name, length, seq_start, linebases, linewidth)
+        pos = rec_end
+
+
+def read_fai(fn):
+    """Return the FaiEntry list of .fai file 'fn'.
+    """
+    entries = []
+    with open(fn) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            entries.append(FaiEntry(fields[0], *[int(v) for v in fields[1:5]]))
+    return entries
+
+
+def write_fai(entries, fn):
+    with open(fn, 'w') as f:
+        for e in entries:
+            f.write('{}\t{}\t{}\t{}\t{}\n'.format(*e))
+
+
+def load_index(fasta_fn):
+    """Return the FaiEntry list from the .fai of 'fasta_fn' (or, if that is
+    a symlink, of the file it links to), or None if there is no up-to-date
+    .fai.
+    """
+    fn = fai_fn(fasta_fn)
+    if not os.path.exists(fn):
+        fn = fai_fn(os.path.realpath(fasta_fn))
+        if not os.path.exists(fn):
+            return None
+    if os.path.getmtime(fn) < os.path.getmtime(fasta_fn):
+        LOG.warning('Ignoring {!r}, which is older than {!r}.'.format(fn, fasta_fn))
+        return None
+    return read_fai(fn)
+
+
+def write_index(fasta_fn):
+    """Write the .fai of 'fasta_fn', and return its FaiEntry list.
+    """
+    with open(fasta_fn, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            entries = list(index_buffer(data, fasta_fn))
+            data.close()
+        else:
+            entries = []
+    write_fai(entries, fai_fn(fasta_fn))
+    return entries
+
+
+class IndexedFasta(object):
+    """The records of a FASTA file, by name, from its memory-mapped text.
+
+    Usage:
+        with IndexedFasta('preads4falcon.fasta', names=rids) as fasta:
+            seq = fasta.fetch('000000001', 100, 200, reverse_complement=True)
+
+    'names' (a set, say) limits the index to those records.
+    """
+
+    def names(self):
+        """Return the record names, in file order.
+        """
+        return [e.name for e in self.entries]
+
+    def length(self, name):
+        return self.index[name].length
+
+    def offset(self, name):
+        return self.index[name].offset
+
+    def fetch(self, name, start=0, end=None, reverse_complement=False):
+        """Return the bases [start, end) of record 'name' (all of them, by
+        default), reverse-complemented if asked. Raise KeyError if there
+        is no such record.
+        """
+        e = self.index[name]
+        if end is None or end > e.length:
+            end = e.length
+        start = max(start, 0)
+        if start >= end:
+            return ''
+        if e.length <= e.linebases:
+            seq = self.data[e.offset + start:e.offset + end]
+        else:
+            b, w = e.linebases, e.linewidth
+            last = end - 1
+            seq = self.data[e.offset + (start // b) * w + start % b:
+                            e.offset + (last // b) * w + last % b + 1]
+            seq = seq.replace(b'\n', b'')
+            if w - b > 1:
+                seq = seq.replace(b'\r', b'')
+        if not isinstance(seq, str):
+            seq = seq.decode('ascii')
+        return revcomp(seq) if reverse_complement else seq
+
+    def close(self):
+        if self.data:
+            self.data.close()
+            self.data = b''
+        self.file.close()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        return self.fetch(name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __init__(self, fasta_fn, names=None):
+        self.fn = fasta_fn
+        self.file = open(fasta_fn, 'rb')
+        # An empty file cannot be mapped.
+        if os.fstat(self.file.fileno()).st_size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+        entries = load_index(fasta_fn)
+        if entries is None:
+            LOG.info('Indexing {!r} (no up-to-date {!r}).'.format(fasta_fn, fai_fn(fasta_fn)))
+            entries = index_buffer(self.data, fasta_fn)
+        if names is not None:
+            entries = (e for e in entries if e.name in names)
+        self.entries = list(entries)
+        self.index = {}
+        for e in self.entries:
+            if e.name in self.index:
+                LOG.warning('Ignoring duplicate sequence {!r} in {!r}.'.format(e.name, fasta_fn))
+                continue
+            self.index[e.name] = e
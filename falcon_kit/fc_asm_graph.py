@@ -1,13 +1,10 @@
 from __future__ import absolute_import
 
-from builtins import zip
 from builtins import object
-from .FastaReader import open_fasta_reader
-from .io import FilePercenter
+from . import graph_files
+from .fasta_index import IndexedFasta
 import networkx as nx
 
-RCMAP = dict(zip("ACGTacgtNn-", "TGCAtgcaNn-"))
-
 
 def reverse_end(node_id):
     node_id, end = node_id.split(":")
@@ -33,18 +30,9 @@ class AsmGraph(object):
         self.build_node_map()
 
     def load_sg_data(self, sg_file):
-        counter = FilePercenter(sg_file)
-        with open(sg_file) as f:
-            for l in f:
-                counter(len(l))
-                l = l.strip().split()
-                v, w = l[0:2]
-                seq_id, b, e = l[2:5]
-                b, e = int(b), int(e)
-                score, idt = l[5:7]
-                score, idt = int(score), float(idt)
-                type_ = l[7]
-                self.sg_edges[(v, w)] = ((seq_id, b, e), score, idt, type_)
+        for (v, w, seq_id, b, e, score, idt, type_) in graph_files.iter_rows(
+                sg_file, graph_files.SG_EDGES):
+            self.sg_edges[(v, w)] = ((seq_id, b, e), score, idt, type_)
 
     def load_sg_seq(self, fasta_fn):
         all_read_ids = set()  # read ids in the graph
@@ -58,26 +46,20 @@ class AsmGraph(object):
             all_read_ids.add(v)
             all_read_ids.add(w)
 
-        seqs = {}
-        # load all p-read name into memory
-        with open_fasta_reader(fasta_fn) as f:
-            for r in f:
-                if r.name not in all_read_ids:
-                    continue
-                seqs[r.name] = r.sequence.upper()
-
-        for v, w in self.sg_edges:
-            seq_id, s, t = self.sg_edges[(v, w)][0]
-            type_ = self.sg_edges[(v, w)][-1]
+        # fetch just the edge sequences from the memory-mapped reads
+        with IndexedFasta(fasta_fn, names=all_read_ids) as fasta:
+            for v, w in self.sg_edges:
+                seq_id, s, t = self.sg_edges[(v, w)][0]
+                type_ = self.sg_edges[(v, w)][-1]
 
-            if type_ != "G":
-                continue
+                if type_ != "G":
+                    continue
 
-            if s < t:
-                e_seq = seqs[seq_id][s:t]
-            else:
-                e_seq = "".join([RCMAP[c] for c in seqs[seq_id][t:s][::-1]])
-            self.sg_edge_seqs[(v, w)] = e_seq
+                if s < t:
+                    e_seq = fasta.fetch(seq_id, s, t)
+                else:
+                    e_seq = fasta.fetch(seq_id, t, s, reverse_complement=True)
+                self.sg_edge_seqs[(v, w)] = e_seq.upper()
 
     def get_seq_from_path(self, path):
         if len(self.sg_edge_seqs) == 0:
@@ -90,43 +72,28 @@ class AsmGraph(object):
         return "".join(seqs)
 
     def load_utg_data(self, utg_file):
-        counter = FilePercenter(utg_file)
-        with open(utg_file) as f:
-            for l in f:
-                counter(len(l))
-                l = l.strip().split()
-                s, v, t = l[0:3]
-                type_, length, score = l[3:6]
-                length, score = int(length), int(score)
-                path_or_edges = l[6]
-                self.utg_data[(s, t, v)] = (
-                    type_, length, score, path_or_edges)
+        for (s, v, t, type_, length, score, path_or_edges) in graph_files.iter_rows(
+                utg_file, graph_files.UTG_DATA):
+            self.utg_data[(s, t, v)] = (
+                type_, length, score, path_or_edges)
 
     def load_ctg_data(self, ctg_file):
-        counter = FilePercenter(ctg_file)
-        with open(ctg_file) as f:
-            for l in f:
-                counter(len(l))
-                l = l.strip().split()
-                ctg_id, ctg_type = l[0:2]
-                start_edge = l[2]
-                end_node = l[3]
-                length = int(l[4])
-                score = int(l[5])
-                path = tuple((e.split("~") for e in l[6].split("|")))
-                self.ctg_data[ctg_id] = (
-                    ctg_type, start_edge, end_node,  length, score, path)
-                for u in path:
-                    s, v, t = u
-                    # rint s,v,t
-                    type_, length, score, path_or_edges = self.utg_data[(
-                        s, t, v)]
-                    if type_ != "compound":
+        for (ctg_id, ctg_type, start_edge, end_node, length, score, path) in graph_files.iter_rows(
+                ctg_file, graph_files.CTG_PATHS):
+            path = tuple((e.split("~") for e in path.split("|")))
+            self.ctg_data[ctg_id] = (
+                ctg_type, start_edge, end_node,  length, score, path)
+            for u in path:
+                s, v, t = u
+                # rint s,v,t
+                type_, length, score, path_or_edges = self.utg_data[(
+                    s, t, v)]
+                if type_ != "compound":
+                    self.utg_to_ctg[(s, t, v)] = ctg_id
+                else:
+                    for svt in path_or_edges.split("|"):
+                        s, v, t = svt.split("~")
                         self.utg_to_ctg[(s, t, v)] = ctg_id
-                    else:
-                        for svt in path_or_edges.split("|"):
-                            s, v, t = svt.split("~")
-                            self.utg_to_ctg[(s, t, v)] = ctg_id
 
     def get_sg_for_utg(self, utg_id):
         sg = nx.DiGraph()
@@ -0,0 +1,261 @@
+"""Binary sidecars for the assembly graph files written by fc_ovlp_to_graph
+(sg_edges_list, utg_data, ctg_paths).
+
+Each line of a text file becomes one fixed-width record of a NumPy
+structured array. Strings (node ids, read ids, types, contig ids) become
+int32 indices into a string table. A path field ('a~b~c', or
+'a~b~c|d~e~f') becomes a run of string indices in a token array, with
+negative indices for the separators. The sidecar of text file F is the
+directory F.bin, holding records.npy, strings.npy and tokens.npy, which
+are memory-mapped when read.
+
+Readers call iter_rows() (or open_table()), which use the sidecar if it
+is at least as new as the text file, and otherwise parse the text. Either
+way the rows are the same, with ints and floats already converted.
+"""
+from __future__ import absolute_import
+
+from builtins import object
+from builtins import range
+from builtins import zip
+from .io import open_progress
+import array
+import logging
+import numpy as np
+import os
+import re
+
+LOG = logging.getLogger(__name__)
+
+STR, INT, FLOAT, PATH = 'str', 'int', 'float', 'path'
+
+SG_EDGES = (
+    ('v', STR), ('w', STR), ('rid', STR), ('sp', INT), ('tp', INT),
+    ('score', INT), ('identity', FLOAT), ('type', STR),
+)
+UTG_DATA = (
+    ('s', STR), ('v', STR), ('t', STR), ('type', STR),
+    ('length', INT), ('score', INT), ('path', PATH),
+)
+CTG_PATHS = (
+    ('ctg_id', STR), ('type', STR), ('start_edge', PATH), ('end_node', STR),
+    ('length', INT), ('score', INT), ('path', PATH),
+)
+
+# A path field is a [start, stop) range of the token array.
+KIND_DTYPES = {
+    STR: (np.int32, ()),
+    INT: (np.int64, ()),
+    FLOAT: (np.float64, ()),
+    PATH: (np.int64, (2,)),
+}
+KIND_TYPECODES = {STR: 'i', INT: 'l', FLOAT: 'd'}
+KIND_PARSERS = {STR: str, INT: int, FLOAT: float, PATH: str}
+
+# Path separators are negative tokens, so words[token] works for both,
+# given words = strings + SEPARATORS.
+SEPARATORS = ['|', '~']
+SEPARATOR_TOKENS = {'|': -2, '~': -1}
+_path_re = re.compile(r'([~|])')
+ROWS_PER_BLOCK = 1 << 16
+
+
+def schema_dtype(schema):
+    return np.dtype([(name, ) + KIND_DTYPES[kind] for (name, kind) in schema])
+
+
+def sidecar_dir(fn):
+    return fn + '.bin'
+
+
+class TableBuilder(object):
+    """Collect the rows of a graph file, as a Table.
+    """
+
+    def string_id(self, s):
+        i = self.string_ids.get(s)
+        if i is None:
+            i = self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def add(self, row):
+        """'row' has one value per field of the schema; paths are strings.
+        """
+        for ((name, kind), col, v) in zip(self.schema, self.columns, row):
+            if kind == STR:
+                col.append(self.string_id(v))
+            elif kind == PATH:
+                col.append(len(self.tokens))
+                for word in _path_re.split(v):
+                    if word in SEPARATOR_TOKENS:
+                        self.tokens.append(SEPARATOR_TOKENS[word])
+                    elif word:
+                        self.tokens.append(self.string_id(word))
+                col.append(len(self.tokens))
+            else:
+                col.append(v)
+        self.n_rows += 1
+
+    def table(self):
+        records = np.empty(self.n_rows, dtype=schema_dtype(self.schema))
+        for ((name, kind), col) in zip(self.schema, self.columns):
+            records[name] = np.array(col, dtype=col.typecode).reshape(records[name].shape)
+        tokens = np.array(self.tokens, dtype=np.int32)
+        return Table(self.schema, records, list(self.strings), tokens)
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = [array.array(KIND_TYPECODES.get(kind, 'l')) for (name, kind) in schema]
+        self.tokens = array.array('i')
+        self.string_ids = {}
+        self.strings = []
+        self.n_rows = 0
+
+
+class Table(object):
+    """The rows of a graph file, as 'records' (one per row, of
+    schema_dtype(schema)), 'strings' and path 'tokens'.
+    """
+
+    def string_id(self, s):
+        """Return the index of string 's', or -1 if it is not in the table.
+        """
+        if self._string_ids is None:
+            self._string_ids = dict((w, i) for (i, w) in enumerate(self.strings))
+        return self._string_ids.get(s, -1)
+
+    def mask(self, types):
+        """Return a bool array, True for each record whose 'type' is in 'types'.
+        """
+        type_ids = [self.string_id(t) for t in types]
+        return np.in1d(self.records['type'], type_ids)
+
+    def rows(self, mask=None):
+        """Yield a tuple of values per record (or per record in 'mask'),
+        the same as parsing the text.
+        """
+        records = self.records if mask is None else self.records[mask]
+        words = self.strings + SEPARATORS
+        for beg in range(0, len(records), ROWS_PER_BLOCK):
+            block = records[beg:beg + ROWS_PER_BLOCK]
+            columns = []
+            for (name, kind) in self.schema:
+                col = block[name].tolist()
+                if kind == STR:
+                    col = [words[i] for i in col]
+                elif kind == PATH:
+                    col = [''.join([words[i] for i in self.tokens[start:stop].tolist()])
+                           for (start, stop) in col]
+                columns.append(col)
+            for row in zip(*columns):
+                yield row
+
+    def save(self, fn):
+        """Write the sidecar of text file 'fn'.
+        """
+        dn = sidecar_dir(fn)
+        if not os.path.isdir(dn):
+            os.makedirs(dn)
+        strings = np.array([s.encode('ascii') for s in self.strings] or [b''])
+        np.save(os.path.join(dn, 'strings.npy'), strings)
+        np.save(os.path.join(dn, 'tokens.npy'), self.tokens)
+        # Written last, so its mtime dates the sidecar.
+        np.save(os.path.join(dn, 'records.npy'), self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __init__(self, schema, records, strings, tokens):
+        self.schema = schema
+        self.records = records
+        self.strings = strings
+        self.tokens = tokens
+        self._string_ids = None
+
+
+def load_table(fn, schema):
+    """Return the Table in the sidecar of 'fn', memory-mapped,
+    or None if there is no up-to-date sidecar for this schema.
+    """
+    dn = sidecar_dir(fn)
+    records_fn = os.path.join(dn, 'records.npy')
+    if not os.path.exists(records_fn):
+        return None
+    if os.path.exists(fn) and os.path.getmtime(records_fn) < os.path.getmtime(fn):
+        LOG.warning('Ignoring {!r}, which is older than {!r}.'.format(dn, fn))
+        return None
+    records = np.load(records_fn, mmap_mode='r')
+    if records.dtype != schema_dtype(schema):
+        LOG.warning('Ignoring {!r}, which has fields {!r}.'.format(dn, records.dtype.names))
+        return None
+    strings = np.load(os.path.join(dn, 'strings.npy')).tolist()
+    strings = [s if isinstance(s, str) else s.decode('ascii') for s in strings]
+    tokens = np.load(os.path.join(dn, 'tokens.npy'), mmap_mode='r')
+    return Table(schema, records, strings, tokens)
+
+
+def read_text_rows(fn, schema, types=None):
+    """Yield a tuple of values per line of text file 'fn', skipping blank
+    lines, and lines whose 'type' is not in 'types' (if given).
+    """
+    parsers = [KIND_PARSERS[kind] for (name, kind) in schema]
+    type_col = [name for (name, kind) in schema].index('type')
+    with open_progress(fn) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            if types is not None and fields[type_col] not in types:
+                continue
+            yield tuple(parse(v) for (parse, v) in zip(parsers, fields))
+
+
+def open_table(fn, schema):
+    """Return the rows of graph file 'fn' as a Table, from its sidecar
+    if there is one, or else from the text.
+    """
+    table = load_table(fn, schema)
+    if table is None:
+        builder = TableBuilder(schema)
+        for row in read_text_rows(fn, schema):
+            builder.add(row)
+        table = builder.table()
+    return table
+
+
+def write_sidecar(fn, schema):
+    """Write the sidecar of text file 'fn', from the text.
+    """
+    builder = TableBuilder(schema)
+    for row in read_text_rows(fn, schema):
+        builder.add(row)
+    builder.table().save(fn)
+
+
+def iter_rows(fn, schema, types=None):
+    """Yield a tuple of values per row of graph file 'fn', from its
+    sidecar if there is one, or else from the text; only rows whose 'type'
+    is in 'types', if given.
+    """
+    table = load_table(fn, schema)
+    if table is None:
+        return read_text_rows(fn, schema, types)
+    return table.rows(None if types is None else table.mask(types))
+
+
+def layout_reads(sg_edges_list_fn):
+    """Return the set of read ids at either end of a 'G' edge of the
+    string graph.
+    """
+    table = load_table(sg_edges_list_fn, SG_EDGES)
+    if table is None:
+        nodes = set()
+        for row in read_text_rows(sg_edges_list_fn, SG_EDGES, types=('G',)):
+            nodes.add(row[0])
+            nodes.add(row[1])
+    else:
+        g_edges = table.records[table.mask(('G',))]
+        nodes = set(table.strings[i] for i in
+                    np.unique(np.concatenate((g_edges['v'], g_edges['w']))).tolist())
+    return set(n.split(':')[0] for n in nodes)
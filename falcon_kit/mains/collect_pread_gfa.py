@@ -4,23 +4,25 @@ import sys
 import json
 
 from falcon_kit.fc_asm_graph import AsmGraph
-from falcon_kit.FastaReader import FastaReader
+import falcon_kit.graph_files as graph_files
+from falcon_kit.FastaReader import FastaReader, fasta_names_and_lengths
 from falcon_kit.gfa_graph import *
 import falcon_kit.tiling_path
 
 def load_seqs(fasta_fn, store_only_seq_len):
     """
     If store_only_seq_len is True, then the seq is discarded and
-    only it's length stored.
+    only it's length stored (and the sequences are never read).
     """
     seqs = {}
-    f = FastaReader(fasta_fn)
     if store_only_seq_len == False:
+        f = FastaReader(fasta_fn)
         for r in f:
             seqs[r.name.split()[0]] = (len(r.sequence), r.sequence.upper())
     else:
-        for r in f:
-            seqs[r.name.split()[0]] = (len(r.sequence), '*')
+        names, lens = fasta_names_and_lengths(fasta_fn)
+        for (name, seq_len) in zip(names, lens.tolist()):
+            seqs[name] = (seq_len, '*')
     return seqs
 
 def load_pread_overlaps(fp_in):
@@ -54,6 +56,16 @@ def load_sg_edges(fp_in):
         sg_edges_dict[(sl[0], sl[1])] = sl[0:3] + [int(val) for val in sl[3:6]] + [float(sl[6])] + sl[7:]
     return sg_edges_dict
 
+def load_sg_edges_fn(sg_edges_list):
+    """
+    Like load_sg_edges(), but given the file name, so that its binary
+    sidecar is used if there is one.
+    """
+    sg_edges_dict = {}
+    for row in graph_files.iter_rows(sg_edges_list, graph_files.SG_EDGES):
+        sg_edges_dict[(row[0], row[1])] = list(row)
+    return sg_edges_dict
+
 def add_node(gfa_graph, v, preads_dict):
     v_name, v_orient = v.split(':')
     v_len, v_seq = preads_dict[v_name]
@@ -167,8 +179,7 @@ def run(fp_out, p_ctg_tiling_path, a_ctg_tiling_path,
         preads_overlap_dict = load_pread_overlaps(fp)
 
     # Load the SG edges.
-    with open(sg_edges_list, 'r') as fp:
-        sg_edges_dict = load_sg_edges(fp)
+    sg_edges_dict = load_sg_edges_fn(sg_edges_list)
 
     # Load the primary and associate contig files.
     p_ctg_seqs = load_seqs(p_ctg_fasta, True)
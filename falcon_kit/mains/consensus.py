@@ -5,7 +5,7 @@ from __future__ import division
 from builtins import range
 from ctypes import (POINTER, c_char_p, c_uint, c_uint,
                     c_uint, c_uint, c_uint, c_double, string_at)
-from falcon_kit.multiproc import Pool
+from falcon_kit.multiproc import Pool, ThreadPool, bounded_imap
 from falcon_kit import falcon
 import argparse
 import logging
@@ -13,6 +13,8 @@ import multiprocessing
 import os
 import re
 import sys
+import threading
+import time
 import falcon_kit
 import falcon_kit.util.io as io
 
@@ -23,6 +25,18 @@ falcon.generate_consensus.argtypes = [
 falcon.generate_consensus.restype = POINTER(falcon_kit.ConsensusData)
 falcon.free_consensus_data.argtypes = [POINTER(falcon_kit.ConsensusData)]
 
+msa_workspaces = threading.local()
+kmer_indexes = threading.local()
+
+
+def get_msa_workspace():
+    """Return this thread's MsaWorkspace, reused for every pile.
+    """
+    ws = getattr(msa_workspaces, 'ws', None)
+    if ws is None:
+        ws = msa_workspaces.ws = falcon_kit.MsaWorkspace()
+    return ws
+
 
 def get_longest_reads(seqs, max_n_read, max_cov_aln, sort=True):
     # including the sort kwarg allows us to avoid a redundant sort
@@ -46,21 +60,27 @@ def get_longest_reads(seqs, max_n_read, max_cov_aln, sort=True):
     return(seqs[:longest_n_reads])
 
 
-def get_alignment(seq1, seq0, edge_tolerance=1000):
+def get_kmer_index():
+    """Return this thread's KmerIndex, reused for every seed.
+    """
+    index = getattr(kmer_indexes, 'index', None)
+    if index is None:
+        index = kmer_indexes.index = falcon_kit.KmerIndex(K=8)
+    return index
 
+
+def get_alignment(seq1, seq0, edge_tolerance=1000, seed_index=None):
+    """Find the sparse alignment of seq1 to seq0.
+    'seed_index' is a KmerIndex of seq0, so that it can be built once for
+    all the reads aligned to the same seed.
+    """
     kup = falcon_kit.kup
     K = 8
-    lk_ptr = kup.allocate_kmer_lookup(1 << (K * 2))
-    sa_ptr = kup.allocate_seq(len(seq0))
-    sda_ptr = kup.allocate_seq_addr(len(seq0))
-    kup.add_sequence(0, K, seq0, len(seq0), sda_ptr, sa_ptr, lk_ptr)
-
-    kup.mask_k_mer(1 << (K * 2), lk_ptr, 16)
-    kmer_match_ptr = kup.find_kmer_pos_for_seq(
-        seq1, len(seq1), K, sda_ptr, lk_ptr)
-    kmer_match = kmer_match_ptr[0]
+    if seed_index is None:
+        seed_index = falcon_kit.KmerIndex(K)
+        seed_index.index(seq0)
+    kmer_match_ptr = seed_index.find_kmer_pos(seq1)
     aln_range_ptr = kup.find_best_aln_range2(kmer_match_ptr, K, K * 50, 25)
-    #x,y = zip( * [ (kmer_match.query_pos[i], kmer_match.target_pos[i]) for i in range(kmer_match.count )] )
     aln_range = aln_range_ptr[0]
     kup.free_kmer_match(kmer_match_ptr)
     s1, e1, s0, e0, km_score = aln_range.s1, aln_range.e1, aln_range.s2, aln_range.e2, aln_range.score
@@ -84,10 +104,6 @@ def get_alignment(seq1, seq0, edge_tolerance=1000):
         aln_t_s = s0
         aln_t_e = e0
 
-    kup.free_seq_addr_array(sda_ptr)
-    kup.free_seq_array(sa_ptr)
-    kup.free_kmer_lookup(lk_ptr)
-
     if s1 > edge_tolerance and s0 > edge_tolerance:
         return 0, 0, 0, 0, 0, 0, "none"
 
@@ -109,8 +125,8 @@ def get_consensus_without_trim(c_input):
         seqs = get_longest_reads(seqs, max_n_read, max_cov_aln, sort=True)
     seqs_ptr = (c_char_p * len(seqs))()
     seqs_ptr[:] = seqs
-    consensus_data_ptr = falcon.generate_consensus(
-        seqs_ptr, len(seqs), min_cov, K, min_idt)
+    consensus_data_ptr = falcon.generate_consensus_ws(
+        get_msa_workspace().ptr, seqs_ptr, len(seqs), min_cov, K, min_idt)
     assert consensus_data_ptr
     consensus = string_at(consensus_data_ptr[0].sequence)[:]
     eff_cov = consensus_data_ptr[0].eff_cov[:len(consensus)]
@@ -121,15 +137,17 @@ def get_consensus_without_trim(c_input):
     return consensus, seed_id
 
 
-def get_consensus_with_trim(c_input):
-    seqs, seed_id, config = c_input
-    LOG.debug('Starting get_consensus_with_trim(len(seqs)=={}, seed_id={})'.format(
-        len(seqs), seed_id))
+def get_trimmed_seqs(seqs, config):
+    """Return the seed plus the aligned, trimmed ranges of the other reads,
+    longest first.
+    """
     min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln = config
     trim_seqs = []
     seed = seqs[0]
+    seed_index = get_kmer_index()
+    seed_index.index(seed)
     for seq in seqs[1:]:
-        aln_data = get_alignment(seq, seed, edge_tolerance)
+        aln_data = get_alignment(seq, seed, edge_tolerance, seed_index)
         s1, e1, s2, e2, aln_size, aln_score, c_status = aln_data
         if c_status == "none":
             continue
@@ -145,11 +163,20 @@ def get_consensus_with_trim(c_input):
         # seqs already sorted, dont' sort again
         trim_seqs = get_longest_reads(
             trim_seqs, max_n_read, max_cov_aln, sort=False)
+    return trim_seqs
+
+
+def get_consensus_with_trim(c_input):
+    seqs, seed_id, config = c_input
+    LOG.debug('Starting get_consensus_with_trim(len(seqs)=={}, seed_id={})'.format(
+        len(seqs), seed_id))
+    min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln = config
+    trim_seqs = get_trimmed_seqs(seqs, config)
 
     seqs_ptr = (c_char_p * len(trim_seqs))()
     seqs_ptr[:] = trim_seqs
-    consensus_data_ptr = falcon.generate_consensus(
-        seqs_ptr, len(trim_seqs), min_cov, K, min_idt)
+    consensus_data_ptr = falcon.generate_consensus_ws(
+        get_msa_workspace().ptr, seqs_ptr, len(trim_seqs), min_cov, K, min_idt)
     assert consensus_data_ptr
     consensus = string_at(consensus_data_ptr[0].sequence)[:]
     eff_cov = consensus_data_ptr[0].eff_cov[:len(consensus)]
@@ -160,8 +187,67 @@ def get_consensus_with_trim(c_input):
     return consensus, seed_id
 
 
-def get_seq_data(config, min_n_read, min_len_aln):
-    max_len = 128000
+def generate_consensus_batch(piles, config):
+    """Return (consensus, eff_cov) for each pile (a list of seqs, seed first).
+    All piles are packed into one buffer and cross into C in one call.
+    """
+    min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln = config
+    seq_offsets = []
+    pile_n_seq = []
+    offset = 0
+    for seqs in piles:
+        pile_n_seq.append(len(seqs))
+        for seq in seqs:
+            seq_offsets.append(offset)
+            offset += len(seq) + 1
+    seq_buf = '\0'.join(seq for seqs in piles for seq in seqs) + '\0'
+    seq_offsets_arr = (c_uint * len(seq_offsets))(*seq_offsets)
+    pile_n_seq_arr = (c_uint * len(pile_n_seq))(*pile_n_seq)
+    batch_ptr = falcon.generate_consensus_batch(
+        get_msa_workspace().ptr, seq_buf, seq_offsets_arr, pile_n_seq_arr, len(piles), min_cov, K, min_idt)
+    assert batch_ptr
+    offsets = batch_ptr[0].offsets[:len(piles) + 1]
+    sequence = string_at(batch_ptr[0].sequence, offsets[-1])
+    eff_cov = batch_ptr[0].eff_cov[:offsets[-1]]
+    falcon.free_consensus_batch_data(batch_ptr)
+    return [(sequence[b:e], eff_cov[b:e]) for b, e in zip(offsets[:-1], offsets[1:])]
+
+
+def get_consensus_batch_without_trim(c_inputs):
+    LOG.debug('Starting get_consensus_batch_without_trim(len(c_inputs)=={})'.format(
+        len(c_inputs)))
+    piles = []
+    for seqs, seed_id, config in c_inputs:
+        min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln = config
+        if len(seqs) > max_n_read:
+            seqs = get_longest_reads(seqs, max_n_read, max_cov_aln, sort=True)
+        piles.append(seqs)
+    results = generate_consensus_batch(piles, config)
+    return [(consensus, c_input[1]) for (consensus, eff_cov), c_input in zip(results, c_inputs)]
+
+
+def get_consensus_batch_with_trim(c_inputs):
+    LOG.debug('Starting get_consensus_batch_with_trim(len(c_inputs)=={})'.format(
+        len(c_inputs)))
+    piles = [get_trimmed_seqs(seqs, config) for seqs, seed_id, config in c_inputs]
+    results = generate_consensus_batch(piles, c_inputs[0][2])
+    return [(consensus, c_input[1]) for (consensus, eff_cov), c_input in zip(results, c_inputs)]
+
+
+def batched(iterable, size):
+    """Yield lists of up to 'size' items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_seq_data(config, min_n_read, min_len_aln, max_len=0):
     min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln = config
     seqs = []
     seed_id = None
@@ -177,8 +263,10 @@ def get_seq_data(config, min_n_read, min_len_aln):
 
             read_id = l[0]
             seq = l[1]
-            if len(seq) > max_len:
-                seq = seq[:max_len - 1]
+            if max_len and len(seq) > max_len:
+                LOG.warning('Truncating {} from {} to {} bases (--max-len)'.format(
+                    read_id, len(seq), max_len))
+                seq = seq[:max_len]
 
             if read_id not in ("+", "-", "*"):
                 if len(seq) >= min_len_aln:
@@ -221,6 +309,9 @@ def parse_args(argv):
     parser.add_argument('--n-core', type=int, default=24,
                         help='number of processes used for generating consensus; '
                         '0 for main process only')
+    parser.add_argument('--engine', choices=['processes', 'threads'], default='processes',
+                        help='run --n-core worker processes, or worker threads which share the parsed piles '
+                        'with no pickling (the C consensus runs without the GIL)')
     parser.add_argument('--min-cov', type=int, default=6,
                         help='minimum coverage to break the consensus')
     parser.add_argument('--min-cov-aln', type=int, default=10,
@@ -248,6 +339,16 @@ def parse_args(argv):
                         help='for trimming, the there is unaligned edge leng > edge_tolerance, ignore the read')
     parser.add_argument('--trim-size', type=int, default=50,
                         help='the size for triming both ends from initial sparse aligned region')
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help='feed piles to the workers while still reading stdin, through a bounded queue, '
+                        'instead of reading all piles first; can save memory for large blocks')
+    parser.add_argument('--max-pending', type=int, default=0,
+                        help='with --stream, maximum number of piles queued or in progress; 0 for 4 * n-core')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='number of piles sent to a worker, and into the C consensus, in one call; '
+                        'larger batches cut per-seed overhead when piles are small and numerous')
+    parser.add_argument('--max-len', type=int, default=0,
+                        help='truncate longer seeds and reads to this many bases, with a warning; 0 for no limit')
     parser.add_argument('-v', '--verbose-level', type=float, default=2.0,
                         help='logging level (WARNING=3, INFO=2, DEBUG=1)')
     return parser.parse_args(argv[1:])
@@ -261,8 +362,18 @@ def run(args):
     def Start():
         LOG.info('Started a worker in {} from parent {}'.format(
             os.getpid(), os.getppid()))
-    exe_pool = Pool(args.n_core, initializer=Start)
-    if args.trim:
+    if args.engine == 'threads':
+        # ctypes releases the GIL for the C consensus, and each thread
+        # has its own MSA workspace, so piles need not be pickled.
+        exe_pool = ThreadPool(args.n_core, initializer=Start)
+    else:
+        exe_pool = Pool(args.n_core, initializer=Start)
+    if args.batch_size > 1:
+        if args.trim:
+            get_consensus = get_consensus_batch_with_trim
+        else:
+            get_consensus = get_consensus_batch_without_trim
+    elif args.trim:
         get_consensus = get_consensus_with_trim
     else:
         get_consensus = get_consensus_without_trim
@@ -271,14 +382,32 @@ def run(args):
     config = args.min_cov, K, \
         args.max_n_read, args.min_idt, args.edge_tolerance, args.trim_size, args.min_cov_aln, args.max_cov_aln
     # TODO: pass config object, not tuple, so we can add fields
-    inputs = []
-    for datum in get_seq_data(config, args.min_n_read, args.min_len_aln):
-        inputs.append((get_consensus, datum))
+    data = get_seq_data(config, args.min_n_read, args.min_len_aln, args.max_len)
+    if args.batch_size > 1:
+        data = batched(data, args.batch_size)
+    inputs = ((get_consensus, datum) for datum in data)
+    if args.stream:
+        max_pending = args.max_pending or 4 * max(args.n_core, 1)
+        LOG.info('streaming piles with at most {} pending'.format(max_pending))
+        results = bounded_imap(exe_pool, io.run_func, inputs, max_pending)
+    else:
+        results = exe_pool.imap(io.run_func, list(inputs))
+    n_seeds = 0
+    start = time.time()
     try:
         LOG.info('running {!r}'.format(get_consensus))
-        for res in exe_pool.imap(io.run_func, inputs):
-            process_get_consensus_result(res, args)
+        for res in results:
+            if args.batch_size > 1:
+                for one in res:
+                    process_get_consensus_result(one, args)
+                n_seeds += len(res)
+            else:
+                process_get_consensus_result(res, args)
+                n_seeds += 1
         LOG.info('finished {!r}'.format(get_consensus))
+        elapsed = time.time() - start
+        LOG.info('{} seeds in {:.1f}s ({:.1f} seeds/sec) with engine={} n_core={}'.format(
+            n_seeds, elapsed, n_seeds / elapsed if elapsed else 0.0, args.engine, args.n_core))
     except:
         LOG.exception('failed gen_consensus')
         exe_pool.terminate()
@@ -16,6 +16,7 @@ from __future__ import absolute_import
 
 from future.utils import itervalues
 from builtins import object
+from ..util.seq import complement as _complement
 from ..util.system import abs_fns
 import argparse
 import glob
@@ -28,15 +29,9 @@ import sys
 log = logging.getLogger()
 
 DNA_BASES = ['A', 'C', 'G', 'T']
-COMPLEMENT = {
-    'A': 'T',
-    'C': 'G',
-    'G': 'C',
-    'T': 'A',
-}
 
 
-def complement(x): return (COMPLEMENT[base] for base in x)
+def complement(x): return iter(_complement(x))
 
 
 zmw_counter = None
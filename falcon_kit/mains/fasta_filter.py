@@ -9,6 +9,9 @@ import collections
 import itertools
 import logging
 import contextlib
+import shutil
+import tempfile
+import numpy as np
 
 LOG = logging.getLogger()
 
@@ -140,6 +143,196 @@ def run_internal_median_filter(fp_in, fp_out, fn):
 def run_streamed_internal_median_filter(fp_in, fp_out, fn='-'):
     run_streamed_median(fp_in, fp_out, fn=fn, zmw_filter_func=internal_median_zmw_subread)
 
+##########################################
+### Memory-bounded (two-pass) filters. ###
+##########################################
+# The first pass scans only the headers and the line-breaks
+# (FastaReader.yield_fasta_lengths()), and keeps 4 integers per subread,
+# rather than a ZMWTuple with its header. The ZMW is keyed by
+# (movie, zmw_id), packed into one int64. If there are more subreads than
+# fit the memory budget, they are spilled in sorted runs to temporary files,
+# and the runs are then read back (memory-mapped) a range of ZMWs at a time.
+# The picks are the same as those of median_zmw_subread() and
+# internal_median_zmw_subread(), ties and all.
+
+ZMW_STATE_DTYPE = np.dtype([('zmw', np.int64), ('start', np.int64),
+                            ('length', np.int64), ('ordinal', np.int64)])
+ZMW_ID_BITS = 40
+# Bytes of memory per subread while picking: the state, its sorted copy and
+# the sort indices.
+BYTES_PER_SUBREAD = 4 * ZMW_STATE_DTYPE.itemsize
+DEFAULT_MAX_MEM_MB = 1024
+
+def yield_zmw_states(fn, blocksize=FastaReader.LENGTH_SCAN_BLOCKSIZE):
+    """Yield ZMW_STATE_DTYPE arrays for the subreads of FASTA file fn, in
+    file order, a block at a time. The ordinal is the position in the file.
+    """
+    movies = {}
+    zmws = []
+    starts = []
+
+    def add_header(header):
+        movie_name, zmw_id, subread_start, subread_end = tokenize_header(header)
+        movie = movies.setdefault(movie_name, len(movies))
+        zmws.append((movie << ZMW_ID_BITS) | int(zmw_id))
+        starts.append(subread_start)
+
+    n = 0
+    for lengths in FastaReader.yield_fasta_lengths(fn, blocksize, on_header=add_header):
+        k = len(lengths)
+        if not k:
+            continue
+        state = np.empty(k, dtype=ZMW_STATE_DTYPE)
+        state['zmw'] = zmws[:k]
+        state['start'] = starts[:k]
+        state['length'] = lengths
+        state['ordinal'] = np.arange(n, n + k)
+        del zmws[:k]
+        del starts[:k]
+        n += k
+        yield state
+
+def _zmw_groups(zmw):
+    """Return (first index, size) of each group of equal values in the
+    sorted array zmw.
+    """
+    first = np.flatnonzero(np.concatenate(([True], zmw[1:] != zmw[:-1])))
+    sizes = np.diff(np.append(first, len(zmw)))
+    return first, sizes
+
+def select_median_subreads(state):
+    """Return the ordinals of the subreads median_zmw_subread() picks, one
+    per ZMW in state (which holds all the subreads of those ZMWs).
+    """
+    if not len(state):
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((state['ordinal'], state['length'], state['zmw']))
+    first, sizes = _zmw_groups(state['zmw'][order])
+    return state['ordinal'][order[first + sizes // 2]]
+
+def select_internal_median_subreads(state):
+    """As select_median_subreads(), for internal_median_zmw_subread().
+    """
+    if not len(state):
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((state['ordinal'], state['start'], state['zmw']))
+    first, sizes = _zmw_groups(state['zmw'][order])
+    zmw_size = np.repeat(sizes, sizes)
+    rank = np.arange(len(order)) - np.repeat(first, sizes)  # by position
+    # With < 3 subreads, all are candidates, and ties in length go to the
+    # later one in the file; otherwise the first and last by position are
+    # dropped, and ties go to the later one by position.
+    small = zmw_size < 3
+    keep = small | ((rank > 0) & (rank < zmw_size - 1))
+    order = order[keep]
+    small = small[keep]
+    tie = np.where(small, state['ordinal'][order], rank[keep])
+    by_length = np.lexsort((tie, state['length'][order], state['zmw'][order]))
+    first, sizes = _zmw_groups(state['zmw'][order[by_length]])
+    pick = np.where(small[by_length[first]], sizes - 1, sizes // 2)
+    return state['ordinal'][order[by_length[first + pick]]]
+
+def _select_from_runs(runs, select_func, max_rows):
+    """Return the ordinals picked by select_func from the subreads in runs
+    (arrays sorted by zmw), taking about max_rows subreads at a time, but
+    always all the subreads of a ZMW together.
+    """
+    step = max(1, max_rows // len(runs))
+    pos = [0] * len(runs)
+    selected = []
+    while True:
+        live = [i for i in range(len(runs)) if pos[i] < len(runs[i])]
+        if not live:
+            break
+        ahead = [runs[i]['zmw'][pos[i] + step] for i in live if pos[i] + step < len(runs[i])]
+        bound = min(ahead) if ahead else None
+        lowest = min(runs[i]['zmw'][pos[i]] for i in live)
+        if bound is not None and bound <= lowest:
+            # A ZMW with more than 'step' subreads in one run.
+            bound = lowest + 1
+        parts = []
+        for i in live:
+            end = len(runs[i]) if bound is None else int(np.searchsorted(runs[i]['zmw'], bound))
+            parts.append(np.asarray(runs[i][pos[i]:end]))
+            pos[i] = end
+        selected.append(select_func(np.concatenate(parts)))
+    return np.concatenate(selected)
+
+def select_subreads(fn, select_func=select_median_subreads, max_rows=None,
+                    blocksize=FastaReader.LENGTH_SCAN_BLOCKSIZE):
+    """Return (the sorted ordinals of the subreads picked by select_func, one
+    per ZMW, the number of subreads) for FASTA file fn, holding at most
+    about max_rows subreads in memory (all of them, if None).
+    """
+    tmpdir = None
+    n_subreads = 0
+    try:
+        runs = []
+        pending = []
+        n_pending = 0
+        for state in yield_zmw_states(fn, blocksize):
+            pending.append(state)
+            n_pending += len(state)
+            n_subreads += len(state)
+            if max_rows is not None and n_pending >= max_rows:
+                if tmpdir is None:
+                    tmpdir = tempfile.mkdtemp(prefix='fasta_filter.')
+                run = np.concatenate(pending)
+                run = run[np.argsort(run['zmw'], kind='mergesort')]
+                run_fn = os.path.join(tmpdir, 'run.{}.npy'.format(len(runs)))
+                np.save(run_fn, run)
+                del run
+                runs.append(np.load(run_fn, mmap_mode='r'))
+                pending = []
+                n_pending = 0
+        if not pending and not runs:
+            return np.zeros(0, dtype=np.int64), n_subreads
+        if not runs:
+            return np.sort(select_func(np.concatenate(pending))), n_subreads
+        LOG.info('Picking from {} sorted runs of subreads in {!r}.'.format(len(runs), tmpdir))
+        if pending:
+            run = np.concatenate(pending)
+            runs.append(run[np.argsort(run['zmw'], kind='mergesort')])
+            del run
+        return np.sort(_select_from_runs(runs, select_func, max_rows)), n_subreads
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+def run_bounded_median_filter(fp_in, fp_out, fn, select_func=select_median_subreads,
+                              max_mem_mb=DEFAULT_MAX_MEM_MB):
+    """Like run_median_filter(), but within about max_mem_mb of memory
+    however many subreads there are. Both passes read fn itself (fp_in is
+    not used), so fn must be a file.
+    """
+    assert(os.path.exists(fn))
+    max_rows = max(1, max_mem_mb * 2**20 // BYTES_PER_SUBREAD)
+    selected, n_subreads = select_subreads(fn, select_func, max_rows)
+    LOG.info('Writing {} subreads (one per ZMW) from {!r}.'.format(len(selected), fn))
+    # Walk the int64 array by index; a list of it would take a Python int per ZMW.
+    n_wanted = 0
+    wanted = int(selected[0]) if len(selected) else None
+    n_records = 0
+    with FastaReader.open_fasta_seqs(fn, log=LOG.info) as records:
+        for name, sequence in records:
+            ordinal = n_records
+            n_records += 1
+            if ordinal != wanted:
+                continue
+            fp_out.write('>{}\n'.format(name))
+            fp_out.write(FastaReader.wrap(sequence, FastaReader.FastaRecord.COLUMNS))
+            fp_out.write('\n')
+            n_wanted += 1
+            wanted = int(selected[n_wanted]) if n_wanted < len(selected) else None
+    # The passes read the file differently, and the picks are by position.
+    if n_records != n_subreads:
+        raise Exception('Read {} records from {!r}, but counted {} in the first pass.'.format(
+            n_records, fn, n_subreads))
+
+def run_bounded_internal_median_filter(fp_in, fp_out, fn, max_mem_mb=DEFAULT_MAX_MEM_MB):
+    run_bounded_median_filter(fp_in, fp_out, fn, select_func=select_internal_median_subreads,
+                              max_mem_mb=max_mem_mb)
+
 ##############################
 ### Main and cmds.         ###
 ##############################
@@ -168,6 +361,12 @@ def cmd_run_internal_median_filter(args):
     with open(args.input_path, 'r') as fp_in:
         run_internal_median_filter(fp_in, sys.stdout, args.input_path)
 
+def cmd_run_bounded_median_filter(args):
+    run_bounded_median_filter(None, sys.stdout, args.input_path, max_mem_mb=args.max_mem_mb)
+
+def cmd_run_bounded_internal_median_filter(args):
+    run_bounded_internal_median_filter(None, sys.stdout, args.input_path, max_mem_mb=args.max_mem_mb)
+
 def cmd_run_streamed_internal_median_filter(args):
     with open_stream(args.input_path) as fp_in:
         run_streamed_internal_median_filter(fp_in, sys.stdout, args.input_path)
@@ -188,6 +387,8 @@ def parse_args(argv):
     help_median = 'Applies the median-length ZMW filter by running two passes over the data. Only one subread per ZMW is output, based on median-length selection. The input_path needs to be a file.'
     help_streamed_median = 'Applies the median-length ZMW filter by running a single-pass over the data. The input subreads should be groupped by ZMW. If input_path is "-", input is read from stdin.'
     help_internal_median = 'Applies the median-length ZMW filter only on internal subreads (ZMWs with >= 3 subreads) by running two passes over the data. For ZMWs with < 3 subreads, the maximum-length one is selected. The input_path needs to be a file.'
+    help_bounded_median = 'Like median, but keeps only a few integers per subread, and spills them to sorted temporary files (in TMPDIR) beyond --max-mem-mb, so any number of ZMWs fits a fixed memory budget. ZMWs are told apart by movie and zmw_id (which must be an integer). The input_path needs to be a file.'
+    help_bounded_internal_median = 'Like internal-median, but within a fixed memory budget, as for bounded-median. The input_path needs to be a file.'
     help_streamed_internal_median = 'Applies the median-length ZMW filter only on internal subreads (ZMWs with >= 3 subreads) by running a single pass over the data. The input subreads should be groupped by ZMW. For ZMWs with < 3 subreads, the maximum-length one is selected. If input_path is "-", input is read from stdin.'
 
     parser_pass = subparsers.add_parser('pass',
@@ -214,6 +415,24 @@ def parse_args(argv):
             help=help_internal_median)
     parser_internal_median.set_defaults(func=cmd_run_internal_median_filter)
 
+    help_max_mem_mb = 'Memory budget (MB) for the subread lengths and positions, beyond which they are spilled to disk.'
+
+    parser_bounded_median = subparsers.add_parser('bounded-median',
+            formatter_class=HelpF,
+            description=help_bounded_median,
+            help=help_bounded_median)
+    parser_bounded_median.add_argument('--max-mem-mb', type=int, default=DEFAULT_MAX_MEM_MB,
+            help=help_max_mem_mb)
+    parser_bounded_median.set_defaults(func=cmd_run_bounded_median_filter)
+
+    parser_bounded_internal_median = subparsers.add_parser('bounded-internal-median',
+            formatter_class=HelpF,
+            description=help_bounded_internal_median,
+            help=help_bounded_internal_median)
+    parser_bounded_internal_median.add_argument('--max-mem-mb', type=int, default=DEFAULT_MAX_MEM_MB,
+            help=help_max_mem_mb)
+    parser_bounded_internal_median.set_defaults(func=cmd_run_bounded_internal_median_filter)
+
     parser_streamed_internal_median = subparsers.add_parser('streamed-internal-median',
             formatter_class=HelpF,
             description=help_streamed_internal_median,
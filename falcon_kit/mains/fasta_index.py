@@ -0,0 +1,37 @@
+"""
+Write the samtools-compatible .fai index of each FASTA file, so that later
+steps can fetch records from it by name, without reading the whole file.
+"""
+from __future__ import absolute_import
+
+import argparse
+import logging
+import sys
+from .. import fasta_index
+
+LOG = logging.getLogger()
+
+
+def run(fasta_fns):
+    for fn in fasta_fns:
+        entries = fasta_index.write_index(fn)
+        LOG.info('Wrote {!r}, for {} records.'.format(fasta_index.fai_fn(fn), len(entries)))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fasta_fns', nargs='+', metavar='FASTA',
+                        help='FASTA file to index (not compressed)')
+    args = parser.parse_args(argv[1:])
+    return args
+
+
+def main(argv=sys.argv):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    run(**vars(args))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main(sys.argv)          # pragma: no cover
@@ -4,6 +4,7 @@ from __future__ import print_function
 from __future__ import division
 
 from falcon_kit.FastaReader import open_fasta_reader
+from falcon_kit.fasta_index import IndexedFasta
 import argparse
 import contextlib
 import os
@@ -38,14 +39,11 @@ def fetch_ref_and_reads(base_dir, fofn, ctg_id, out_dir, min_ctg_lenth):
         rid = int(fid.split('/')[1]) // 10
         return rid_to_oid[int(rid)]
 
-    with open_fasta_reader(ctg_fa) as ref_fasta:
+    ctg_ids = None if ctg_id == 'all' else set([ctg_id])
+    with IndexedFasta(ctg_fa, names=ctg_ids) as ref_fasta:
         all_ctg_ids = set()
-        for s in ref_fasta:
-            s_id = s.name.split()[0]
-            if ctg_id != 'all' and s_id != ctg_id:
-                continue
-
-            if len(s.sequence) < min_ctg_lenth:
+        for s_id in ref_fasta.names():
+            if ref_fasta.length(s_id) < min_ctg_lenth:
                 continue
 
             if ctg_id != 'all':
@@ -55,7 +53,7 @@ def fetch_ref_and_reads(base_dir, fofn, ctg_id, out_dir, min_ctg_lenth):
                 ref_out = open(os.path.join(out_dir, '%s_ref.fa' % s_id), 'w')
 
             print('>%s' % s_id, file=ref_out)
-            print(s.sequence, file=ref_out)
+            print(ref_fasta.fetch(s_id), file=ref_out)
             all_ctg_ids.add(s_id)
             ref_out.close()
 
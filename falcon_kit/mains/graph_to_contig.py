@@ -20,6 +20,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 
+from builtins import object
 from builtins import zip
 from builtins import range
 import argparse
@@ -27,18 +28,16 @@ import logging
 import sys
 import networkx as nx
 #from pbcore.io import FastaReader
-from ..FastaReader import open_fasta_reader
-from ..io import open_progress
-
-RCMAP = dict(zip("ACGTacgtNn-", "TGCAtgcaNn-"))
+from .. import graph_files
+from ..fasta_index import IndexedFasta
+from ..util.seq import revcomp
 
 def log(msg):
     sys.stderr.write(msg)
     sys.stderr.write('\n')
 
 
-def rc(seq):
-    return "".join([RCMAP[c] for c in seq[::-1]])
+rc = revcomp
 
 def reverse_end(node_id):
     node_id, end = node_id.split(":")
@@ -46,6 +45,41 @@ def reverse_end(node_id):
     return node_id + ":" + new_end
 
 
+def edge_seq(seqs, rid, s, t):
+    """The sequence of a string graph edge, from read 'rid' of 'seqs'.
+    """
+    if s < t:
+        return seqs[rid][s:t]
+    else:
+        # t and s were swapped for 'c' alignments in ovlp_to_graph.generate_string_graph():702
+        # They were translated from reverse-dir to forward-dir coordinate system in LA4Falcon.
+        return revcomp(seqs[rid][t:s])
+
+
+class LayoutReads(object):
+    """The reads in the layout, upper-cased, fetched by name from the
+    memory-mapped preads file, so that seqs[rid] reads just that read,
+    and seqs.edge_seq() just the bases of an edge.
+    """
+
+    def __getitem__(self, rid):
+        return self.fasta.fetch(rid).upper()
+
+    def edge_seq(self, rid, s, t):
+        """Like edge_seq(seqs, rid, s, t), but reading only the edge's bases.
+        """
+        if s < t:
+            return self.fasta.fetch(rid, s, t).upper()
+        else:
+            return self.fasta.fetch(rid, t, s, reverse_complement=True).upper()
+
+    def close(self):
+        self.fasta.close()
+
+    def __init__(self, preads_fasta_fn, reads_in_layout):
+        self.fasta = IndexedFasta(preads_fasta_fn, names=reads_in_layout)
+
+
 def yield_first_seq(one_path_edges, seqs):
     if one_path_edges and one_path_edges[0][0] != one_path_edges[-1][1]:
         # If non-empty, and non-circular,
@@ -56,7 +90,7 @@ def yield_first_seq(one_path_edges, seqs):
             first_seq = seqs[vv_rid]
         else:
             assert vv_letter == 'B'
-            first_seq = "".join([RCMAP[c] for c in seqs[vv_rid][::-1]])
+            first_seq = revcomp(seqs[vv_rid])
         yield first_seq
 
 def compose_ctg(seqs, edge_data, ctg_id, path_edges, proper_ctg):
@@ -73,6 +107,8 @@ def compose_ctg(seqs, edge_data, ctg_id, path_edges, proper_ctg):
     # Splice-in the rest of the path sequence.
     for vv, ww in path_edges:
         rid, s, t, aln_score, idt, e_seq = edge_data[(vv, ww)]
+        if e_seq is None:
+            e_seq = seqs.edge_seq(rid, s, t)
         sub_seqs.append(e_seq)
         edge_lines.append('%s %s %s %s %d %d %d %0.2f' % (
             ctg_id, vv, ww, rid, s, t, aln_score, idt))
@@ -81,75 +117,49 @@ def compose_ctg(seqs, edge_data, ctg_id, path_edges, proper_ctg):
 
     return edge_lines, sub_seqs, total_score, total_length
 
-def run(improper_p_ctg, proper_a_ctg, preads_fasta_fn, sg_edges_list_fn, utg_data_fn, ctg_paths_fn):
+def run(improper_p_ctg, proper_a_ctg, preads_fasta_fn, sg_edges_list_fn, utg_data_fn, ctg_paths_fn, mmap_preads=False):
     """improper==True => Neglect the initial read.
     We used to need that for unzip.
+    mmap_preads==True => Fetch the layout reads from the memory-mapped preads
+    file, and cut out each edge sequence only when its contig is composed.
     """
+    # Read the 'G' edges once, from the sidecar if there is one.
+    g_edges = list(graph_files.iter_rows(sg_edges_list_fn, graph_files.SG_EDGES, types=("G",)))
     reads_in_layout = set()
-    with open_progress(sg_edges_list_fn) as f:
-        for l in f:
-            l = l.strip().split()
-            """001039799:E 000333411:E 000333411 17524 20167 17524 99.62 G"""
-            v, w, rid, s, t, aln_score, idt, type_ = l
-            if type_ != "G":
-                continue
-            r1 = v.split(":")[0]
-            reads_in_layout.add(r1)
-            r2 = w.split(":")[0]
-            reads_in_layout.add(r2)
-
-    seqs = {}
-    # load all p-read name into memory
-    with open_fasta_reader(preads_fasta_fn) as f:
-        for r in f:
-            if r.name not in reads_in_layout:
-                continue
-            seqs[r.name] = r.sequence.upper() # name == rid-string
+    for (v, w, rid, s, t, aln_score, idt, type_) in g_edges:
+        """001039799:E 000333411:E 000333411 17524 20167 17524 99.62 G"""
+        r1 = v.split(":")[0]
+        reads_in_layout.add(r1)
+        r2 = w.split(":")[0]
+        reads_in_layout.add(r2)
+
+    if mmap_preads:
+        seqs = LayoutReads(preads_fasta_fn, reads_in_layout)
+    else:
+        seqs = {}
+        # load the layout reads into memory, in file order
+        with IndexedFasta(preads_fasta_fn, names=reads_in_layout) as fasta:
+            for rid in fasta.names():
+                seqs[rid] = fasta.fetch(rid).upper()
 
     edge_data = {}
-    with open_progress(sg_edges_list_fn) as f:
-        for l in f:
-            l = l.strip().split()
-            """001039799:E 000333411:E 000333411 17524 20167 17524 99.62 G"""
-            v, w, rid, s, t, aln_score, idt, type_ = l
-
-            if type_ != "G":
-                continue
-            r1, dir1 = v.split(":")
-            reads_in_layout.add(r1) # redundant, but harmless
-            r2, dir2 = w.split(":")
-            reads_in_layout.add(r2) # redundant, but harmless
-
-            s = int(s)
-            t = int(t)
-            aln_score = int(aln_score)
-            idt = float(idt)
-
-            if s < t:
-                e_seq = seqs[rid][s:t]
-                assert 'E' == dir2
-            else:
-                # t and s were swapped for 'c' alignments in ovlp_to_graph.generate_string_graph():702
-                # They were translated from reverse-dir to forward-dir coordinate system in LA4Falcon.
-                e_seq = "".join([RCMAP[c] for c in seqs[rid][t:s][::-1]])
-                assert 'B' == dir2
-            edge_data[(v, w)] = (rid, s, t, aln_score, idt, e_seq)
+    for (v, w, rid, s, t, aln_score, idt, type_) in g_edges:
+        dir2 = w.split(":")[1]
+        assert dir2 == ('E' if s < t else 'B')
+        # With mmap_preads, compose_ctg() fetches the sequence.
+        e_seq = None if mmap_preads else edge_seq(seqs, rid, s, t)
+        edge_data[(v, w)] = (rid, s, t, aln_score, idt, e_seq)
+    del g_edges
 
     utg_data = {}
-    with open_progress(utg_data_fn) as f:
-        for l in f:
-            l = l.strip().split()
-            s, v, t, type_, length, score, path_or_edges = l
-            if type_ not in ["compound", "simple", "contained"]:
-                continue
-            length = int(length)
-            score = int(score)
-            if type_ in ("simple", "contained"):
-                path_or_edges = path_or_edges.split("~")
-            else:
-                path_or_edges = [tuple(e.split("~"))
-                                 for e in path_or_edges.split("|")]
-            utg_data[(s, v, t)] = type_, length, score, path_or_edges
+    for (s, v, t, type_, length, score, path_or_edges) in graph_files.iter_rows(
+            utg_data_fn, graph_files.UTG_DATA, types=("compound", "simple", "contained")):
+        if type_ in ("simple", "contained"):
+            path_or_edges = path_or_edges.split("~")
+        else:
+            path_or_edges = [tuple(e.split("~"))
+                             for e in path_or_edges.split("|")]
+        utg_data[(s, v, t)] = type_, length, score, path_or_edges
 
     p_ctg_out = open("p_ctg.fa", "w")
     a_ctg_out = open("a_ctg_all.fa", "w")
@@ -157,149 +167,149 @@ def run(improper_p_ctg, proper_a_ctg, preads_fasta_fn, sg_edges_list_fn, utg_dat
     a_ctg_t_out = open("a_ctg_all_tiling_path", "w")
     layout_ctg = set()
 
-    with open_progress(ctg_paths_fn) as f:
-        for l in f:
-            l = l.strip().split()
-            ctg_id, c_type_, i_utig, t0, length, score, utgs = l
-            ctg_id = ctg_id
-            s0 = i_utig.split("~")[0]
+    for (ctg_id, c_type_, i_utig, t0, length, score, utgs) in graph_files.iter_rows(
+            ctg_paths_fn, graph_files.CTG_PATHS):
+        ctg_id = ctg_id
+        s0 = i_utig.split("~")[0]
 
-            if (reverse_end(t0), reverse_end(s0)) in layout_ctg:
-                continue
-            else:
-                layout_ctg.add((s0, t0))
-
-            ctg_label = i_utig + "~" + t0
-            length = int(length)
-            utgs = utgs.split("|")
-            one_path = []
-            total_score = 0
-            total_length = 0
-
-            #a_ctg_data = []
-            a_ctg_group = {}
-
-            for utg in utgs:
-                s, v, t = utg.split("~")
-                type_, length, score, path_or_edges = utg_data[(s, v, t)]
-                total_score += score
-                total_length += length
-                if type_ == "simple":
-                    if len(one_path) != 0:
-                        one_path.extend(path_or_edges[1:])
-                    else:
-                        one_path.extend(path_or_edges)
-                if type_ == "compound":
-
-                    c_graph = nx.DiGraph()
-
-                    all_alt_path = []
-                    for ss, vv, tt in path_or_edges:
-                        type_, length, score, sub_path = utg_data[(ss, vv, tt)]
-
-                        v1 = sub_path[0]
-                        for v2 in sub_path[1:]:
-                            c_graph.add_edge(
-                                v1, v2, e_score=edge_data[(v1, v2)][3])
-                            v1 = v2
-
-                    shortest_path = nx.shortest_path(c_graph, s, t, "e_score")
-                    score = nx.shortest_path_length(c_graph, s, t, "e_score")
-                    all_alt_path.append((score, shortest_path))
-
-                    # a_ctg_data.append( (s, t, shortest_path) ) #first path is the same as the one used in the primary contig
-                    while 1:
-                        n0 = shortest_path[0]
-                        for n1 in shortest_path[1:]:
-                            c_graph.remove_edge(n0, n1)
-                            n0 = n1
-                        try:
-                            shortest_path = nx.shortest_path(
-                                c_graph, s, t, "e_score")
-                            score = nx.shortest_path_length(
-                                c_graph, s, t, "e_score")
-                            #a_ctg_data.append( (s, t, shortest_path) )
-                            all_alt_path.append((score, shortest_path))
-
-                        except nx.exception.NetworkXNoPath:
-                            break
-                        # if len(shortest_path) < 2:
-                        #    break
-                    # Is sorting required, if we are appending the shortest paths in order?
-                    all_alt_path.sort()
-                    all_alt_path.reverse()
-                    shortest_path = all_alt_path[0][1]
-                    # The longest branch in the compound unitig is added to the primary path.
-                    if len(one_path) != 0:
-                        one_path.extend(shortest_path[1:])
-                    else:
-                        one_path.extend(shortest_path)
-
-                    a_ctg_group[(s, t)] = all_alt_path
-
-            if len(one_path) == 0:
+        if (reverse_end(t0), reverse_end(s0)) in layout_ctg:
+            continue
+        else:
+            layout_ctg.add((s0, t0))
+
+        ctg_label = i_utig + "~" + t0
+        length = int(length)
+        utgs = utgs.split("|")
+        one_path = []
+        total_score = 0
+        total_length = 0
+
+        #a_ctg_data = []
+        a_ctg_group = {}
+
+        for utg in utgs:
+            s, v, t = utg.split("~")
+            type_, length, score, path_or_edges = utg_data[(s, v, t)]
+            total_score += score
+            total_length += length
+            if type_ == "simple":
+                if len(one_path) != 0:
+                    one_path.extend(path_or_edges[1:])
+                else:
+                    one_path.extend(path_or_edges)
+            if type_ == "compound":
+
+                c_graph = nx.DiGraph()
+
+                all_alt_path = []
+                for ss, vv, tt in path_or_edges:
+                    type_, length, score, sub_path = utg_data[(ss, vv, tt)]
+
+                    v1 = sub_path[0]
+                    for v2 in sub_path[1:]:
+                        c_graph.add_edge(
+                            v1, v2, e_score=edge_data[(v1, v2)][3])
+                        v1 = v2
+
+                shortest_path = nx.shortest_path(c_graph, s, t, "e_score")
+                score = nx.shortest_path_length(c_graph, s, t, "e_score")
+                all_alt_path.append((score, shortest_path))
+
+                # a_ctg_data.append( (s, t, shortest_path) ) #first path is the same as the one used in the primary contig
+                while 1:
+                    n0 = shortest_path[0]
+                    for n1 in shortest_path[1:]:
+                        c_graph.remove_edge(n0, n1)
+                        n0 = n1
+                    try:
+                        shortest_path = nx.shortest_path(
+                            c_graph, s, t, "e_score")
+                        score = nx.shortest_path_length(
+                            c_graph, s, t, "e_score")
+                        #a_ctg_data.append( (s, t, shortest_path) )
+                        all_alt_path.append((score, shortest_path))
+
+                    except nx.exception.NetworkXNoPath:
+                        break
+                    # if len(shortest_path) < 2:
+                    #    break
+                # Is sorting required, if we are appending the shortest paths in order?
+                all_alt_path.sort()
+                all_alt_path.reverse()
+                shortest_path = all_alt_path[0][1]
+                # The longest branch in the compound unitig is added to the primary path.
+                if len(one_path) != 0:
+                    one_path.extend(shortest_path[1:])
+                else:
+                    one_path.extend(shortest_path)
+
+                a_ctg_group[(s, t)] = all_alt_path
+
+        if len(one_path) == 0:
+            continue
+
+        one_path_edges = list(zip(one_path[:-1], one_path[1:]))
+
+        # Compose the primary contig.
+        p_edge_lines, p_ctg_seq_chunks, p_total_score, p_total_length = compose_ctg(seqs, edge_data, ctg_id, one_path_edges, (not improper_p_ctg))
+
+        # Write out the tiling path.
+        p_ctg_t_out.write('\n'.join(p_edge_lines))
+        p_ctg_t_out.write('\n')
+
+        # Write the sequence.
+        # Using the `total_score` instead of `p_total_score` intentionally. Sum of
+        # edge scores is not identical to sum of unitig scores.
+        p_ctg_out.write('>%s %s %s %d %d\n' % (ctg_id, ctg_label, c_type_, p_total_length, total_score))
+        p_ctg_out.write(''.join(p_ctg_seq_chunks))
+        p_ctg_out.write('\n')
+
+        a_id = 0
+        for v, w in a_ctg_group:
+            atig_output = []
+
+            # Compose the base sequence.
+            for sub_id in xrange(len(a_ctg_group[(v, w)])):
+                score, atig_path = a_ctg_group[(v, w)][sub_id]
+                atig_path_edges = list(zip(atig_path[:-1], atig_path[1:]))
+
+                a_ctg_id = '%s-%03d-%02d' % (ctg_id, a_id + 1, sub_id)
+                a_edge_lines, sub_seqs, a_total_score, a_total_length = compose_ctg(
+                    seqs, edge_data, a_ctg_id, atig_path_edges, proper_a_ctg)
+
+                seq = ''.join(sub_seqs)
+
+                # Keep the placeholder for these values for legacy purposes, but mark
+                # them as for deletion.
+                # The base a_ctg will also be output to the same file, for simplicity.
+                delta_len = 0
+                idt = 1.0
+                cov = 1.0
+                atig_output.append((v, w, atig_path, a_total_length, a_total_score, seq, atig_path_edges, a_ctg_id, a_edge_lines, delta_len, idt, cov))
+
+            if len(atig_output) == 1:
                 continue
 
-            one_path_edges = list(zip(one_path[:-1], one_path[1:]))
-
-            # Compose the primary contig.
-            p_edge_lines, p_ctg_seq_chunks, p_total_score, p_total_length = compose_ctg(seqs, edge_data, ctg_id, one_path_edges, (not improper_p_ctg))
-
-            # Write out the tiling path.
-            p_ctg_t_out.write('\n'.join(p_edge_lines))
-            p_ctg_t_out.write('\n')
-
-            # Write the sequence.
-            # Using the `total_score` instead of `p_total_score` intentionally. Sum of
-            # edge scores is not identical to sum of unitig scores.
-            p_ctg_out.write('>%s %s %s %d %d\n' % (ctg_id, ctg_label, c_type_, p_total_length, total_score))
-            p_ctg_out.write(''.join(p_ctg_seq_chunks))
-            p_ctg_out.write('\n')
-
-            a_id = 0
-            for v, w in a_ctg_group:
-                atig_output = []
-
-                # Compose the base sequence.
-                for sub_id in xrange(len(a_ctg_group[(v, w)])):
-                    score, atig_path = a_ctg_group[(v, w)][sub_id]
-                    atig_path_edges = list(zip(atig_path[:-1], atig_path[1:]))
-
-                    a_ctg_id = '%s-%03d-%02d' % (ctg_id, a_id + 1, sub_id)
-                    a_edge_lines, sub_seqs, a_total_score, a_total_length = compose_ctg(
-                        seqs, edge_data, a_ctg_id, atig_path_edges, proper_a_ctg)
-
-                    seq = ''.join(sub_seqs)
-
-                    # Keep the placeholder for these values for legacy purposes, but mark
-                    # them as for deletion.
-                    # The base a_ctg will also be output to the same file, for simplicity.
-                    delta_len = 0
-                    idt = 1.0
-                    cov = 1.0
-                    atig_output.append((v, w, atig_path, a_total_length, a_total_score, seq, atig_path_edges, a_ctg_id, a_edge_lines, delta_len, idt, cov))
-
-                if len(atig_output) == 1:
-                    continue
-
-                for sub_id, data in enumerate(atig_output):
-                    v, w, tig_path, a_total_length, a_total_score, seq, atig_path_edges, a_ctg_id, a_edge_lines, delta_len, a_idt, cov = data
+            for sub_id, data in enumerate(atig_output):
+                v, w, tig_path, a_total_length, a_total_score, seq, atig_path_edges, a_ctg_id, a_edge_lines, delta_len, a_idt, cov = data
 
-                    # Write out the tiling path.
-                    a_ctg_t_out.write('\n'.join(a_edge_lines))
-                    a_ctg_t_out.write('\n')
+                # Write out the tiling path.
+                a_ctg_t_out.write('\n'.join(a_edge_lines))
+                a_ctg_t_out.write('\n')
 
-                    # Write the sequence.
-                    a_ctg_out.write('>%s %s %s %d %d %d %d %0.2f %0.2f\n' % (a_ctg_id, v, w, a_total_length, a_total_score, len(atig_path_edges), delta_len, idt, cov))
-                    a_ctg_out.write(''.join(seq))
-                    a_ctg_out.write('\n')
+                # Write the sequence.
+                a_ctg_out.write('>%s %s %s %d %d %d %d %0.2f %0.2f\n' % (a_ctg_id, v, w, a_total_length, a_total_score, len(atig_path_edges), delta_len, idt, cov))
+                a_ctg_out.write(''.join(seq))
+                a_ctg_out.write('\n')
 
-                a_id += 1
+            a_id += 1
 
     a_ctg_out.close()
     p_ctg_out.close()
     a_ctg_t_out.close()
     p_ctg_t_out.close()
+    if mmap_preads:
+        seqs.close()
 
 def main(argv=sys.argv):
     description = 'Generate the primary and alternate contig fasta files and tiling paths, given the string graph.'
@@ -331,6 +341,10 @@ We write these:
     parser.add_argument('--ctg-paths-fn', type=str,
             default='./ctg_paths',
             help='Input. File containing contig paths, produced by ovlp_to_graph.py.')
+    parser.add_argument('--mmap-preads', action='store_true',
+            help='Fetch each edge sequence from the memory-mapped preads file only when writing its contig, '
+            'so that memory use grows with the largest contig rather than with the whole layout. '
+            '(An up-to-date PREADS.fai, from fc_fasta_index, saves indexing the preads.)')
     args = parser.parse_args(argv[1:])
     run(**vars(args))
 
@@ -6,14 +6,11 @@ from builtins import zip
 from builtins import range
 from falcon_kit import kup, falcon, DWA
 from falcon_kit.fc_asm_graph import AsmGraph
+from falcon_kit.util.seq import revcomp
 import networkx as nx
 import sys
 
-RCMAP = dict(zip("ACGTacgtNn-", "TGCAtgcaNn-"))
-
-
-def rc(seq):
-    return "".join([RCMAP[c] for c in seq[::-1]])
+rc = revcomp
 
 
 def get_aln_data(t_seq, q_seq):
@@ -3,266 +3,465 @@ from __future__ import absolute_import
 
 from builtins import range
 from falcon_kit.multiproc import Pool
+from falcon_kit.overlaps import OVLP_TYPES, OVLP_TYPE_CODES
+import falcon_kit.overlaps as overlaps
 import falcon_kit.util.io as io
+import numpy as np
 import argparse
+import contextlib
+import functools
+import operator
 import os
+import shutil
+import struct
 import sys
+import tempfile
 
-Reader = io.CapturedProcessReaderContext
+Reader = io.BufferedProcessReaderContext
+
+CONTAINED = OVLP_TYPE_CODES['contained']
+CONTAINS = OVLP_TYPE_CODES['contains']
+# In stage 3, reads with more overlaps than this are pruned before sorting.
+BOUNDED_MIN_OVLPS = 256
+
+# Binary overlap cache, for decoding each LAS only once (--cache).
+# One record per LA4Falcon -mo line, all ints:
+#   q_id t_id score idt*100 q_strand q_s q_e q_l t_strand t_s t_e t_l type
+CACHE_RECORD = struct.Struct('<13i')
+CACHE_DTYPE = np.dtype([(name, '<i4') for name in overlaps.OVLP_DTYPE.names])
+CACHE_CHUNK = 1 << 16  # records
+
+
+def encode_ovlp(l, id_width):
+    """Return the split LA4Falcon -mo line 'l' as a tuple of 13 ints,
+    or None if format_ovlp() would not give back exactly 'l'.
+    """
+    if len(l) != 13:
+        return None
+    try:
+        idt_int, idt_frac = l[3].split('.')
+        rec = (int(l[0]), int(l[1]), int(l[2]), int(idt_int) * 100 + int(idt_frac),
+               int(l[4]), int(l[5]), int(l[6]), int(l[7]),
+               int(l[8]), int(l[9]), int(l[10]), int(l[11]),
+               OVLP_TYPE_CODES[l[12]])
+    except (ValueError, KeyError):
+        return None
+    if format_ovlp(rec, id_width) != l:
+        return None
+    return rec
+
+
+def format_ovlp(rec, id_width):
+    """Inverse of encode_ovlp().
+    """
+    return ['%0*d' % (id_width, rec[0]), '%0*d' % (id_width, rec[1]), str(rec[2]),
+            '%d.%02d' % divmod(rec[3], 100)] + \
+        [str(c) for c in rec[4:12]] + [OVLP_TYPES[rec[12]]]
+
+
+class CacheWriter(object):
+    """Pass lines through, while encoding them into 'cache_fn'.
+    If any line cannot be encoded exactly, the cache is abandoned
+    and 'ok' becomes False.
+    """
+
+    def tee(self, readlines):
+        buf = []
+        with open(self.cache_fn, 'wb') as ofs:
+            for line in readlines():
+                if self.ok:
+                    l = line.strip().split()
+                    if self.id_width is None:
+                        self.id_width = len(l[0])
+                    rec = encode_ovlp(l, self.id_width)
+                    if rec is None:
+                        io.LOG('Cannot cache {!r} from {!r}; not caching it.'.format(
+                            line, self.cache_fn))
+                        self.ok = False
+                    else:
+                        buf.append(CACHE_RECORD.pack(*rec))
+                        if len(buf) >= CACHE_CHUNK:
+                            ofs.write(b''.join(buf))
+                            buf = []
+                yield line
+            if self.ok:
+                ofs.write(b''.join(buf))
+        if not self.ok:
+            os.remove(self.cache_fn)
+
+    def __init__(self, cache_fn):
+        self.cache_fn = cache_fn
+        self.id_width = None
+        self.ok = True
+
+
+def read_cache(cache_fn):
+    """Yield (None, records) for the cache, like overlaps.iter_chunks().
+    """
+    def chunks():
+        with open(cache_fn, 'rb') as ifs:
+            while True:
+                raw = np.fromfile(ifs, dtype=CACHE_DTYPE, count=CACHE_CHUNK)
+                if not len(raw):
+                    break
+                recs = np.empty(len(raw), dtype=overlaps.OVLP_DTYPE)
+                for name in overlaps.OVLP_DTYPE.names:
+                    recs[name] = raw[name]
+                recs['idt'] = raw['idt'] / 100.0
+                yield None, recs
+    return overlaps.group_chunks(chunks())
+
+
+def format_record(rec, id_width):
+    """Return a cached record, as read by read_cache(), as the split
+    line that it came from.
+    """
+    rec = list(rec.tolist())
+    rec[3] = int(round(rec[3] * 100))
+    return format_ovlp(rec, id_width)
+
+
+# Read ids (as overlaps.IdBitmap) needed by the workers of the current stage.
+# They are handed over once per worker, by the Pool initializer, rather
+# than pickled with every task.
+stage_ids = {}
+
+
+def set_stage_ids(ids):
+    stage_ids.clear()
+    stage_ids.update(ids)
+
+
+@contextlib.contextmanager
+def stage_pool(n_core, **ids):
+    """Yield a Pool of 'n_core' workers, which see 'ids' in stage_ids.
+    """
+    exe_pool = Pool(n_core, initializer=set_stage_ids, initargs=(ids,))
+    try:
+        yield exe_pool
+    except:
+        io.LOG('terminating ovlp_filter workers...')
+        exe_pool.terminate()
+        raise
+    else:
+        exe_pool.close()
+        exe_pool.join()
 
 
 def run_filter_stage1(db_fn, fn, max_diff, max_ovlp, min_ovlp, min_len):
     cmd = "LA4Falcon -mo %s %s" % (db_fn, fn)
     reader = Reader(cmd)
     with reader:
-        return fn, filter_stage1(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len)
+        ignore = filter_stage1(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len)
+    return fn, overlaps.IdBitmap(ignore)
 
 
 def filter_stage1(readlines, max_diff, max_ovlp, min_ovlp, min_len):
-    def ignore(overlap_data):
-        left_count = overlap_data["5p"]
-        right_count = overlap_data["3p"]
-        if (abs(left_count - right_count) > max_diff) or \
-           (left_count > max_ovlp) or (right_count > max_ovlp) or \
-           (left_count < min_ovlp) or (right_count < min_ovlp):
-            return True
-
     ignore_rtn = []
-    current_q_id = None
-    ave_idt = 0.0
-    all_over_len = 0.0
-    overlap_data = {"5p": 0, "3p": 0}
-    q_id = None
-    for l in readlines():
-        l = l.strip().split()
-        q_id, t_id = l[:2]
-
-        if q_id != current_q_id:
-            if current_q_id is not None:
-                if ignore(overlap_data):
-                    ignore_rtn.append(current_q_id)
-            overlap_data = {"5p": 0, "3p": 0}
-            current_q_id = q_id
-            ave_idt = 0.0
-            all_over_len = 0.0
-
-        overlap_len = -int(l[2])
-        idt = float(l[3])
-        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
-        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
-
-        if idt < 90.0:
-            continue
-        if q_l < min_len or t_l < min_len:
-            continue
-        if l[-1] in ("contains", "overlap"):
-            ave_idt += idt * overlap_len
-            all_over_len += overlap_len
-        if q_s == 0:
-            overlap_data["5p"] += 1
-        if q_e == q_l:
-            overlap_data["3p"] += 1
-    if q_id is not None:
-        if ignore(overlap_data):
-            ignore_rtn.append(current_q_id)
+    for lines, recs in overlaps.iter_chunks(readlines):
+        starts = overlaps.run_starts(recs['q_id'])
+        ok = (recs['idt'] >= 90.0) & \
+             (recs['q_l'] >= min_len) & (recs['t_l'] >= min_len)
+        left_count = overlaps.run_sums(ok & (recs['q_s'] == 0), starts)
+        right_count = overlaps.run_sums(ok & (recs['q_e'] == recs['q_l']), starts)
+        ignore = (np.abs(left_count - right_count) > max_diff) | \
+                 (left_count > max_ovlp) | (right_count > max_ovlp) | \
+                 (left_count < min_ovlp) | (right_count < min_ovlp)
+        ignore_rtn.extend(overlaps.fields(lines[i], 1)[0] for i in starts[ignore])
     return ignore_rtn
 
 
-def run_filter_stage2(db_fn, fn, max_diff, max_ovlp, min_ovlp, min_len, ignore_set):
+def run_filter_stage1_cached(db_fn, fn, cache_fn, max_diff, max_ovlp, min_ovlp, min_len):
+    """Like run_filter_stage1(), but also write the binary cache for
+    the later stages. Return (fn, ignore, ok, id_width), where 'ok' is
+    False if the cache could not be written, and id_width is None for
+    an empty LAS file.
+    """
     cmd = "LA4Falcon -mo %s %s" % (db_fn, fn)
     reader = Reader(cmd)
+    writer = CacheWriter(cache_fn)
     with reader:
-        return fn, filter_stage2(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len, ignore_set)
+        ignore = filter_stage1(lambda: writer.tee(reader.readlines), max_diff, max_ovlp, min_ovlp, min_len)
+    return fn, overlaps.IdBitmap(ignore), writer.ok, writer.id_width
+
+
+def run_filter_stage2(db_fn, fn, max_diff, max_ovlp, min_ovlp, min_len):
+    cmd = "LA4Falcon -mo %s %s" % (db_fn, fn)
+    reader = Reader(cmd)
+    with reader:
+        contained = filter_stage2(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len, stage_ids['ignore'])
+    return fn, overlaps.IdBitmap(contained)
 
 
 def filter_stage2(readlines, max_diff, max_ovlp, min_ovlp, min_len, ignore_set):
     contained_id = set()
-    for l in readlines():
-        l = l.strip().split()
-        q_id, t_id = l[:2]
-
-        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
-        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
-
-        idt = float(l[3])
-        if idt < 90:
-            continue
-
-        if q_l < min_len or t_l < min_len:
-            continue
-
-        if q_id in ignore_set:
-            continue
-        if t_id in ignore_set:
-            continue
-        if l[-1] == "contained":
-            contained_id.add(q_id)
-        if l[-1] == "contains":
-            contained_id.add(t_id)
+    ignore_ids = overlaps.id_bitmap(ignore_set)
+    for lines, recs in overlaps.iter_chunks(readlines):
+        contained, contains = find_contained(recs, min_len, ignore_ids)
+        contained_id.update(overlaps.fields(lines[i], 1)[0] for i in contained)
+        contained_id.update(overlaps.fields(lines[i], 2)[1] for i in contains)
     return contained_id
 
 
-def run_filter_stage3(db_fn, fn, max_diff, max_ovlp, min_ovlp, min_len, ignore_set, contained_set, bestn):
+def find_contained(recs, min_len, ignore_ids):
+    """Return the indices of the 'contained' and the 'contains' overlaps
+    which count for stage 2.
+    """
+    ok = (recs['idt'] >= 90) & \
+         (recs['q_l'] >= min_len) & (recs['t_l'] >= min_len) & \
+         ~ignore_ids.contains(recs['q_id']) & \
+         ~ignore_ids.contains(recs['t_id'])
+    return (np.flatnonzero(ok & (recs['type'] == CONTAINED)),
+            np.flatnonzero(ok & (recs['type'] == CONTAINS)))
+
+
+def run_filter_stage2_cached(cache_fn, max_diff, max_ovlp, min_ovlp, min_len):
+    return cache_fn, filter_stage2_records(read_cache(cache_fn), max_diff, max_ovlp, min_ovlp, min_len, stage_ids['ignore'])
+
+
+def filter_stage2_records(chunks, max_diff, max_ovlp, min_ovlp, min_len, ignore_ids):
+    """Same as filter_stage2(), but on cached records, as an IdBitmap.
+    """
+    contained_id = [np.zeros(0, dtype=np.int64)]
+    for _, recs in chunks:
+        contained, contains = find_contained(recs, min_len, ignore_ids)
+        contained_id.append(recs['q_id'][contained])
+        contained_id.append(recs['t_id'][contains])
+    return overlaps.IdBitmap(np.concatenate(contained_id))
+
+
+def run_filter_stage3(db_fn, fn, max_diff, max_ovlp, min_ovlp, min_len, bestn):
     cmd = "LA4Falcon -mo %s %s" % (db_fn, fn)
     reader = Reader(cmd)
     with reader:
-        return fn, filter_stage3(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len, ignore_set, contained_set, bestn)
+        return fn, filter_stage3(reader.readlines, max_diff, max_ovlp, min_ovlp, min_len, stage_ids['ignore'], stage_ids['contained'], bestn)
 
 
 def filter_stage3(readlines, max_diff, max_ovlp, min_ovlp, min_len, ignore_set, contained_set, bestn):
     ovlp_output = []
-    overlap_data = {"5p": [], "3p": []}
-    current_q_id = None
-    for l in readlines():
-        l = l.strip().split()
-        q_id, t_id = l[:2]
-
-        if current_q_id == None:
-            current_q_id = q_id
-            overlap_data = {"5p": [], "3p": []}
-
-        elif q_id != current_q_id:
-
-            left = overlap_data["5p"]
-            right = overlap_data["3p"]
-            left.sort()
-            right.sort()
-
-            for i in range(len(left)):
-                score, m_range, ovlp = left[i]
-                ovlp_output.append(ovlp)
-                # print " ".join(ovlp), read_end_data[current_q_id]
-                if i >= bestn and m_range > 1000:
-                    break
-
-            for i in range(len(right)):
-                score, m_range, ovlp = right[i]
-                ovlp_output.append(ovlp)
-                # print " ".join(ovlp), read_end_data[current_q_id]
-                if i >= bestn and m_range > 1000:
-                    break
+    skip_ids = overlaps.id_bitmap(ignore_set) | overlaps.id_bitmap(contained_set)
+    for lines, recs in overlaps.iter_chunks(readlines):
+        idx, keys, selected = select_best(recs, min_len, skip_ids, bestn)
+        ovlp_output.extend(split_sorted(lambda i: lines[i].split(), idx, keys, selected))
+    return ovlp_output
 
-            overlap_data = {"5p": [], "3p": []}
-            current_q_id = q_id
-
-        if q_id in contained_set:
-            continue
-        if t_id in contained_set:
-            continue
-        if q_id in ignore_set:
-            continue
-        if t_id in ignore_set:
-            continue
-
-        overlap_len = -int(l[2])
-        idt = float(l[3])
-        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
-        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
-
-        if idt < 90:
-            continue
-        if q_l < min_len or t_l < min_len:
-            continue
-
-        if q_s == 0:
-            overlap_data["5p"].append((-overlap_len,  t_l - (t_e - t_s),  l))
-        elif q_e == q_l:
-            overlap_data["3p"].append((-overlap_len, t_l - (t_e - t_s), l))
-
-    left = overlap_data["5p"]
-    right = overlap_data["3p"]
-    left.sort()
-    right.sort()
-
-    for i in range(len(left)):
-        score, m_range, ovlp = left[i]
-        ovlp_output.append(ovlp)
-        # print " ".join(ovlp), read_end_data[current_q_id]
-        if i >= bestn and m_range > 1000:
-            break
-
-    for i in range(len(right)):
-        score, m_range, ovlp = right[i]
-        ovlp_output.append(ovlp)
-        # print " ".join(ovlp), read_end_data[current_q_id]
-        if i >= bestn and m_range > 1000:
-            break
 
+def select_best(recs, min_len, skip_ids, bestn):
+    """For stage 3, sort the 5p and the 3p overlaps of each query by
+    (score, m_range). Keep the first 'bestn', and then up to the first
+    with m_range > 1000.
+    Return (idx, keys, selected): the sorted indices into 'recs', the
+    sort keys (sorted too), and which of those are kept.
+    """
+    n = len(recs)
+    q_starts = overlaps.run_starts(recs['q_id'])
+    q_sizes = overlaps.run_sizes(q_starts, n)
+    q_run = np.repeat(np.arange(len(q_starts)), q_sizes)
+    # 0 for 5p, 1 for 3p, 2 for neither.
+    end = np.where(recs['q_s'] == 0, 0,
+                   np.where(recs['q_e'] == recs['q_l'], 1, 2))
+    m_range = recs['t_l'] - (recs['t_e'] - recs['t_s'])
+    ok = (end < 2) & (recs['idt'] >= 90) & \
+         (recs['q_l'] >= min_len) & (recs['t_l'] >= min_len) & \
+         ~skip_ids.contains(recs['q_id']) & \
+         ~skip_ids.contains(recs['t_id'])
+    # Most overlaps of a repetitive read can be dropped before sorting.
+    for r in np.flatnonzero(q_sizes > BOUNDED_MIN_OVLPS):
+        rows = np.arange(q_starts[r], q_starts[r] + q_sizes[r])
+        for e in (0, 1):
+            end_rows = rows[ok[rows] & (end[rows] == e)]
+            ok[end_rows[beyond_best(recs['score'][end_rows], m_range[end_rows], bestn)]] = False
+    idx = np.flatnonzero(ok)
+    keys = (m_range[idx], recs['score'][idx], end[idx], q_run[idx])
+    order = np.lexsort(keys)
+    idx = idx[order]
+    keys = [k[order] for k in keys]
+    # Ties have the same m_range, so this does not depend on their order.
+    group = 2 * keys[3] + keys[2]
+    starts = overlaps.run_starts(group)
+    last = (overlaps.run_offsets(starts, len(idx)) >= bestn) & (keys[0] > 1000)
+    n_last_before = np.cumsum(last) - last
+    n_last_before -= np.repeat(n_last_before[starts], overlaps.run_sizes(starts, len(idx)))
+    return idx, keys, n_last_before == 0
+
+
+def beyond_best(score, m_range, bestn):
+    """Return a mask of the overlaps of one read end which select_best()
+    cannot keep, without sorting them.
+
+    The last one kept is the first with m_range > 1000 after the first
+    'bestn', so it is no later than the (bestn+1)th best with m_range > 1000.
+    Anything with a worse score comes after it.
+    """
+    long_score = score[m_range > 1000]
+    if len(long_score) <= bestn:
+        return np.zeros(len(score), dtype=bool)
+    return score > np.partition(long_score, bestn)[bestn]
+
+
+def split_sorted(split, idx, keys, selected):
+    """Return split(i) for each i in 'idx' where 'selected', given that
+    'idx' is sorted by the arrays 'keys'. Ties on 'keys' are sorted by
+    the split lines themselves.
+    """
+    ovlps = [None] * len(idx)
+    tied = np.ones(max(len(idx) - 1, 0), dtype=bool)
+    for k in keys:
+        tied &= (k[1:] == k[:-1])
+    n_selected = np.concatenate(([0], np.cumsum(selected)))
+    for start, end in tie_runs(tied):
+        if n_selected[end] > n_selected[start]:
+            ovlps[start:end] = sorted(split(i) for i in idx[start:end])
+    return [ovlps[p] or split(idx[p]) for p in np.flatnonzero(selected)]
+
+
+def tie_runs(tied):
+    """Return the (start, end) of each run of elements equal to their
+    successor, where tied[i] means element i equals element i+1.
+    """
+    edges = np.diff(np.concatenate(([0], tied.astype(np.int8), [0])))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) + 1)
+
+
+def run_filter_stage3_cached(cache_fn, id_width, max_diff, max_ovlp, min_ovlp, min_len, bestn):
+    return cache_fn, filter_stage3_records(read_cache(cache_fn), id_width, max_diff, max_ovlp, min_ovlp, min_len, stage_ids['ignore'], stage_ids['contained'], bestn)
+
+
+def filter_stage3_records(chunks, id_width, max_diff, max_ovlp, min_ovlp, min_len, ignore_ids, contained_ids, bestn):
+    """Same as filter_stage3(), but on cached records, with IdBitmaps.
+    Return the selected overlaps as split lines, like filter_stage3().
+    """
+    ovlp_output = []
+    skip_ids = ignore_ids | contained_ids
+    for _, recs in chunks:
+        idx, keys, selected = select_best(recs, min_len, skip_ids, bestn)
+        ovlp_output.extend(split_sorted(lambda i: format_record(recs[i], id_width), idx, keys, selected))
     return ovlp_output
 
 
-def run_ovlp_filter(outs, exe_pool, file_list, max_diff, max_cov, min_cov, min_len, bestn, db_fn):
+def union(bitmaps):
+    return functools.reduce(operator.or_, bitmaps, overlaps.IdBitmap())
+
+
+def run_ovlp_filter(outs, n_core, file_list, max_diff, max_cov, min_cov, min_len, bestn, db_fn, cache_dir=None):
+    if cache_dir:
+        return run_ovlp_filter_cached(outs, n_core, file_list, max_diff, max_cov, min_cov, min_len, bestn, db_fn, cache_dir)
+    file_list = [fn for fn in file_list if len(fn) != 0]
     io.LOG('preparing filter_stage1')
     io.logstats()
     inputs = []
     for fn in file_list:
-        if len(fn) != 0:
-            inputs.append((run_filter_stage1, db_fn, fn,
-                           max_diff, max_cov, min_cov, min_len))
-
-    ignore_all = []
-    for res in exe_pool.imap(io.run_func, inputs):
-        ignore_all.extend(res[1])
+        inputs.append((run_filter_stage1, db_fn, fn,
+                       max_diff, max_cov, min_cov, min_len))
+    with stage_pool(n_core) as exe_pool:
+        ignore_all = union(res[1] for res in exe_pool.imap(io.run_func, inputs))
 
     io.LOG('preparing filter_stage2')
     io.logstats()
     inputs = []
-    ignore_all = set(ignore_all)
     for fn in file_list:
-        if len(fn) != 0:
-            inputs.append((run_filter_stage2, db_fn, fn, max_diff,
-                           max_cov, min_cov, min_len, ignore_all))
-    contained = set()
-    for res in exe_pool.imap(io.run_func, inputs):
-        contained.update(res[1])
-        # print res[0], len(res[1]), len(contained)
-
-    # print "all", len(contained)
+        inputs.append((run_filter_stage2, db_fn, fn, max_diff,
+                       max_cov, min_cov, min_len))
+    with stage_pool(n_core, ignore=ignore_all) as exe_pool:
+        contained = union(res[1] for res in exe_pool.imap(io.run_func, inputs))
+
     io.LOG('preparing filter_stage3')
     io.logstats()
     inputs = []
-    ignore_all = set(ignore_all)
     for fn in file_list:
-        if len(fn) != 0:
-            inputs.append((run_filter_stage3, db_fn, fn, max_diff,
-                           max_cov, min_cov, min_len, ignore_all, contained, bestn))
-    for res in exe_pool.imap(io.run_func, inputs):
-        for l in res[1]:
-            outs.write(" ".join(l) + "\n")
+        inputs.append((run_filter_stage3, db_fn, fn, max_diff,
+                       max_cov, min_cov, min_len, bestn))
+    with stage_pool(n_core, ignore=ignore_all, contained=contained) as exe_pool:
+        for res in exe_pool.imap(io.run_func, inputs):
+            for l in res[1]:
+                outs.write(" ".join(l) + "\n")
     io.logstats()
 
 
-def try_run_ovlp_filter(out_fn, n_core, fofn, max_diff, max_cov, min_cov, min_len, bestn, db_fn):
+def run_ovlp_filter_cached(outs, n_core, file_list, max_diff, max_cov, min_cov, min_len, bestn, db_fn, cache_dir):
+    """Same output as run_ovlp_filter(), but LA4Falcon runs only once
+    per LAS file. Stage 1 also writes a binary cache, which stages 2
+    and 3 read instead of re-decoding the LAS file.
+    """
+    io.LOG('preparing filter_stage1, with cache in {!r}'.format(cache_dir))
+    io.logstats()
+    file_list = [fn for fn in file_list if len(fn) != 0]
+    cache_fns = [os.path.join(cache_dir, '{}.{}.ovl.bin'.format(i, os.path.basename(fn)))
+                 for (i, fn) in enumerate(file_list)]
+    inputs = []
+    for fn, cache_fn in zip(file_list, cache_fns):
+        inputs.append((run_filter_stage1_cached, db_fn, fn, cache_fn,
+                       max_diff, max_cov, min_cov, min_len))
+    ignore_all = overlaps.IdBitmap()
+    all_ok = True
+    id_widths = set()
+    with stage_pool(n_core) as exe_pool:
+        for fn, ignore, ok, id_width in exe_pool.imap(io.run_func, inputs):
+            ignore_all |= ignore
+            all_ok = all_ok and ok
+            if id_width is not None:
+                id_widths.add(id_width)
+    if not all_ok or len(id_widths) > 1:
+        io.LOG('WARNING: Could not cache every LAS file (id widths {!r}). Running stages 2 and 3 from LA4Falcon.'.format(
+            id_widths))
+        # Stage 1 is repeated, but the result is the same as without --cache.
+        return run_ovlp_filter(outs, n_core, file_list, max_diff, max_cov, min_cov, min_len, bestn, db_fn)
+    id_width = id_widths.pop() if id_widths else 9
+
+    io.LOG('preparing filter_stage2')
+    io.logstats()
+    inputs = []
+    for cache_fn in cache_fns:
+        inputs.append((run_filter_stage2_cached, cache_fn, max_diff,
+                       max_cov, min_cov, min_len))
+    with stage_pool(n_core, ignore=ignore_all) as exe_pool:
+        contained = union(res[1] for res in exe_pool.imap(io.run_func, inputs))
+
+    io.LOG('preparing filter_stage3')
+    io.logstats()
+    inputs = []
+    for cache_fn in cache_fns:
+        inputs.append((run_filter_stage3_cached, cache_fn, id_width, max_diff,
+                       max_cov, min_cov, min_len, bestn))
+    with stage_pool(n_core, ignore=ignore_all, contained=contained) as exe_pool:
+        for res in exe_pool.imap(io.run_func, inputs):
+            for l in res[1]:
+                outs.write(" ".join(l) + "\n")
+    io.logstats()
+
+
+def try_run_ovlp_filter(out_fn, n_core, fofn, max_diff, max_cov, min_cov, min_len, bestn, db_fn, cache=False):
     io.LOG('starting ovlp_filter')
     file_list = io.validated_fns(fofn)
     io.LOG('fofn %r: %r' % (fofn, file_list))
     n_core = min(n_core, len(file_list))
-    exe_pool = Pool(n_core)
     tmp_out_fn = out_fn + '.tmp'
+    cache_dir = None
+    if cache:
+        cache_dir = tempfile.mkdtemp(prefix='ovlp_filter_cache.', dir=os.path.dirname(os.path.abspath(out_fn)))
     try:
         with open(tmp_out_fn, 'w') as outs:
-            run_ovlp_filter(outs, exe_pool, file_list, max_diff, max_cov,
-                            min_cov, min_len, bestn, db_fn)
+            run_ovlp_filter(outs, n_core, file_list, max_diff, max_cov,
+                            min_cov, min_len, bestn, db_fn, cache_dir)
             outs.write('---\n')
         os.rename(tmp_out_fn, out_fn)
         io.LOG('finished ovlp_filter')
-    except:
-        io.LOG('terminating ovlp_filter workers...')
-        exe_pool.terminate()
-        raise
+    finally:
+        if cache_dir:
+            shutil.rmtree(cache_dir)
 
 
-def ovlp_filter(out_fn, n_core, las_fofn, max_diff, max_cov, min_cov, min_len, bestn, db_fn, debug, silent, stream):
+def ovlp_filter(out_fn, n_core, las_fofn, max_diff, max_cov, min_cov, min_len, bestn, db_fn, debug, silent, stream, capture, cache):
     if debug:
         n_core = 0
         silent = False
     if silent:
         io.LOG = io.write_nothing
-    if stream:
+    if capture:
         global Reader
-        Reader = io.StreamedProcessReaderContext
+        Reader = io.CapturedProcessReaderContext
     try_run_ovlp_filter(out_fn, n_core, las_fofn, max_diff, max_cov,
-                        min_cov, min_len, bestn, db_fn)
+                        min_cov, min_len, bestn, db_fn, cache)
 
 
 def parse_args(argv):
@@ -305,7 +504,13 @@ def parse_args(argv):
         help="output at least best n overlaps on 5' or 3' ends if possible")
     parser.add_argument(
         '--stream', action='store_true',
-        help='stream from LA4Falcon, instead of slurping all at once; can save memory for large data')
+        help='ignored; LA4Falcon output is always streamed, unless --capture')
+    parser.add_argument(
+        '--capture', action='store_true',
+        help='slurp all LA4Falcon output at once, instead of streaming it in blocks; uses much more memory')
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='run LA4Falcon once per LAS file, keeping a compact binary copy of its output (next to --out-fn) for stages 2 and 3')
     parser.add_argument(
         '--debug', '-g', action='store_true',
         help="single-threaded, plus other aids to debugging")
@@ -3,64 +3,31 @@ from __future__ import print_function
 
 
 from falcon_kit.multiproc import Pool
+import falcon_kit.overlaps as overlaps
 import falcon_kit.util.io as io
+import numpy as np
 import argparse
 import shlex
 import subprocess as sp
 import sys
 import traceback
 
-Reader = io.CapturedProcessReaderContext
+Reader = io.BufferedProcessReaderContext
 
 
 def filter_stats(readlines, min_len):
-    current_q_id = None
-    ave_idt = 0.0
-    all_over_len = 0.0
-    overlap_data = {"5p": 0, "3p": 0}
-    q_id = None
     rtn_data = []
-    q_l = 0
-    for l in readlines():
-        l = l.strip().split()
-        q_id, t_id = l[:2]
-
-        if q_id != current_q_id:
-            left_count = overlap_data["5p"]
-            right_count = overlap_data["3p"]
-            if (current_q_id != None and
-                    (left_count > 0 or right_count > 0)):
-                rtn_data.append((current_q_id, q_l, left_count, right_count))
-            overlap_data = {"5p": 0, "3p": 0}
-            current_q_id = q_id
-            ave_idt = 0.0
-            all_over_len = 0.0
-
-        overlap_len = -int(l[2])
-        idt = float(l[3])
-        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
-        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
-
-        if q_l < min_len or t_l < min_len:
-            continue
-
-        if idt < 90:
-            continue
-
-        if l[-1] in ("contains", "overlap"):
-            ave_idt += idt * overlap_len
-            all_over_len += overlap_len
-        if q_s == 0:
-            overlap_data["5p"] += 1
-        if q_e == q_l:
-            overlap_data["3p"] += 1
-
-    if q_id != None:
-        left_count = overlap_data["5p"]
-        right_count = overlap_data["3p"]
-        if (left_count > 0 or right_count > 0):
-            rtn_data.append((q_id, q_l, left_count, right_count))
-
+    for lines, recs in overlaps.iter_chunks(readlines):
+        starts = overlaps.run_starts(recs['q_id'])
+        ends = overlaps.run_sizes(starts, len(recs)) + starts
+        ok = (recs['q_l'] >= min_len) & (recs['t_l'] >= min_len) & \
+             (recs['idt'] >= 90)
+        left_count = overlaps.run_sums(ok & (recs['q_s'] == 0), starts)
+        right_count = overlaps.run_sums(ok & (recs['q_e'] == recs['q_l']), starts)
+        for i in np.flatnonzero((left_count > 0) | (right_count > 0)):
+            q_id = overlaps.fields(lines[starts[i]], 1)[0]
+            q_l = recs['q_l'][ends[i] - 1]
+            rtn_data.append((q_id, int(q_l), int(left_count[i]), int(right_count[i])))
     return rtn_data
 
 
@@ -100,15 +67,15 @@ def try_run_ovlp_stats(n_core, db_fn, fofn, min_len):
         exe_pool.terminate()
 
 
-def ovlp_stats(db_fn, fofn, min_len, n_core, stream, debug, silent):
+def ovlp_stats(db_fn, fofn, min_len, n_core, stream, capture, debug, silent):
     if debug:
         n_core = 0
         silent = False
     if silent:
         io.LOG = io.write_nothing
-    if stream:
+    if capture:
         global Reader
-        Reader = io.StreamedProcessReaderContext
+        Reader = io.CapturedProcessReaderContext
     try_run_ovlp_stats(n_core, db_fn, fofn, min_len)
 
 
@@ -125,7 +92,9 @@ def parse_args(argv):
     parser.add_argument('--db-fn', default='./1-preads_ovl/preads.db',
                         help="DAZZLER DB of preads")
     parser.add_argument('--stream', action='store_true',
-                        help='stream from LA4Falcon, instead of slurping all at once; can save memory for large data')
+                        help='ignored; LA4Falcon output is always streamed, unless --capture')
+    parser.add_argument('--capture', action='store_true',
+                        help='slurp all LA4Falcon output at once, instead of streaming it in blocks; uses much more memory')
     parser.add_argument('--debug', '-g', action='store_true',
                         help="single-threaded, plus other aids to debugging")
     parser.add_argument('--silent', action='store_true',
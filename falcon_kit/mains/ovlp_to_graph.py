@@ -3,46 +3,28 @@ from __future__ import print_function
 
 
 from future.utils import viewitems
-from future.utils import itervalues
 from builtins import object
+from builtins import zip
+from falcon_kit.multiproc import Pool
+from falcon_kit.overlaps import OVLP_TYPE_CODES
+from falcon_kit.stats_preassembly import read_len_above
+import array
+import hashlib
+import logging
+import falcon_kit.graph_files as graph_files
+import falcon_kit.overlaps as overlaps
+import falcon_kit.unitig_graph as unitig_graph
 import networkx as nx
+import numpy as np
 import os
 import shlex
 import subprocess
 import sys
 
+LOG = logging.getLogger(__name__)
 DEBUG_LOG_LEVEL = 0
-
-
-class SGNode(object):
-    """
-    class representing a node in the string graph
-    """
-
-    def __init__(self, node_name):
-        self.name = node_name
-        self.out_edges = []
-        self.in_edges = []
-
-    def add_out_edge(self, out_edge):
-        self.out_edges.append(out_edge)
-
-    def add_in_edge(self, in_edge):
-        self.in_edges.append(in_edge)
-
-
-class SGEdge(object):
-    """
-    class representing an edge in the string graph
-    """
-
-    def __init__(self, in_node, out_node):
-        self.in_node = in_node
-        self.out_node = out_node
-        self.attr = {}
-
-    def set_attribute(self, attr, value):
-        self.attr[attr] = value
+# of the overlap store written for --overlap-cache
+OVERLAP_STORE_VERSION = 1
 
 
 def reverse_end(node_name):
@@ -59,46 +41,140 @@ def reverse_end(node_name):
 class StringGraph(object):
     """
     class representing the string graph
+
+    Nodes are ints: read i has node 2*i for its B end and 2*i+1 for its
+    E end, so the reverse of node n is n ^ 1. Edges are ints too, indexing
+    parallel arrays of edge attributes, and e_reduce is a bool array over
+    the edges. Call freeze() after the last add_edge(), before marking;
+    adding an edge later unfreezes the graph. Nodes are visited in the
+    order a dict of their names iterates them (see dict_order()), and
+    edges in the order they were added, except that the out-edges of
+    each node are sorted by length; edge_order() gives the order to
+    write them in.
     """
 
     def __init__(self):
-        self.nodes = {}
-        self.edges = {}
-        self.n_mark = {}
-        self.e_reduce = {}
-        self.repeat_overlap = {}
-        self.best_out = {}
-        self.best_in = {}
-
-    def add_node(self, node_name):
+        self.read_names = []
+        self.read_index = {}
+        self._new_edges = [array.array(t) for (k, t) in EDGE_FIELDS]
+        self._edge_chunks = []
+        self.frozen = False
+
+    def add_read(self, read_name):
+        """
+        add a read (both its nodes) into the graph, and return its index
+        """
+        i = self.read_index.get(read_name)
+        if i is None:
+            i = self.read_index[read_name] = len(self.read_names)
+            self.read_names.append(read_name)
+        return i
+
+    def node_name(self, n):
+        return '%s:%s' % (self.read_names[n >> 1], 'BE'[n & 1])
+
+    def add_edge(self, in_node, out_node, label, length, score, identity):
         """
-        add a node into the graph by given a node name
+        add an edge into the graph by given a pair of nodes;
+        label is (read index, start, end)
         """
-        if node_name not in self.nodes:
-            self.nodes[node_name] = SGNode(node_name)
+        rid, sp, tp = label
+        self.frozen = False
+        for (col, v) in zip(self._new_edges, (in_node, out_node, rid, sp, tp, length, score, identity)):
+            col.append(v)
 
-    def add_edge(self, in_node_name, out_node_name, **attributes):
+    def add_edges(self, *columns):
         """
-        add an edge into the graph by given a pair of nodes
+        add edges from arrays, one for each of EDGE_FIELDS
         """
-        if (in_node_name, out_node_name) not in self.edges:
+        self._flush_edges()
+        self.frozen = False
+        self._edge_chunks.append([np.asarray(col, dtype=np.dtype(t))
+                                  for (col, (k, t)) in zip(columns, EDGE_FIELDS)])
+
+    def _flush_edges(self):
+        if len(self._new_edges[0]):
+            self._edge_chunks.append([np.array(col, dtype=np.dtype(t))
+                                      for (col, (k, t)) in zip(self._new_edges, EDGE_FIELDS)])
+            self._new_edges = [array.array(t) for (k, t) in EDGE_FIELDS]
+
+    def freeze(self):
+        """
+        build the adjacency arrays, and clear the reduction marks
+        """
+        n_nodes = self.n_nodes = 2 * len(self.read_names)
+        self._flush_edges()
+        for (i, (k, t)) in enumerate(EDGE_FIELDS):
+            setattr(self, k, np.concatenate([np.empty(0, dtype=np.dtype(t))] +
+                                            [chunk[i] for chunk in self._edge_chunks]))
+        # An edge added again keeps its place but takes the new attributes.
+        key = self.src.astype(np.int64) * n_nodes + self.dst
+        order = np.argsort(key, kind='mergesort')
+        key = key[order]
+        first = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        if len(first) < len(order):
+            last = np.append(first[1:], len(order)) - 1
+            for (k, t) in EDGE_FIELDS:
+                col = getattr(self, k)
+                col[order[first]] = col[order[last]]
+            keep = np.zeros(len(order), dtype=bool)
+            keep[order[first]] = True
+            for (k, t) in EDGE_FIELDS:
+                setattr(self, k, getattr(self, k)[keep])
+            key = key[first]
+            order = np.argsort(np.argsort(order[first]))
+        # The reverse of edge v->w is w'->v', where n' is n ^ 1.
+        rev_key = (self.dst ^ 1).astype(np.int64) * n_nodes + (self.src ^ 1)
+        pos = np.searchsorted(key, rev_key)
+        found = pos < len(key)
+        found[found] = key[pos[found]] == rev_key[found]
+        self.rev = np.full(len(key), -1, dtype=np.int64)
+        self.rev[found] = order[pos[found]]
+        self._edge_chunks = [[getattr(self, k) for (k, t) in EDGE_FIELDS]]
+        self.out_ptr, self.out_edges = csr(self.src, n_nodes, by=self.length)
+        self.in_ptr, self.in_edges = csr(self.dst, n_nodes)
+        ends = np.empty(2 * len(self.src), dtype=self.src.dtype)
+        ends[0::2] = self.src
+        ends[1::2] = self.dst
+        nodes, first_seen = np.unique(ends, return_index=True)
+        nodes = nodes[np.argsort(first_seen)]
+        self.nodes = nodes[dict_order(len(nodes), (self.node_name(n) for n in nodes.tolist()))]
+        self.e_reduce = np.zeros(len(self.src), dtype=bool)
+        self.best_out = np.full(n_nodes, -1, dtype=np.int64)
+        self.best_in = np.full(n_nodes, -1, dtype=np.int64)
+        self.frozen = True
+
+    def edge_order(self, names):
+        """
+        return the order to write the edges in, given the node names
+        """
+        return dict_order(len(self.src), ((names[v], names[w]) for (v, w) in
+                                          zip(self.src.tolist(), self.dst.tolist())))
+
+    def out_edges_of(self, n):
+        return self.out_edges[self.out_ptr[n]:self.out_ptr[n + 1]]
 
-            self.add_node(in_node_name)
-            self.add_node(out_node_name)
-            in_node = self.nodes[in_node_name]
-            out_node = self.nodes[out_node_name]
+    def in_edges_of(self, n):
+        return self.in_edges[self.in_ptr[n]:self.in_ptr[n + 1]]
 
-            edge = SGEdge(in_node, out_node)
-            self.edges[(in_node_name, out_node_name)] = edge
-            in_node.add_out_edge(edge)
-            out_node.add_in_edge(edge)
-        edge = self.edges[(in_node_name, out_node_name)]
-        for (k, v) in viewitems(attributes):
-            edge.attr[k] = v
+    def reduce_edges(self, edges):
+        """
+        mark edges, and their reverse edges, as reduced; return them all
+        """
+        rev = self.rev[edges]
+        edges = np.concatenate((edges, rev[rev >= 0]))
+        self.e_reduce[edges] = True
+        return edges
 
-    def init_reduce_dict(self):
-        for e in self.edges:
-            self.e_reduce[e] = False
+    def edge_mask(self, edges):
+        """
+        return a bool array over the edges, True for each of 'edges'
+        (a list of edge arrays)
+        """
+        mask = np.zeros(len(self.e_reduce), dtype=bool)
+        for e in edges:
+            mask[e] = True
+        return mask
 
     def bfs_nodes(self, n, exclude=None, depth=5):
         all_nodes = set()
@@ -108,344 +184,296 @@ class StringGraph(object):
         dp = 1
         while dp < depth and len(candidate_nodes) > 0:
             v = candidate_nodes.pop()
-            for e in v.out_edges:
-                w = e.out_node
+            for w in self.dst[self.out_edges_of(v)].tolist():
                 if w == exclude:
                     continue
                 if w not in all_nodes:
                     all_nodes.add(w)
-                    if len(w.out_edges) > 0:
+                    if self.out_ptr[w + 1] > self.out_ptr[w]:
                         candidate_nodes.add(w)
             dp += 1
 
         return all_nodes
 
     def mark_chimer_edges(self):
-
-        multi_in_nodes = {}
-        multi_out_nodes = {}
-        for n_name in self.nodes:
-            n = self.nodes[n_name]
-            out_nodes = [e.out_node for e in n.out_edges if self.e_reduce[(
-                e.in_node.name, e.out_node.name)] == False]
-            in_nodes = [e.in_node for e in n.in_edges if self.e_reduce[(
-                e.in_node.name, e.out_node.name)] == False]
-
-            if len(out_nodes) >= 2:
-                multi_out_nodes[n_name] = out_nodes
-            if len(in_nodes) >= 2:
-                multi_in_nodes[n_name] = in_nodes
-
-        chimer_candidates = set()
-        out_set = set()
-        in_set = set()
-        for n_name in multi_out_nodes:
-            out_nodes = set(multi_out_nodes[n_name])
-            out_set |= out_nodes
-
-        for n_name in multi_in_nodes:
-            in_nodes = set(multi_in_nodes[n_name])
-            in_set |= in_nodes
-
-        chimer_candidates = out_set & in_set
+        """
+        return (chimer_nodes, chimer_edges), as a list of nodes and a bool
+        array over the edges
+        """
+        live = ~self.e_reduce
+        n_live_out = np.bincount(self.src[live], minlength=self.n_nodes)
+        n_live_in = np.bincount(self.dst[live], minlength=self.n_nodes)
+        out_set = np.zeros(self.n_nodes, dtype=bool)
+        out_set[self.dst[live & (n_live_out[self.src] >= 2)]] = True
+        in_set = np.zeros(self.n_nodes, dtype=bool)
+        in_set[self.src[live & (n_live_in[self.dst] >= 2)]] = True
+        chimer_candidates = self.nodes[(out_set & in_set)[self.nodes]]
 
         chimer_nodes = []
-        chimer_edges = set()
-        for n in chimer_candidates:
-            out_nodes = set([e.out_node for e in n.out_edges])
+        chimer_edges = []
+        for n in chimer_candidates.tolist():
+            out_nodes = set(self.dst[self.out_edges_of(n)].tolist())
             test_set = set()
-            for in_node in [e.in_node for e in n.in_edges]:
-                test_set = test_set | set(
-                    [e.out_node for e in in_node.out_edges])
-            test_set -= set([n])
+            for in_node in self.src[self.in_edges_of(n)].tolist():
+                test_set.update(self.dst[self.out_edges_of(in_node)].tolist())
+            test_set.discard(n)
             if len(out_nodes & test_set) == 0:
                 flow_node1 = set()
                 flow_node2 = set()
-                for v in list(out_nodes):
+                for v in out_nodes:
                     flow_node1 |= self.bfs_nodes(v, exclude=n)
-                for v in list(test_set):
+                for v in test_set:
                     flow_node2 |= self.bfs_nodes(v, exclude=n)
                 if len(flow_node1 & flow_node2) == 0:
-                    for e in n.out_edges:
-                        v, w = e.in_node.name, e.out_node.name
-                        if self.e_reduce[(v, w)] != True:
-                            self.e_reduce[(v, w)] = True
-                            chimer_edges.add((v, w))
-                            rv = reverse_end(w)
-                            rw = reverse_end(v)
-                            self.e_reduce[(rv, rw)] = True
-                            chimer_edges.add((rv, rw))
-
-                    for e in n.in_edges:
-                        v, w = e.in_node.name, e.out_node.name
-                        if self.e_reduce[(v, w)] != True:
-                            self.e_reduce[(v, w)] = True
-                            chimer_edges.add((v, w))
-                            rv = reverse_end(w)
-                            rw = reverse_end(v)
-                            self.e_reduce[(rv, rw)] = True
-                            chimer_edges.add((rv, rw))
-                    chimer_nodes.append(n.name)
-                    chimer_nodes.append(reverse_end(n.name))
-
-        return chimer_nodes, chimer_edges
+                    for edges in (self.out_edges_of(n), self.in_edges_of(n)):
+                        edges = edges[~self.e_reduce[edges]]
+                        chimer_edges.append(self.reduce_edges(edges))
+                    chimer_nodes.append(n)
+                    chimer_nodes.append(n ^ 1)
 
-    def mark_spur_edge(self):
+        return chimer_nodes, self.edge_mask(chimer_edges)
 
-        removed_edges = set()
-        for v in self.nodes:
-            if len([e for e in self.nodes[v].out_edges if self.e_reduce[(e.in_node.name, e.out_node.name)] != True]) > 1:
-                for out_edge in self.nodes[v].out_edges:
-                    w = out_edge.out_node.name
-
-                    if len(self.nodes[w].out_edges) == 0 and self.e_reduce[(v, w)] != True:
-                        self.e_reduce[(v, w)] = True
-                        removed_edges.add((v, w))
-                        v2, w2 = reverse_end(w), reverse_end(v)
-                        self.e_reduce[(v2, w2)] = True
-                        removed_edges.add((v2, w2))
-
-            if len([e for e in self.nodes[v].in_edges if self.e_reduce[(e.in_node.name, e.out_node.name)] != True]) > 1:
-                for in_edge in self.nodes[v].in_edges:
-                    w = in_edge.in_node.name
-                    if len(self.nodes[w].in_edges) == 0 and self.e_reduce[(w, v)] != True:
-                        self.e_reduce[(w, v)] = True
-                        removed_edges.add((w, v))
-                        v2, w2 = reverse_end(w), reverse_end(v)
-                        self.e_reduce[(w2, v2)] = True
-                        removed_edges.add((w2, v2))
-        return removed_edges
-
-    def mark_tr_edges(self):
+    def mark_spur_edge(self):
         """
-        transitive reduction
+        return the removed edges, as a bool array over the edges
         """
-        n_mark = self.n_mark
-        e_reduce = self.e_reduce
-        FUZZ = 500
-        for n in self.nodes:
-            n_mark[n] = "vacant"
+        removed_edges = []
+        n_out = np.diff(self.out_ptr)
+        n_in = np.diff(self.in_ptr)
+        # Only nodes next to a sink or a source can have spurs.
+        to_sink = np.zeros(self.n_nodes, dtype=bool)
+        to_sink[self.src[n_out[self.dst] == 0]] = True
+        from_source = np.zeros(self.n_nodes, dtype=bool)
+        from_source[self.dst[n_in[self.src] == 0]] = True
+        for v in self.nodes[(to_sink | from_source)[self.nodes]].tolist():
+            out_edges = self.out_edges_of(v)
+            if np.count_nonzero(~self.e_reduce[out_edges]) > 1:
+                spurs = out_edges[(n_out[self.dst[out_edges]] == 0) & ~self.e_reduce[out_edges]]
+                removed_edges.append(self.reduce_edges(spurs))
+
+            in_edges = self.in_edges_of(v)
+            if np.count_nonzero(~self.e_reduce[in_edges]) > 1:
+                spurs = in_edges[(n_in[self.src[in_edges]] == 0) & ~self.e_reduce[in_edges]]
+                removed_edges.append(self.reduce_edges(spurs))
+        return self.edge_mask(removed_edges)
+
+    def mark_tr_edges(self, n_core=0):
+        """
+        transitive reduction; with n_core workers, each node shard is
+        reduced in its own process
+        """
+        if not self.frozen:
+            raise Exception('StringGraph.freeze() must be called after the last add_edge().')
+        # The out-edges of each node are sorted by length, so each scan
+        # can stop at the first edge that is too long.
+        adjacency = dict(ptr=self.out_ptr, out_dst=self.dst[self.out_edges],
+                         out_len=self.length[self.out_edges])
+        if not n_core:
+            eliminated = [tr_eliminated(self.nodes, **adjacency)]
+        else:
+            shards = node_shards(self.nodes, self.out_ptr, 4 * n_core)
+            exe_pool = Pool(n_core, initializer=set_tr_adjacency, initargs=(adjacency,))
+            try:
+                eliminated = list(exe_pool.imap(run_tr_eliminated, shards))
+            except:
+                exe_pool.terminate()
+                raise
+            else:
+                exe_pool.close()
+                exe_pool.join()
+        eliminated = np.concatenate([np.empty(0, dtype=np.int64)] + eliminated)
+        self.reduce_edges(self.out_edges[eliminated])
 
-        for (n_name, node) in viewitems(self.nodes):
+    def mark_best_overlap(self):
+        """
+        find the best overlapped edges;
+        return the removed edges, as a bool array over the edges
+        """
+        best_edges = np.zeros(len(self.e_reduce), dtype=bool)
+        for (ends, ptr, edges, best, other_ends) in (
+                (self.src, self.out_ptr, self.out_edges, self.best_out, self.dst),
+                (self.dst, self.in_ptr, self.in_edges, self.best_in, self.src)):
+            # Sort each node's edges by score, best first.
+            edges = edges[np.lexsort((-self.score[edges], ends[edges]))]
+            live = edges[~self.e_reduce[edges]]
+            nodes, first = np.unique(ends[live], return_index=True)
+            best_edges[live[first]] = True
+            best[nodes] = other_ends[live[first]]
 
-            out_edges = node.out_edges
-            if len(out_edges) == 0:
-                continue
+        if DEBUG_LOG_LEVEL > 1:
+            print("X", np.count_nonzero(best_edges))
 
-            out_edges.sort(key=lambda x: x.attr["length"])
-
-            for e in out_edges:
-                w = e.out_node
-                n_mark[w.name] = "inplay"
-
-            max_len = out_edges[-1].attr["length"]
-
-            max_len += FUZZ
-
-            for e in out_edges:
-                e_len = e.attr["length"]
-                w = e.out_node
-                if n_mark[w.name] == "inplay":
-                    w.out_edges.sort(key=lambda x: x.attr["length"])
-                    for e2 in w.out_edges:
-                        if e2.attr["length"] + e_len < max_len:
-                            x = e2.out_node
-                            if n_mark[x.name] == "inplay":
-                                n_mark[x.name] = "eliminated"
-
-            for e in out_edges:
-                e_len = e.attr["length"]
-                w = e.out_node
-                w.out_edges.sort(key=lambda x: x.attr["length"])
-                if len(w.out_edges) > 0:
-                    x = w.out_edges[0].out_node
-                    if n_mark[x.name] == "inplay":
-                        n_mark[x.name] = "eliminated"
-                for e2 in w.out_edges:
-                    if e2.attr["length"] < FUZZ:
-                        x = e2.out_node
-                        if n_mark[x.name] == "inplay":
-                            n_mark[x.name] = "eliminated"
-
-            for out_edge in out_edges:
-                v = out_edge.in_node
-                w = out_edge.out_node
-                if n_mark[w.name] == "eliminated":
-                    e_reduce[(v.name, w.name)] = True
-                    v_name, w_name = reverse_end(w.name), reverse_end(v.name)
-                    e_reduce[(v_name, w_name)] = True
-                n_mark[w.name] = "vacant"
+        return self.edge_mask([self.reduce_edges(np.flatnonzero(~self.e_reduce & ~best_edges))])
 
-    def mark_best_overlap(self):
+    def resolve_repeat_edges(self):
         """
-        find the best overlapped edges
+        return the removed edges, as a bool array over the edges
         """
+        live = ~self.e_reduce
+        n_live_out = np.bincount(self.src[live], minlength=self.n_nodes)
+        n_live_in = np.bincount(self.dst[live], minlength=self.n_nodes)
+        nodes_to_test = (n_live_out == 1) & (n_live_in == 1)
+
+        def live_one(edges, ends):
+            return ends[edges[live[edges]]][0]
 
-        best_edges = set()
-        removed_edges = set()
+        edges_to_reduce = []
+        for v in self.nodes[nodes_to_test[self.nodes]].tolist():
+
+            v_out_nodes = set(self.dst[self.out_edges_of(v)].tolist())
+            in_node = live_one(self.in_edges_of(v), self.src)
+            for e in self.out_edges_of(in_node).tolist():
+                ww = self.dst[e]
+                ww_out_nodes = set(self.dst[self.out_edges_of(ww)].tolist())
+                if ww != v and live[e] and n_live_in[ww] > 1 and \
+                   not nodes_to_test[ww] and not (ww_out_nodes & v_out_nodes):
+                    edges_to_reduce.append(e)
+
+            v_in_nodes = set(self.src[self.in_edges_of(v)].tolist())
+            out_node = live_one(self.out_edges_of(v), self.dst)
+            for e in self.in_edges_of(out_node).tolist():
+                vv = self.src[e]
+                vv_in_nodes = set(self.src[self.in_edges_of(vv)].tolist())
+                if vv != v and live[e] and n_live_out[vv] > 1 and \
+                   not nodes_to_test[vv] and not (vv_in_nodes & v_in_nodes):
+                    edges_to_reduce.append(e)
+
+        removed_edges = self.edge_mask([edges_to_reduce])
+        self.e_reduce |= removed_edges
 
-        for v in self.nodes:
+        return removed_edges
 
-            out_edges = self.nodes[v].out_edges
-            if len(out_edges) > 0:
-                out_edges.sort(key=lambda e: -e.attr["score"])
-                for e in out_edges:
-                    if self.e_reduce[(e.in_node.name, e.out_node.name)] != True:
-                        best_edges.add((e.in_node.name, e.out_node.name))
-                        self.best_out[v] = e.out_node.name
-                        break
+    def get_out_edges_for_node(self, n, mask=True):
+        edges = self.out_edges_of(n)
+        return edges[~self.e_reduce[edges]]
 
-            in_edges = self.nodes[v].in_edges
-            if len(in_edges) > 0:
-                in_edges.sort(key=lambda e: -e.attr["score"])
-                for e in in_edges:
-                    if self.e_reduce[(e.in_node.name, e.out_node.name)] != True:
-                        best_edges.add((e.in_node.name, e.out_node.name))
-                        self.best_in[v] = e.in_node.name
+    def get_in_edges_for_node(self, n, mask=True):
+        edges = self.in_edges_of(n)
+        return edges[~self.e_reduce[edges]]
+
+    def get_best_out_edge_for_node(self, n, mask=True):
+        edges = self.get_out_edges_for_node(n)
+        return edges[np.argsort(self.score[edges], kind='mergesort')][-1]
+
+    def get_best_in_edge_for_node(self, n, mask=True):
+        edges = self.get_in_edges_for_node(n)
+        return edges[np.argsort(self.score[edges], kind='mergesort')][-1]
+
+
+EDGE_FIELDS = (
+    ('src', 'i'), ('dst', 'i'),  # nodes
+    ('rid', 'i'), ('sp', 'i'), ('tp', 'i'),  # label: read index, start, end
+    ('length', 'i'), ('score', 'i'), ('identity', 'd'),
+)
+
+
+def dict_order(n, keys):
+    """
+    return the order in which a dict iterates the n distinct 'keys',
+    inserted in the order given; the dict-based StringGraph visited its
+    nodes and wrote its edges in this order, and spur removal and the
+    assembly depend on it. On Python 3 it is the insertion order, and
+    'keys' is not read.
+    """
+    if sys.version_info[0] >= 3:
+        return np.arange(n)
+    index = {}
+    for (i, k) in enumerate(keys):
+        index[k] = i
+    return np.fromiter(index.values(), dtype=np.int64, count=n)
+
+
+def csr(ends, n_nodes, by=None):
+    """
+    return (ptr, edges): the edges of node n are edges[ptr[n]:ptr[n+1]],
+    sorted by 'by' if given, and otherwise in the order they were added
+    """
+    if by is None:
+        edges = np.argsort(ends, kind='mergesort')
+    else:
+        edges = np.lexsort((by, ends))
+    ptr = np.concatenate(([0], np.cumsum(np.bincount(ends, minlength=n_nodes))))
+    return ptr, edges
+
+
+def tr_eliminated(nodes, ptr, out_dst, out_len):
+    """
+    return the positions, in out_dst/out_len, of the transitive out-edges
+    of 'nodes'; the out-edges of node n are at ptr[n]:ptr[n+1], sorted by
+    length
+    """
+    FUZZ = 500
+    VACANT, INPLAY, ELIMINATED = 0, 1, 2
+    n_mark = bytearray(len(ptr) - 1)
+    eliminated = []
+    ptr = ptr.tolist()
+
+    for v in nodes.tolist():
+        if ptr[v] == ptr[v + 1]:
+            continue
+        out_nodes = out_dst[ptr[v]:ptr[v + 1]].tolist()
+        out_lens = out_len[ptr[v]:ptr[v + 1]].tolist()
+
+        for w in out_nodes:
+            n_mark[w] = INPLAY
+
+        max_len = out_lens[-1]
+
+        max_len += FUZZ
+
+        for (w, e_len) in zip(out_nodes, out_lens):
+            if n_mark[w] == INPLAY:
+                for (x, e2_len) in zip(out_dst[ptr[w]:ptr[w + 1]].tolist(),
+                                       out_len[ptr[w]:ptr[w + 1]].tolist()):
+                    if e2_len + e_len >= max_len:
                         break
+                    if n_mark[x] == INPLAY:
+                        n_mark[x] = ELIMINATED
+
+        for w in out_nodes:
+            w_out_nodes = out_dst[ptr[w]:ptr[w + 1]].tolist()
+            if len(w_out_nodes) > 0:
+                x = w_out_nodes[0]
+                if n_mark[x] == INPLAY:
+                    n_mark[x] = ELIMINATED
+            for (x, e2_len) in zip(w_out_nodes, out_len[ptr[w]:ptr[w + 1]].tolist()):
+                if e2_len >= FUZZ:
+                    break
+                if n_mark[x] == INPLAY:
+                    n_mark[x] = ELIMINATED
 
-        if DEBUG_LOG_LEVEL > 1:
-            print("X", len(best_edges))
-
-        for (e_n, e) in viewitems(self.edges):
-            v = e_n[0]
-            w = e_n[1]
-            if self.e_reduce[(v, w)] != True:
-                if (v, w) not in best_edges:
-                    self.e_reduce[(v, w)] = True
-                    removed_edges.add((v, w))
-                    v2, w2 = reverse_end(w), reverse_end(v)
-                    self.e_reduce[(v2, w2)] = True
-                    removed_edges.add((v2, w2))
+        for (i, w) in enumerate(out_nodes):
+            if n_mark[w] == ELIMINATED:
+                eliminated.append(ptr[v] + i)
+            n_mark[w] = VACANT
 
-        return removed_edges
+    return np.array(eliminated, dtype=np.int64)
 
-    def resolve_repeat_edges(self):
 
-        edges_to_reduce = []
-        nodes_to_test = set()
-        for (v_n, v) in viewitems(self.nodes):
-
-            out_nodes = []
-            for e in v.out_edges:
-                if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                    out_nodes.append(e.out_node.name)
-
-            in_nodes = []
-            for e in v.in_edges:
-                if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                    in_nodes.append(e.in_node.name)
-
-            if len(out_nodes) == 1 and len(in_nodes) == 1:
-                nodes_to_test.add(v_n)
-
-        for v_n in list(nodes_to_test):
-
-            v = self.nodes[v_n]
-
-            out_nodes = []
-            for e in v.out_edges:
-                if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                    out_nodes.append(e.out_node.name)
-
-            in_nodes = []
-            for e in v.in_edges:
-                if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                    in_nodes.append(e.in_node.name)
-
-            in_node_name = in_nodes[0]
-
-            for out_edge in self.nodes[in_node_name].out_edges:
-                vv = out_edge.in_node.name
-                ww = out_edge.out_node.name
-
-                ww_out = self.nodes[ww].out_edges
-                v_out = self.nodes[v_n].out_edges
-                ww_out_nodes = set([n.out_node.name for n in ww_out])
-                v_out_nodes = set([n.out_node.name for n in v_out])
-                o_overlap = len(ww_out_nodes & v_out_nodes)
-
-                ww_in_count = 0
-                for e in self.nodes[ww].in_edges:
-                    if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                        ww_in_count += 1
-
-                if ww != v_n and\
-                   self.e_reduce[(vv, ww)] == False and\
-                   ww_in_count > 1 and\
-                   ww not in nodes_to_test and\
-                   o_overlap == 0:
-                    edges_to_reduce.append((vv, ww))
-
-            out_node_name = out_nodes[0]
-
-            for in_edge in self.nodes[out_node_name].in_edges:
-                vv = in_edge.in_node.name
-                ww = in_edge.out_node.name
-
-                vv_in = self.nodes[vv].in_edges
-                v_in = self.nodes[v_n].in_edges
-                vv_in_nodes = set([n.in_node.name for n in vv_in])
-                v_in_nodes = set([n.in_node.name for n in v_in])
-                i_overlap = len(vv_in_nodes & v_in_nodes)
-
-                vv_out_count = 0
-                for e in self.nodes[vv].out_edges:
-                    if self.e_reduce[(e.in_node.name, e.out_node.name)] == False:
-                        vv_out_count += 1
-
-                if vv != v_n and\
-                   self.e_reduce[(vv, ww)] == False and\
-                   vv_out_count > 1 and\
-                   vv not in nodes_to_test and\
-                   i_overlap == 0:
-                    edges_to_reduce.append((vv, ww))
-
-        removed_edges = set()
-        for e in edges_to_reduce:
-            self.e_reduce[e] = True
-            removed_edges.add(e)
+def node_shards(nodes, ptr, n_shards):
+    """
+    split 'nodes' into up to n_shards runs, with about as many out-edges each
+    """
+    work = np.cumsum(ptr[nodes + 1] - ptr[nodes])
+    if not len(work) or not work[-1]:
+        return [nodes]
+    bounds = np.searchsorted(work, np.arange(1, n_shards) * work[-1] // n_shards)
+    return [shard for shard in np.split(nodes, np.unique(bounds)) if len(shard)]
+
+
+# The frozen adjacency, for the workers of StringGraph.mark_tr_edges().
+# It is handed over once per worker, by the Pool initializer; forked
+# workers share its pages with the parent, read-only.
+tr_adjacency = {}
 
-        return removed_edges
 
-    def get_out_edges_for_node(self, name, mask=True):
-        rtn = []
-        for e in self.nodes[name].out_edges:
-            v = e.in_node
-            w = e.out_node
-            if self.e_reduce[(v.name, w.name)] == False:
-                rtn.append(e)
-        return rtn
-
-    def get_in_edges_for_node(self, name, mask=True):
-        rtn = []
-        for e in self.nodes[name].in_edges:
-            v = e.in_node
-            w = e.out_node
-            if self.e_reduce[(v.name, w.name)] == False:
-                rtn.append(e)
-        return rtn
-
-    def get_best_out_edge_for_node(self, name, mask=True):
-        rtn = []
-        for e in self.nodes[name].out_edges:
-            v = e.in_node
-            w = e.out_node
-            if self.e_reduce[(v.name, w.name)] == False:
-                rtn.append(e)
-        rtn.sort(key=lambda e: e.attr["score"])
-
-        return rtn[-1]
-
-    def get_best_in_edge_for_node(self, name, mask=True):
-        rtn = []
-        for e in self.nodes[name].in_edges:
-            v = e.in_node
-            w = e.out_node
-            if self.e_reduce[(v.name, w.name)] == False:
-                rtn.append(e)
-        rtn.sort(key=lambda e: e.attr["score"])
-        return rtn[-1]
+def set_tr_adjacency(adjacency):
+    tr_adjacency.clear()
+    tr_adjacency.update(adjacency)
+
+
+def run_tr_eliminated(nodes):
+    return tr_eliminated(nodes, **tr_adjacency)
 
 
 def reverse_edge(e):
@@ -458,13 +486,156 @@ def reverse_path(p):
     return [reverse_end(n) for n in p]
 
 
-def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_cutoff):
+def graph_lib(g):
+    """
+    return the module with the algorithms for graph 'g', which is
+    either networkx or falcon_kit.unitig_graph
+    """
+    return unitig_graph if isinstance(g, unitig_graph.Graph) else nx
+
+
+def graph_lib_for(args):
+    """
+    return the graph module selected by the command-line arguments
+    """
+    return nx if args.networkx else unitig_graph
+
+
+def rebuilt(d):
+    """
+    return a copy of dict 'd' made by inserting its items in turn, as
+    deepcopy() does, so that it iterates in the same order as the copy
+    """
+    return dict((k, d[k]) for k in d)
+
+
+class BundleCache(object):
+    """
+    what find_bundle() keeps between calls on the same unitig graph: the
+    out-edges of each node, in ego-graph order, and counts of the nodes
+    visited
+    """
+
+    def __init__(self):
+        self.out_edges = {}
+        self.n_searches = 0
+        self.n_visited = 0
+        self.n_ego_nodes = 0
+        self.n_tie_breaks = 0
+
+
+class EgoGraph(object):
+    """
+    the ego graph of 'ug' within 'radius' hops of 'start_node', as
+    find_bundle() sees it, without building it: its nodes are found by a
+    breadth-first search that goes only as far as has_node() needs, and
+    a node's edges are read from 'ug' (or the cache) when asked for
+
+    Nodes reached by the bundle search are at most 'radius' hops from the
+    start, so all of their out-edges are in the ego graph; their in-edges
+    may not be, hence has_node().
+    """
+
+    def _bfs_level(self):
+        # one level of single_source_shortest_path_length(), as in ego_graph()
+        thislevel = self.nextlevel
+        self.nextlevel = {}
+        for v in thislevel:
+            if v not in self.seen:
+                self.seen[v] = self.level
+                self.nextlevel.update(self.ug.succ[v])
+        self.cache.n_ego_nodes += len(self.seen) - self.n_seen
+        self.n_seen = len(self.seen)
+        if self.radius <= self.level or not self.nextlevel:
+            self.done = True
+        self.level += 1
+
+    def has_node(self, n):
+        while n not in self.seen and not self.done:
+            self._bfs_level()
+        return n in self.seen
+
+    def out_edges(self, v):
+        """
+        return the out-edges (v, w, key) of v, in the order of the ego
+        graph (as subgraph() and copy() insert them)
+        """
+        self.visited.add(v)
+        edges = self.cache.out_edges.get(v)
+        if edges is None:
+            succ = {}
+            for w, keydict in self.ug.succ[v].items():
+                succ[w] = keydict.copy()
+            edges = self.cache.out_edges[v] = [
+                (v, w, k) for w, keydict in rebuilt(succ).items() for k in rebuilt(keydict)]
+        return edges
+
+    def in_edges(self, v):
+        """
+        return the in-edges (u, v, key) of v in 'ug', including those from
+        nodes outside the ego graph, in no particular order
+        """
+        self.visited.add(v)
+        return [(u, v, k) for u, keydict in self.ug.pred[v].items() for k in keydict]
+
+    def ordered_in_edges(self, v):
+        """
+        return the in-edges of v within the ego graph, in its order;
+        this needs all of its nodes
+        """
+        while not self.done:
+            self._bfs_level()
+        if self.node_order is None:
+            nodes = {}
+            for n in self.seen:
+                nodes[n] = None
+            self.node_order = list(rebuilt(nodes))
+        pred = {}
+        for u in self.node_order:
+            keydict = self.ug.succ[u].get(v)
+            if keydict is not None:
+                pred[u] = keydict.copy()
+        return [(u, v, k) for u, keydict in rebuilt(pred).items() for k in rebuilt(keydict)]
+
+    def best_in_edge(self, v, in_edges, u_edge_data):
+        """
+        return the edge of 'in_edges' (into v) with the highest positive
+        score, or None; of several, the first in the ego graph's order
+        """
+        scores = [u_edge_data[e][1] for e in in_edges]
+        max_score = max(scores + [0])
+        if max_score <= 0:
+            return None
+        best = [e for (e, score) in zip(in_edges, scores) if score == max_score]
+        if len(best) > 1:
+            self.cache.n_tie_breaks += 1
+            best = set(best)
+            best = [e for e in self.ordered_in_edges(v) if e in best]
+        return best[0]
+
+    def __init__(self, ug, start_node, radius, cache):
+        self.ug = ug
+        self.radius = radius
+        self.cache = cache
+        self.seen = {}
+        self.n_seen = 0
+        self.level = 0
+        self.nextlevel = {start_node: 1}
+        self.done = False
+        self.node_order = None
+        self.visited = set()
+
+
+def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_cutoff, cache=None):
 
     tips = set()
     bundle_edges = set()
     bundle_nodes = set()
 
-    local_graph = nx.ego_graph(ug, start_node, depth_cutoff, undirected=False)
+    if cache is None:
+        cache = BundleCache()
+    cache.n_searches += 1
+    local_graph = EgoGraph(ug, start_node, depth_cutoff, cache)
     length_to_node = {start_node: 0}
     score_to_node = {start_node: 0}
 
@@ -477,7 +648,7 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
         print("start", start_node)
 
     bundle_nodes.add(v)
-    for vv, ww, kk in local_graph.out_edges(v, keys=True):
+    for vv, ww, kk in local_graph.out_edges(v):
         max_score = 0
         max_length = 0
 
@@ -510,18 +681,8 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
 
             if end_node not in length_to_node:
                 v = end_node
-                max_score_edge = None
-                max_score = 0
-                for uu, vv, kk in local_graph.in_edges(v, keys=True):
-                    if uu not in length_to_node:
-                        continue
-
-                    score = u_edge_data[(uu, vv, kk)][1]
-
-                    if score > max_score:
-
-                        max_score = score
-                        max_score_edge = (uu, vv, kk)
+                max_score_edge = local_graph.best_in_edge(
+                    v, [e for e in local_graph.in_edges(v) if e[0] in length_to_node], u_edge_data)
 
                 length_to_node[v] = length_to_node[max_score_edge[0]
                                                    ] + u_edge_data[max_score_edge][0]
@@ -552,32 +713,25 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
             if DEBUG_LOG_LEVEL > 1:
                 print("process", v)
 
-            if len(local_graph.out_edges(v, keys=True)) == 0:  # dead end route
+            if len(local_graph.out_edges(v)) == 0:  # dead end route
                 print("no out edge", v)
                 continue
 
-            max_score_edge = None
-            max_score = 0
-
             extend_tip = True
 
-            for uu, vv, kk in local_graph.in_edges(v, keys=True):
+            in_edges = local_graph.in_edges(v)
+            for uu, vv, kk in in_edges:
                 if DEBUG_LOG_LEVEL > 1:
                     print("in_edges", uu, vv, kk)
                     print(uu, "in length_to_node",  uu in length_to_node)
 
-                if uu not in length_to_node:
+                if uu not in length_to_node and local_graph.has_node(uu):
                     extend_tip = False
                     break
 
-                score = u_edge_data[(uu, vv, kk)][1]
-
-                if score > max_score:
-
-                    max_score = score
-                    max_score_edge = (uu, vv, kk)
-
             if extend_tip:
+                max_score_edge = local_graph.best_in_edge(
+                    v, [e for e in in_edges if e[0] in length_to_node], u_edge_data)
 
                 length_to_node[v] = length_to_node[max_score_edge[0]
                                                    ] + u_edge_data[max_score_edge][0]
@@ -590,7 +744,7 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
                     break
 
                 v_updated = False
-                for vv, ww, kk in local_graph.out_edges(v, keys=True):
+                for vv, ww, kk in local_graph.out_edges(v):
 
                     if DEBUG_LOG_LEVEL > 1:
                         print("test", vv, ww, kk)
@@ -641,6 +795,8 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
         for v in list(tips):
             bundle_nodes.add(v)
 
+    cache.n_visited += len(local_graph.visited)
+
     data = start_node, end_node, bundle_edges, length_to_node[
         end_node], score_to_node[end_node], depth
 
@@ -651,257 +807,318 @@ def find_bundle(ug, u_edge_data, start_node, depth_cutoff, width_cutoff, length_
     return converage, data, data_r
 
 
-def generate_string_graph(args):
-    overlap_file = args.overlap_file
-
-    contained_reads = set()
-    chimer_ids = set()
-
-    filter_reads = False
-
-    seqs = set()
-
-    G = nx.Graph()
-    edges = set()
-    overlap_data = []
-    contained_reads = set()
-    overlap_count = {}
-
-    # loop through the overlapping data to load the data in the a python array
-    # contained reads are identified
-
-    def process_fields(l):
-            # work around for some ill formed data recored
-            # if len(l) != 13:
-            #    continue
-            f_id, g_id, score, identity = l[:4]
-
-            if f_id == g_id:  # don't need self-self overlapping
-                return
-            if filter_reads:
-                if g_id not in seqs:
-                    return
-                if f_id not in seqs:
-                    return
-            score = int(score)
-            identity = float(identity)
-            contained = l[12]
-            if contained == "contained":
-                contained_reads.add(f_id)
-                return
-            if contained == "contains":
-                contained_reads.add(g_id)
-                return
-            if contained == "none":
-                return
-            if identity < args.min_idt:  # only take record with >96% identity as overlapped reads
-                return
-            f_strain, f_start, f_end, f_len = (int(c) for c in l[4:8])
-            g_strain, g_start, g_end, g_len = (int(c) for c in l[8:12])
-
-            # only used reads longer than the 4kb for assembly
-            if f_len < args.min_len:
-                return
-            if g_len < args.min_len:
-                return
-            """
-            # double check for proper overlap
-            # this is not necessary when using DALIGNER for overlapper
-            # it may be useful if other overlappers give fuzzier alignment boundary
-            if f_start > 24 and f_len - f_end > 24:  # allow 24 base tolerance on both sides of the overlapping
-                return
-            if g_start > 24 and g_len - g_end > 24:
-                return
-            if g_strain == 0:
-                if f_start < 24 and g_len - g_end > 24:
-                    return
-                if g_start < 24 and f_len - f_end > 24:
-                    return
-            else:
-                if f_start < 24 and g_start > 24:
-                    return
-                if g_start < 24 and f_start > 24:
-                    return
-            """
-            overlap_data.append((f_id, g_id, score, identity,
-                                 f_strain, f_start, f_end, f_len,
-                                 g_strain, g_start, g_end, g_len))
-            overlap_count[f_id] = overlap_count.get(f_id, 0) + 1
-            overlap_count[g_id] = overlap_count.get(g_id, 0) + 1
-
+def read_overlap_lines(overlap_file, chunk_size=overlaps.CHUNK_SIZE):
+    """
+    yield the lines of overlap_file in chunks, up to its end-of-file marker
+    """
     with open(overlap_file) as f:
         n = 0
+        lines = []
         for line in f:
             if line.startswith('-'):
                 break
-            l = line.strip().split()
-            process_fields(l)
+            lines.append(line)
             n += 1
+            if len(lines) == chunk_size:
+                yield lines
+                lines = []
         else:
             # This happens only if we did not 'break' from the for-loop.
             msg = 'No end-of-file marker for overlap_file {!r} after {} lines.'.format(
                 overlap_file, n)
             raise Exception(msg)
+        if lines:
+            yield lines
 
-    overlap_set = set()
-    sg = StringGraph()
-    for od in overlap_data:
-        f_id, g_id, score, identity = od[:4]
-        if f_id in contained_reads:
-            continue
-        if g_id in contained_reads:
-            continue
-        f_s, f_b, f_e, f_l = od[4:8]
-        g_s, g_b, g_e, g_l = od[8:12]
-        overlap_pair = [f_id, g_id]
-        overlap_pair.sort()
-        overlap_pair = tuple(overlap_pair)
-        if overlap_pair in overlap_set:  # don't allow duplicated records
-            continue
-        else:
-            overlap_set.add(overlap_pair)
 
-        if g_s == 1:  # revered alignment, swapping the begin and end coordinates
-            g_b, g_e = g_e, g_b
+def read_overlaps(overlap_file, min_len, min_idt, cache_dir=None):
+    """
+    load the overlaps to build the string graph from, as an OVLP_DTYPE
+    array in file order, dropping self-self overlaps, those which are not
+    of type 'overlap', and those with low identity or a short read;
+    return (ovlps, contained, names), where 'contained' is an IdBitmap of
+    the reads contained in others, and names[i] is the id string of read i
+    """
+    ovlps, contained, names = load_overlaps(overlap_file, cache_dir)
+    return ovlps[overlap_mask(ovlps, min_len, min_idt)], contained, names
 
-        # build the string graph edges for each overlap
-        if f_b > 0:
-            if g_b < g_e:
-                """
-                     f.B         f.E
-                  f  ----------->
-                  g         ------------->
-                            g.B           g.E
-                """
-                if f_b == 0 or g_e - g_l == 0:
-                    continue
-                sg.add_edge("%s:B" % g_id, "%s:B" % f_id, label=(f_id, f_b, 0),
-                            length=abs(f_b - 0),
-                            score=-score,
-                            identity=identity)
-                sg.add_edge("%s:E" % f_id, "%s:E" % g_id, label=(g_id, g_e, g_l),
-                            length=abs(g_e - g_l),
-                            score=-score,
-                            identity=identity)
-            else:
-                """
-                     f.B         f.E
-                  f  ----------->
-                  g         <-------------
-                            g.E           g.B
-                """
-                if f_b == 0 or g_e == 0:
-                    continue
-                sg.add_edge("%s:E" % g_id, "%s:B" % f_id, label=(f_id, f_b, 0),
-                            length=abs(f_b - 0),
-                            score=-score,
-                            identity=identity)
-                sg.add_edge("%s:E" % f_id, "%s:B" % g_id, label=(g_id, g_e, 0),
-                            length=abs(g_e - 0),
-                            score=-score,
-                            identity=identity)
-        else:
-            if g_b < g_e:
-                """
-                                    f.B         f.E
-                  f                 ----------->
-                  g         ------------->
-                            g.B           g.E
-                """
-                if g_b == 0 or f_e - f_l == 0:
-                    continue
-                sg.add_edge("%s:B" % f_id, "%s:B" % g_id, label=(g_id, g_b, 0),
-                            length=abs(g_b - 0),
-                            score=-score,
-                            identity=identity)
-                sg.add_edge("%s:E" % g_id, "%s:E" % f_id, label=(f_id, f_e, f_l),
-                            length=abs(f_e - f_l),
-                            score=-score,
-                            identity=identity)
-            else:
-                """
-                                    f.B         f.E
-                  f                 ----------->
-                  g         <-------------
-                            g.E           g.B
-                """
-                if g_b - g_l == 0 or f_e - f_l == 0:
-                    continue
-                sg.add_edge("%s:B" % f_id, "%s:E" % g_id, label=(g_id, g_b, g_l),
-                            length=abs(g_b - g_l),
-                            score=-score,
-                            identity=identity)
-                sg.add_edge("%s:B" % g_id, "%s:E" % f_id, label=(f_id, f_e, f_l),
-                            length=abs(f_e - f_l),
-                            score=-score,
-                            identity=identity)
 
-    sg.init_reduce_dict()
+def overlap_mask(ovlps, min_len, min_idt):
+    """
+    return a bool array, True for each overlap with identity of at least
+    min_idt between reads of at least min_len
+    """
+    ok = ovlps['idt'] >= min_idt
+    # only used reads longer than the 4kb for assembly
+    ok &= (ovlps['q_l'] >= min_len) & (ovlps['t_l'] >= min_len)
+    return ok
+
+
+def load_overlaps(overlap_file, cache_dir=None):
+    """
+    return (ovlps, contained, names) as parse_overlaps() does; with a
+    cache_dir, from the overlap store there for the checksum of
+    overlap_file, which is written first if need be
+    """
+    if not cache_dir:
+        return parse_overlaps(overlap_file)
+    dn = os.path.join(cache_dir, 'v{}-{}'.format(OVERLAP_STORE_VERSION, file_checksum(overlap_file)))
+    store = load_overlap_store(dn)
+    if store is None:
+        LOG.info('Writing the overlap store {!r} for {!r}.'.format(dn, overlap_file))
+        store = parse_overlaps(overlap_file)
+        save_overlap_store(dn, *store)
+    else:
+        LOG.info('Using the overlap store {!r} for {!r}.'.format(dn, overlap_file))
+    return store
+
+
+def parse_overlaps(overlap_file):
+    """
+    parse overlap_file, keeping the overlaps of type 'overlap' between
+    two different reads, whatever their identity and lengths; return
+    (ovlps, contained, names) as read_overlaps() does
+    """
+    chunks = []
+    contained = []
+    names = {}
+    for lines in read_overlap_lines(overlap_file):
+        recs = overlaps.parse_lines(lines)
+        f_id, g_id, type_ = recs['q_id'], recs['t_id'], recs['type']
+        ok = f_id != g_id  # don't need self-self overlapping
+        contained.append(f_id[ok & (type_ == OVLP_TYPE_CODES['contained'])])
+        contained.append(g_id[ok & (type_ == OVLP_TYPE_CODES['contains'])])
+        ok &= type_ == OVLP_TYPE_CODES['overlap']
+        idx = np.flatnonzero(ok)
+        add_read_names(names, lines, idx, f_id, g_id)
+        chunks.append(recs[idx])
+    ovlps = np.concatenate(chunks) if chunks else np.empty(0, dtype=overlaps.OVLP_DTYPE)
+    contained = np.concatenate(contained) if contained else np.empty(0, dtype=np.int32)
+    return ovlps, overlaps.IdBitmap(contained), names
+
+
+def file_checksum(fn, block_size=1 << 20):
+    """
+    return the SHA-1 hex digest of the contents of file fn
+    """
+    digest = hashlib.sha1()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_overlap_store(dn, ovlps, contained, names):
+    """
+    write (ovlps, contained, names) to directory dn, as .npy files
+    """
+    if not os.path.isdir(dn):
+        os.makedirs(dn)
+    ids = sorted(names)
+    np.save(os.path.join(dn, 'contained.npy'), contained.bits)
+    np.save(os.path.join(dn, 'read_ids.npy'), np.array(ids, dtype=np.int32))
+    np.save(os.path.join(dn, 'read_names.npy'),
+            np.array([names[i].encode('ascii') for i in ids] or [b'']))
+    # Written last, so that a store is complete if it has this.
+    np.save(os.path.join(dn, 'ovlps.npy'), ovlps)
+
+
+def load_overlap_store(dn):
+    """
+    return (ovlps, contained, names) from directory dn, with ovlps
+    memory-mapped, or None if there is no complete store there
+    """
+    ovlps_fn = os.path.join(dn, 'ovlps.npy')
+    if not os.path.exists(ovlps_fn):
+        return None
+    ovlps = np.load(ovlps_fn, mmap_mode='r')
+    contained = overlaps.IdBitmap()
+    contained.bits = np.load(os.path.join(dn, 'contained.npy'))
+    ids = np.load(os.path.join(dn, 'read_ids.npy')).tolist()
+    read_names = np.load(os.path.join(dn, 'read_names.npy')).tolist()
+    names = dict((i, n if isinstance(n, str) else n.decode('ascii'))
+                 for (i, n) in zip(ids, read_names))
+    return ovlps, contained, names
+
+
+def add_read_names(names, lines, idx, f_id, g_id):
+    """
+    add to 'names' the id strings of reads f_id[idx] and g_id[idx], from 'lines'
+    """
+    ids = np.concatenate((f_id[idx], g_id[idx]))
+    uniq, first = np.unique(ids, return_index=True)
+    for (i, pos) in zip(uniq.tolist(), first.tolist()):
+        if i not in names:
+            col, row = divmod(pos, len(idx))
+            names[i] = lines[idx[row]].split(None, 2)[col]
+
+
+def first_of_pairs(ovlps):
+    """
+    return the index of the first overlap of each pair of reads, in order
+    """
+    f_id = ovlps['q_id'].astype(np.int64)
+    g_id = ovlps['t_id'].astype(np.int64)
+    pairs = (np.minimum(f_id, g_id) << 32) | np.maximum(f_id, g_id)
+    _, first = np.unique(pairs, return_index=True)
+    return np.sort(first)
+
 
-    sg.mark_tr_edges()  # mark those edges that transitive redundant
+def overlap_edges(ovlps, f, g):
+    """
+    return the string graph edges of 'ovlps', two for each overlap unless
+    it is skipped, as columns in EDGE_FIELDS order; 'f' and 'g' are the
+    read indices of the two reads of each overlap
+    """
+    f_b, f_e, f_l = ovlps['q_s'], ovlps['q_e'], ovlps['q_l']
+    g_b, g_e, g_l = ovlps['t_s'], ovlps['t_e'], ovlps['t_l']
+    # revered alignment, swapping the begin and end coordinates
+    g_rev = ovlps['t_strand'] == 1
+    g_b, g_e = np.where(g_rev, g_e, g_b), np.where(g_rev, g_b, g_e)
+    f_B, f_E, g_B, g_E = 2 * f, 2 * f + 1, 2 * g, 2 * g + 1
+
+    # Each case is (when, skip if, edge, edge), where an edge is
+    # (in node, out node, label read, label start, label end).
+    cases = [
+        # f.B         f.E
+        # f  ----------->
+        # g         ------------->
+        #           g.B           g.E
+        ((f_b > 0) & (g_b < g_e), (f_b == 0) | (g_e - g_l == 0),
+         (g_B, f_B, f, f_b, 0), (f_E, g_E, g, g_e, g_l)),
+        # f.B         f.E
+        # f  ----------->
+        # g         <-------------
+        #           g.E           g.B
+        ((f_b > 0) & (g_b >= g_e), (f_b == 0) | (g_e == 0),
+         (g_E, f_B, f, f_b, 0), (f_E, g_B, g, g_e, 0)),
+        #                   f.B         f.E
+        # f                 ----------->
+        # g         ------------->
+        #           g.B           g.E
+        ((f_b <= 0) & (g_b < g_e), (g_b == 0) | (f_e - f_l == 0),
+         (f_B, g_B, g, g_b, 0), (g_E, f_E, f, f_e, f_l)),
+        #                   f.B         f.E
+        # f                 ----------->
+        # g         <-------------
+        #           g.E           g.B
+        ((f_b <= 0) & (g_b >= g_e), (g_b - g_l == 0) | (f_e - f_l == 0),
+         (f_B, g_E, g, g_b, g_l), (g_B, f_E, f, f_e, f_l)),
+    ]
+    when = [c[0] for c in cases]
+    keep = np.repeat(~np.select(when, [c[1] for c in cases], False), 2)
+    columns = []
+    for i in range(5):
+        first = np.select(when, [c[2][i] for c in cases])
+        second = np.select(when, [c[3][i] for c in cases])
+        columns.append(np.stack((first, second), axis=1).ravel()[keep])
+    src, dst, rid, sp, tp = columns
+    score = np.repeat(-ovlps['score'], 2)[keep]
+    identity = np.repeat(ovlps['idt'], 2)[keep]
+    return src, dst, rid, sp, tp, np.abs(sp - tp), score, identity
+
+
+def generate_string_graph(args, overlap_store=None):
+    if overlap_store is None:
+        overlap_store = load_overlaps(args.overlap_file, args.overlap_cache)
+    ovlps, contained, names = overlap_store
+    ovlps = ovlps[overlap_mask(ovlps, args.min_len, args.min_idt)]
+    ovlps = ovlps[~contained.contains(ovlps['q_id']) & ~contained.contains(ovlps['t_id'])]
+    ovlps = ovlps[first_of_pairs(ovlps)]  # don't allow duplicated records
+
+    sg = StringGraph()
+    ids, reads = np.unique(np.concatenate((ovlps['q_id'], ovlps['t_id'])), return_inverse=True)
+    for i in ids.tolist():
+        sg.add_read(names[i])
+    # build the string graph edges for each overlap
+    sg.add_edges(*overlap_edges(ovlps, reads[:len(ovlps)], reads[len(ovlps):]))
+    del ovlps, reads
+
+    sg.freeze()
+
+    sg.mark_tr_edges(args.n_core)  # mark those edges that transitive redundant
 
     if DEBUG_LOG_LEVEL > 1:
-        print(sum([1 for c in itervalues(sg.e_reduce) if c == True]))
-        print(sum([1 for c in itervalues(sg.e_reduce) if c == False]))
+        print(np.count_nonzero(sg.e_reduce))
+        print(np.count_nonzero(~sg.e_reduce))
 
     if not args.disable_chimer_bridge_removal:
         chimer_nodes, chimer_edges = sg.mark_chimer_edges()
 
         with open("chimers_nodes", "w") as f:
             for n in chimer_nodes:
-                print(n, file=f)
+                print(sg.node_name(n), file=f)
         del chimer_nodes
     else:
-        chimer_edges = set()  # empty set
+        chimer_edges = sg.edge_mask([])  # empty set
 
     spur_edges = sg.mark_spur_edge()
 
-    removed_edges = set()
     if args.lfc == True:
         removed_edges = sg.resolve_repeat_edges()
     else:
         # mark those edges that are best overlap edges
         removed_edges = sg.mark_best_overlap()
 
-    spur_edges.update(sg.mark_spur_edge())
+    spur_edges |= sg.mark_spur_edge()
 
     if DEBUG_LOG_LEVEL > 1:
-        print(sum([1 for c in itervalues(sg.e_reduce) if c == False]))
+        print(np.count_nonzero(~sg.e_reduce))
 
     out_f = open("sg_edges_list", "w")
-    nxsg = nx.DiGraph()
+    nxsg = graph_lib_for(args).DiGraph()
     edge_data = {}
-    for v, w in sg.edges:
-        e = sg.edges[(v, w)]
-        rid, sp, tp = e.attr["label"]
-        score = e.attr["score"]
-        identity = e.attr["identity"]
+    names = [sg.node_name(n) for n in range(sg.n_nodes)]
+    types = np.select([~sg.e_reduce, chimer_edges, removed_edges, spur_edges],
+                      ["G", "C", "R", "S"], "TR")
+    order = sg.edge_order(names)
+    for (v, w, rid, sp, tp, score, identity, type_) in zip(
+            sg.src[order].tolist(), sg.dst[order].tolist(), sg.rid[order].tolist(),
+            sg.sp[order].tolist(), sg.tp[order].tolist(), sg.score[order].tolist(),
+            sg.identity[order].tolist(), types[order].tolist()):
+        rid = sg.read_names[rid]
         length = abs(sp - tp)
+        best_in = sg.best_in[w] >= 0
+        v, w = names[v], names[w]
 
-        if sg.e_reduce[(v, w)] != True:
-            type_ = "G"
+        if type_ == "G":
             label = "%s:%d-%d" % (rid, sp, tp)
             nxsg.add_edge(v, w, label=label, length=length, score=score)
             edge_data[(v, w)] = (rid, sp, tp, length, score, identity, type_)
-            if w in sg.best_in:
+            if best_in:
                 nxsg.node[w]["best_in"] = v
-        elif (v, w) in chimer_edges:
-            type_ = "C"
-        elif (v, w) in removed_edges:
-            type_ = "R"
-        elif (v, w) in spur_edges:
-            type_ = "S"
-        elif sg.e_reduce[(v, w)] == True:
-            type_ = "TR"
 
         line = '%s %s %s %5d %5d %5d %5.2f %s' % (
             v, w, rid, sp, tp, score, identity, type_)
         print(line, file=out_f)
 
     out_f.close()
-    nxsg_r = nxsg.reverse()
+    if args.binary_sidecars:
+        sg_edges_table(sg, names, types, order).save("sg_edges_list")
 
-    return nxsg, nxsg_r, edge_data
+    return nxsg, edge_data
+
+
+def sg_edges_table(sg, names, types, order=None):
+    """
+    return the rows of sg_edges_list as a graph_files.Table, given the
+    node names, the edge types and the order of the rows
+    """
+    if order is None:
+        order = np.arange(len(sg.src))
+    type_names, type_ids = np.unique(types, return_inverse=True)
+    strings = names + sg.read_names + type_names.tolist()
+    records = np.empty(len(sg.src), dtype=graph_files.schema_dtype(graph_files.SG_EDGES))
+    records['v'] = sg.src[order]
+    records['w'] = sg.dst[order]
+    records['rid'] = len(names) + sg.rid[order]
+    records['sp'] = sg.sp[order]
+    records['tp'] = sg.tp[order]
+    records['score'] = sg.score[order]
+    # the identity as it reads back from the text
+    records['identity'] = np.char.mod('%5.2f', sg.identity[order]).astype(np.float64)
+    records['type'] = len(names) + len(sg.read_names) + type_ids[order]
+    return graph_files.Table(graph_files.SG_EDGES, records, strings, np.empty(0, dtype=np.int32))
 
 
 def construct_compound_paths(ug, u_edge_data):
@@ -926,15 +1143,20 @@ def construct_compound_paths(ug, u_edge_data):
 
     # print "#", len(all_nodes),len(source_nodes), len(sink_nodes), len(simple_nodes), len(branch_nodes)
     compound_paths_0 = []
+    bundle_cache = BundleCache()
     for p in list(branch_nodes):
         if ug.out_degree(p) > 1:
             coverage, data, data_r = find_bundle(
-                ug, u_edge_data, p, 48, 16, 500000)
+                ug, u_edge_data, p, 48, 16, 500000, bundle_cache)
             if coverage == True:
                 start_node, end_node, bundle_edges, length, score, depth = data
                 compound_paths_0.append(
                     (start_node, "NA", end_node, 1.0 * len(bundle_edges) / depth, length, score, bundle_edges))
 
+    LOG.info('Bundle search from {} nodes visited {} nodes (edges of {} cached), and {} nodes of ego graphs; '
+             '{} ties broken'.format(bundle_cache.n_searches, bundle_cache.n_visited,
+                                     len(bundle_cache.out_edges), bundle_cache.n_ego_nodes,
+                                     bundle_cache.n_tie_breaks))
     compound_paths_0.sort(key=lambda x: -len(x[6]))
 
     edge_to_cpath = {}
@@ -1157,7 +1379,7 @@ def identify_spurs(ug, u_edge_data, spur_len):
         n = s_candidates.pop()
         if ug2.in_degree(n) != 0:
             continue
-        n_ego_graph = nx.ego_graph(ug2, n, radius=10)
+        n_ego_graph = graph_lib(ug2).ego_graph(ug2, n, radius=10)
         n_ego_node_set = set(n_ego_graph.nodes())
         for b_node in n_ego_graph.nodes():
             if ug2.in_degree(b_node) <= 1:
@@ -1177,7 +1399,7 @@ def identify_spurs(ug, u_edge_data, spur_len):
             if not with_extern_node:
                 continue
 
-            s_path = nx.shortest_path(ug2, n, b_node)
+            s_path = graph_lib(ug2).shortest_path(ug2, n, b_node)
             v1 = s_path[0]
             total_length = 0
             for v2 in s_path[1:]:
@@ -1356,12 +1578,13 @@ def construct_c_path_from_utgs(ug, u_edge_data, sg):
     return c_path
 
 
-def ovlp_to_graph(args):
+def ovlp_to_graph(args, overlap_store=None):
     # transitivity reduction, remove spurs, remove putative edges caused by repeats
-    sg, sg_r, edge_data = generate_string_graph(args)
+    sg, edge_data = generate_string_graph(args, overlap_store)
+    lib = graph_lib_for(args)
 
     #dual_path = {}
-    sg2 = nx.DiGraph()
+    sg2 = lib.DiGraph()
 
     for v, w in edge_data:
         assert (reverse_end(w), reverse_end(v)) in edge_data
@@ -1375,7 +1598,7 @@ def ovlp_to_graph(args):
 
     simple_paths = identify_simple_paths(sg2, edge_data)
 
-    ug = nx.MultiDiGraph()
+    ug = lib.MultiDiGraph()
     u_edge_data = {}
     circular_path = set()
 
@@ -1550,6 +1773,54 @@ def ovlp_to_graph(args):
 
     ctg_paths.close()
 
+    if args.binary_sidecars:
+        graph_files.write_sidecar("utg_data", graph_files.UTG_DATA)
+        graph_files.write_sidecar("ctg_paths", graph_files.CTG_PATHS)
+
+
+def contig_stats(ctg_paths_fn):
+    """
+    return (number, total length, longest, N50) of the contigs in
+    ctg_paths_fn, counting each contig once (not its reverse path)
+    """
+    lens = sorted(row[4] for row in graph_files.iter_rows(ctg_paths_fn, graph_files.CTG_PATHS)
+                  if not row[0].endswith('R'))
+    if not lens:
+        return 0, 0, 0, 0
+    total = sum(lens)
+    return len(lens), total, lens[-1], read_len_above(lens, int(total * 0.50))
+
+
+def run_sweep(parser, argv, args):
+    """
+    run ovlp_to_graph() in directory sweep.<i> for line i of args.sweep,
+    whose options are added to 'argv', all on the overlaps loaded once;
+    then write the contig stats of each run, side by side, to sweep_stats
+    """
+    with open(args.sweep) as f:
+        sweep = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    overlap_store = load_overlaps(args.overlap_file, args.overlap_cache)
+    rows = []
+    cwd = os.getcwd()
+    for (i, options) in enumerate(sweep):
+        run_args = parser.parse_args(argv + shlex.split(options))
+        run_dir = os.path.join(cwd, 'sweep.{}'.format(i))
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+        LOG.info('Running with {!r} in {!r}.'.format(options, run_dir))
+        os.chdir(run_dir)
+        try:
+            ovlp_to_graph(run_args, overlap_store)
+        finally:
+            os.chdir(cwd)
+        rows.append((os.path.basename(run_dir), ) +
+                    contig_stats(os.path.join(run_dir, 'ctg_paths')) + (options, ))
+    with open('sweep_stats', 'w') as f:
+        for row in [('run', 'contigs', 'total', 'longest', 'N50', 'options')] + rows:
+            line = '{:<10} {:>8} {:>12} {:>10} {:>10}  {}'.format(*row)
+            print(line, file=f)
+            print(line)
+
 
 def main(argv=sys.argv):
     import argparse
@@ -1571,9 +1842,33 @@ def main(argv=sys.argv):
     parser.add_argument(
         '--disable_chimer_bridge_removal', action="store_true", default=False,
         help='disable chimer induced bridge removal')
+    parser.add_argument(
+        '--n-core', type=int, default=0,
+        help='number of processes for the transitive reduction; 0 to run it in this process')
+    parser.add_argument(
+        '--binary-sidecars', action="store_true", default=False,
+        help='also write sg_edges_list, utg_data and ctg_paths as memory-mappable binary files '
+        '(sg_edges_list.bin etc.), which the downstream readers use when present')
+    parser.add_argument(
+        '--networkx', action="store_true", default=False,
+        help='build the unitig and contig graphs with networkx rather than the (faster) native '
+        'graphs of falcon_kit.unitig_graph; the output is the same')
+    parser.add_argument(
+        '--overlap-cache',
+        help='directory for a store of the parsed overlap file, keyed by its checksum, which later runs '
+        'on the same overlaps reuse (whatever their --min_len, --min_idt, etc.)')
+    parser.add_argument(
+        '--sweep',
+        help='a file of parameter sets, one per line (e.g. "--min_len 6000 --lfc"), each added to the '
+        'other options; run with each, in sweep.0, sweep.1, etc., loading the overlaps only once, '
+        'and write their contig stats side by side to sweep_stats')
 
     args = parser.parse_args(argv[1:])
-    ovlp_to_graph(args)
+    logging.basicConfig(level=logging.INFO)
+    if args.sweep:
+        run_sweep(parser, argv[1:], args)
+    else:
+        ovlp_to_graph(args)
 
 
 if __name__ == "__main__":
@@ -3,14 +3,16 @@ from __future__ import print_function
 
 
 from falcon_kit.multiproc import Pool
+import falcon_kit.overlaps as overlaps
 import falcon_kit.util.io as io
+import numpy as np
 import argparse
 import sys
 import glob
 import os
 from heapq import heappush, heappop, heappushpop
 
-Reader = io.CapturedProcessReaderContext
+Reader = io.BufferedProcessReaderContext
 
 
 def get_pid_to_ctg(fn):
@@ -37,22 +39,24 @@ def tr_stage1(readlines, min_len, bestn, pid_to_ctg):
     keep top `bestn` hits with a priority queue through all overlaps
     """
     rtn = {}
-    for l in readlines():
-        l = l.strip().split()
-        q_id, t_id = l[:2]
-        overlap_len = -int(l[2])
-        idt = float(l[3])
-        q_s, q_e, q_l = int(l[5]), int(l[6]), int(l[7])
-        t_s, t_e, t_l = int(l[9]), int(l[10]), int(l[11])
-        if t_l < min_len:
-            continue
-        if q_id not in pid_to_ctg:
-            continue
-        rtn.setdefault(t_id, [])
-        if len(rtn[t_id]) < bestn:
-            heappush(rtn[t_id], (overlap_len, q_id))
-        else:
-            heappushpop(rtn[t_id], (overlap_len, q_id))
+    q_ids = overlaps.IdBitmap(rid for rid in pid_to_ctg if rid.isdigit())
+    for lines, recs in overlaps.iter_chunks(readlines):
+        idx = np.flatnonzero((recs['t_l'] >= min_len) &
+                             q_ids.contains(recs['q_id']))
+        # Only the best `bestn` of each chunk can be among the best overall.
+        t_id = recs['t_id'][idx]
+        overlap_len = -recs['score'][idx]
+        order = np.lexsort((-recs['q_id'][idx], -overlap_len, t_id))
+        idx = idx[order]
+        starts = overlaps.run_starts(t_id[order])
+        best = overlaps.run_offsets(starts, len(idx)) < bestn
+        for i in idx[best]:
+            q_id, t_id, score = overlaps.fields(lines[i], 3)
+            rtn.setdefault(t_id, [])
+            if len(rtn[t_id]) < bestn:
+                heappush(rtn[t_id], (-int(score), q_id))
+            else:
+                heappushpop(rtn[t_id], (-int(score), q_id))
 
     return rtn
 
@@ -132,15 +136,15 @@ def try_run_track_reads(n_core, base_dir, min_len, bestn):
         raise
 
 
-def track_reads(n_core, base_dir, min_len, bestn, debug, silent, stream):
+def track_reads(n_core, base_dir, min_len, bestn, debug, silent, stream, capture):
     if debug:
         n_core = 0
         silent = False
     if silent:
         io.LOG = io.write_nothing
-    if stream:
+    if capture:
         global Reader
-        Reader = io.StreamedProcessReaderContext
+        Reader = io.CapturedProcessReaderContext
     try_run_track_reads(n_core, base_dir, min_len, bestn)
 
 
@@ -158,7 +162,9 @@ to the contigs with read_to_contig_map generated by `fc_get_read_ctg_map` in `2-
     parser.add_argument('--min_len', type=int, default=2500,
                         help="min length of the reads")
     parser.add_argument('--stream', action='store_true',
-                        help='stream from LA4Falcon, instead of slurping all at once; can save memory for large data')
+                        help='ignored; LA4Falcon output is always streamed, unless --capture')
+    parser.add_argument('--capture', action='store_true',
+                        help='slurp all LA4Falcon output at once, instead of streaming it in blocks; uses much more memory')
     parser.add_argument('--debug', '-g', action='store_true',
                         help="single-threaded, plus other aids to debugging")
     parser.add_argument('--silent', action='store_true',
@@ -8,8 +8,8 @@ from __future__ import print_function
 import argparse
 import logging
 import sys
-from ..FastaReader import open_fasta_reader
-from ..io import open_progress
+from .. import graph_files
+from ..fasta_index import IndexedFasta
 
 default_sg_edges_list_fns = ['./sg_edges_list']
 
@@ -27,23 +27,11 @@ def run(fp_out, preads_fasta_fn, sg_edges_list_fns):
     reads_in_layout = set()
 
     for fn in sg_edges_list_fns:
-        with open_progress(fn) as fp_in:
-            for l in fp_in:
-                l = l.strip().split()
-                """001039799:E 000333411:E 000333411 17524 20167 17524 99.62 G"""
-                v, w, rid, s, t, aln_score, idt, type_ = l
-                if type_ != "G":
-                    continue
-                r1 = v.split(":")[0]
-                reads_in_layout.add(r1)
-                r2 = w.split(":")[0]
-                reads_in_layout.add(r2)
-
-    with open_fasta_reader(preads_fasta_fn) as f:
-        for r in f:
-            if r.name not in reads_in_layout:
-                continue
-            fp_out.write('>{}\n{}\n'.format(r.name, r.sequence.upper()))
+        reads_in_layout.update(graph_files.layout_reads(fn))
+
+    with IndexedFasta(preads_fasta_fn, names=reads_in_layout) as fasta:
+        for rid in fasta.names():
+            fp_out.write('>{}\n{}\n'.format(rid, fasta.fetch(rid).upper()))
 
 def main(argv=sys.argv):
     description = 'Create a reduced set of preads, with only those used in the final layout. Write to stdout.'
@@ -5,16 +5,18 @@ from .. import stats_preassembly
 import argparse
 import json
 import logging
+import multiprocessing
 
 log = logging.getLogger()
 
 
-def do_report(db, preads_fofn, genome_length, length_cutoff, out):
+def do_report(db, preads_fofn, genome_length, length_cutoff, out, n_core=0):
     kwds = dict(
         i_preads_fofn_fn=preads_fofn,
         i_raw_reads_db_fn=db,
         genome_length=genome_length,
         length_cutoff=length_cutoff,
+        n_core=min(n_core, multiprocessing.cpu_count()),
     )
     report_dict = stats_preassembly.calc_dict(**kwds)
     content = json.dumps(report_dict, sort_keys=True,
@@ -41,6 +43,9 @@ def main():
     parser.add_argument('--out',
                         required=True,
                         help='Path to JSON output file.')
+    parser.add_argument('--n-core',
+                        type=int, default=0,
+                        help='Scan the preads fasta files with this many processes (at most the number of CPUs); 0 or 1 scans them in this process.')
     ARGS = parser.parse_args()
     do_report(**vars(ARGS))
 
@@ -4,7 +4,20 @@ from __future__ import absolute_import
 
 from builtins import map
 from builtins import object
+import collections
 import multiprocessing
+import multiprocessing.pool
+
+
+class FakeAsyncResult(object):
+    """Fake version of multiprocessing.pool.AsyncResult
+    """
+
+    def get(self, timeout=None):
+        return self.value
+
+    def __init__(self, value):
+        self.value = value
 
 
 class FakePool(object):
@@ -17,9 +30,18 @@ class FakePool(object):
     def imap(self, func, iterable, chunksize=None):
         return map(func, iterable)
 
+    def apply_async(self, func, args=(), kwds={}):
+        return FakeAsyncResult(func(*args, **kwds))
+
     def terminate(self):
         pass
 
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
     def __init__(self, initializer=None, initargs=[], *args, **kwds):
         if initializer:
             initializer(*initargs)
@@ -34,3 +56,32 @@ def Pool(processes, *args, **kwds):
         return multiprocessing.Pool(processes, *args, **kwds)
     else:
         return FakePool(*args, **kwds)
+
+
+def ThreadPool(threads, *args, **kwds):
+    """Pool factory, like Pool(), but with threads instead of processes.
+    Tasks and results are shared, not pickled, so this pays off only
+    when the work releases the GIL (e.g. ctypes calls into C).
+    """
+    if threads:
+        return multiprocessing.pool.ThreadPool(threads, *args, **kwds)
+    else:
+        return FakePool(*args, **kwds)
+
+
+def bounded_imap(pool, func, iterable, max_pending):
+    """Like pool.imap(), in order, but with backpressure.
+
+    multiprocessing.Pool.imap() drains 'iterable' in a feeder thread, so
+    a large generator ends up fully materialized in the parent. Here we
+    pull from 'iterable' only while fewer than 'max_pending' tasks are
+    queued or running, so parsing overlaps with work and memory stays flat.
+    """
+    assert max_pending > 0, max_pending
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
@@ -0,0 +1,261 @@
+"""Vectorized parsing of LA4Falcon -m/-mo output.
+
+Each line becomes one record of a NumPy structured array (OVLP_DTYPE),
+so that per-overlap filters and per-query counts are array operations.
+
+Ids are compared as ints. That matches comparing the original strings
+because LA4Falcon zero-pads ids to a fixed width. Any strings in the
+results should be taken from the original lines (see fields()), so
+output stays byte-identical to the line-by-line parsers.
+"""
+from __future__ import absolute_import
+from __future__ import division
+
+import itertools
+import numpy as np
+
+OVLP_TYPES = ('overlap', 'contains', 'contained', 'none')
+OVLP_TYPE_CODES = dict((t, i) for (i, t) in enumerate(OVLP_TYPES))
+OVLP_DTYPE = np.dtype([
+    ('q_id', np.int32),
+    ('t_id', np.int32),
+    ('score', np.int32),
+    ('idt', np.float64),
+    ('q_strand', np.int8),
+    ('q_s', np.int32),
+    ('q_e', np.int32),
+    ('q_l', np.int32),
+    ('t_strand', np.int8),
+    ('t_s', np.int32),
+    ('t_e', np.int32),
+    ('t_l', np.int32),
+    ('type', np.int8),
+])
+CHUNK_SIZE = 1 << 16  # lines
+
+# Longest names first, since 'contains' is a prefix of 'contained'.
+_TYPE_REPLACEMENTS = sorted(
+    ((name, str(code)) for (name, code) in OVLP_TYPE_CODES.items()),
+    key=lambda nc: -len(nc[0]))
+
+
+def parse_lines(lines):
+    """Return an OVLP_DTYPE array, one record per line.
+    Raise ValueError if any line does not have the expected fields.
+    """
+    records = np.empty(len(lines), dtype=OVLP_DTYPE)
+    if not lines:
+        return records
+    text = '\n'.join(lines) + '\n'
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    if not _parse_ints(text, records):
+        _parse_floats(text, records)
+    return records
+
+
+def _parse_ints(text, records):
+    """Fill 'records' from 'text', one line per record.
+    This is the fast path, which relies on each line having one '.' (in
+    idt) and ending with the type, so that everything can be parsed as
+    ints. Return False (leaving 'records' partly filled) for anything else.
+    """
+    n = len(records)
+    n_cols = len(OVLP_DTYPE.names) + 1  # idt becomes two columns.
+    chars = np.frombuffer(text, dtype=np.uint8).copy()
+    is_alpha = chars >= ord('A')
+    word_starts = np.flatnonzero(is_alpha[1:] & ~is_alpha[:-1]) + 1
+    word_ends = np.flatnonzero(is_alpha[:-1] & ~is_alpha[1:])
+    dots = np.flatnonzero(chars == ord('.'))
+    if len(word_starts) != n or len(word_ends) != n or len(dots) != n:
+        return False
+    types = np.full(n, -1, dtype=np.int8)
+    word_lens = word_ends - word_starts + 1
+    for (name, code) in OVLP_TYPE_CODES.items():
+        name = bytearray(name.encode('ascii'))
+        types[(word_lens == len(name)) &
+              (chars[word_starts] == name[0]) & (chars[word_ends] == name[-1])] = code
+    if (types < 0).any():
+        return False
+    # The digits after each '.' are the fraction of idt.
+    n_frac_digits = np.zeros(n, dtype=np.int64)
+    is_digit = np.ones(n, dtype=bool)
+    for i in range(1, 8):
+        after = chars[np.minimum(dots + i, len(chars) - 1)]
+        is_digit &= (after >= ord('0')) & (after <= ord('9'))
+        n_frac_digits += is_digit
+    # Replace each type by its code, and split idt in two ints.
+    chars[is_alpha] = ord(' ')
+    chars[word_starts] = ord('0') + types
+    chars[dots] = ord(' ')
+    values = np.fromstring(chars.tostring(), dtype=np.int32, sep=' ')
+    if len(values) != n * n_cols:
+        return False
+    # Columns: q_id t_id score idt idt_frac q_strand ... t_l type
+    values = values.reshape(n, n_cols)
+    if (values[:, -1] != types).any():
+        return False  # Some line had too many or too few fields.
+    for (i, name) in enumerate(OVLP_DTYPE.names[:3]):
+        records[name] = values[:, i]
+    # One division, so that idt is exactly float() of its string.
+    scale = np.power(10.0, n_frac_digits)
+    records['idt'] = (values[:, 3] * scale + values[:, 4]) / scale
+    for (i, name) in enumerate(OVLP_DTYPE.names[4:12]):
+        records[name] = values[:, i + 5]
+    records['type'] = types
+    return True
+
+
+def _parse_floats(text, records):
+    """Fill 'records' from 'text', one line per record, parsing every
+    field as a float.
+    """
+    n = len(records)
+    for (name, code) in _TYPE_REPLACEMENTS:
+        text = text.replace(name.encode('ascii'), code.encode('ascii'))
+    values = np.fromstring(text, dtype=np.float64, sep=' ')
+    n_fields = len(OVLP_DTYPE.names)
+    if len(values) != n_fields * n:
+        msg = 'Expected {} fields per line of LA4Falcon -m output, near {!r}'.format(
+            n_fields, text[:200])
+        raise ValueError(msg)
+    values = values.reshape(n, n_fields)
+    for (i, name) in enumerate(OVLP_DTYPE.names):
+        records[name] = values[:, i]
+
+
+def iter_chunks(readlines, chunk_size=CHUNK_SIZE):
+    """Yield (lines, records) for the output of readlines(), in chunks of
+    roughly 'chunk_size' lines. A run of lines with the same q_id is
+    never split across chunks.
+    """
+    it = iter(readlines())
+
+    def chunks():
+        while True:
+            lines = list(itertools.islice(it, chunk_size))
+            if not lines:
+                break
+            yield lines, parse_lines(lines)
+    return group_chunks(chunks())
+
+
+def group_chunks(chunks):
+    """Re-cut (lines, records) chunks so that a run of records with the
+    same q_id is never split across chunks. 'lines' can be any sequence
+    (list or array) aligned with 'records', or None.
+    """
+    lines = None
+    records = np.empty(0, dtype=OVLP_DTYPE)
+    for more_lines, more in chunks:
+        if not len(more):
+            continue
+        lines = _concat(lines, more_lines)
+        records = np.concatenate((records, more))
+        last = run_starts(records['q_id'])[-1]
+        if last == 0:
+            continue
+        yield (lines[:last] if lines is not None else None), records[:last]
+        lines = lines[last:] if lines is not None else None
+        records = records[last:]
+    if len(records):
+        yield lines, records
+
+
+def _concat(a, b):
+    if a is None or not len(a):
+        return b
+    if isinstance(a, np.ndarray):
+        return np.concatenate((a, b))
+    return a + b
+
+
+def fields(line, n):
+    """Return the first 'n' whitespace-separated fields of 'line'.
+    """
+    return line.split(None, n)[:n]
+
+
+def run_starts(ids):
+    """Return the index of the first element of each run of equal ids.
+    """
+    if not len(ids):
+        return np.zeros(0, dtype=np.intp)
+    return np.concatenate(([0], np.flatnonzero(ids[1:] != ids[:-1]) + 1))
+
+
+def run_sizes(starts, n):
+    """Return the length of each run, given run_starts() of 'n' elements.
+    """
+    return np.diff(np.append(starts, n))
+
+
+def run_sums(flags, starts):
+    """Return the number of true 'flags' in each run.
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64)
+    return np.add.reduceat(flags.astype(np.int64), starts)
+
+
+def run_offsets(starts, n):
+    """Return the position of each of 'n' elements within its run.
+    """
+    return np.arange(n) - np.repeat(starts, run_sizes(starts, n))
+
+
+class IdBitmap(object):
+    """A set of read ids, as a bitmap indexed by DAZZ_DB read id.
+    It is small enough to hand to each worker once, and contains() tests
+    a whole array of ids at once.
+    """
+
+    def contains(self, ids):
+        """Return a boolean array, True for each of 'ids' in the set.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        inside = (ids >= 0) & (ids < 8 * len(self.bits))
+        ids = ids[inside]
+        found[inside] = (self.bits[ids >> 3] >> (7 - (ids & 7))) & 1
+        return found
+
+    def ids(self):
+        """Return the sorted ids in the set.
+        """
+        return np.flatnonzero(np.unpackbits(self.bits))
+
+    def __contains__(self, id):
+        return 0 <= id < 8 * len(self.bits) and \
+            bool((self.bits[id >> 3] >> (7 - (id & 7))) & 1)
+
+    def __len__(self):
+        return len(self.ids())
+
+    def __or__(self, other):
+        n = max(len(self.bits), len(other.bits))
+        bits = np.zeros(n, dtype=np.uint8)
+        bits[:len(self.bits)] |= self.bits
+        bits[:len(other.bits)] |= other.bits
+        union = IdBitmap()
+        union.bits = bits
+        return union
+
+    def __init__(self, ids=()):
+        """'ids' are ints (maybe an array), or id strings.
+        """
+        if isinstance(ids, np.ndarray):
+            ids = ids.astype(np.int64)
+        else:
+            ids = np.fromiter((int(i) for i in ids), dtype=np.int64)
+        flags = np.zeros(ids.max() + 1 if len(ids) else 0, dtype=bool)
+        flags[ids] = True
+        self.bits = np.packbits(flags)
+
+
+def id_bitmap(ids):
+    """Return 'ids' as an IdBitmap, if it is not one already.
+    """
+    if isinstance(ids, IdBitmap):
+        return ids
+    return IdBitmap(ids)
@@ -93,9 +93,11 @@ python -m falcon_kit.mains.generate_read_to_ctg_map --rawread-id={input.rawread_
 """
 TASK_RUN_DB_TO_FALCON_SCRIPT = """\
 # Given preads.db,
-# write preads4falcon.fasta (implicitly) in CWD.
+# write preads4falcon.fasta (implicitly) in CWD,
+# and its index, preads4falcon.fasta.fai.
 time DB2Falcon -U {input.preads_db}
 [ -f {output.preads4falcon} ] || exit 1
+time python -m falcon_kit.mains.fasta_index {output.preads4falcon}
 touch {output.job_done}
 """
 TASK_RUN_FALCON_ASM_SCRIPT = """\
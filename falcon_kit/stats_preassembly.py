@@ -11,13 +11,14 @@ from __future__ import division
 
 from future.utils import viewitems
 from builtins import object
-from .FastaReader import open_fasta_reader
+from .FastaReader import fasta_lengths
+from .multiproc import Pool
 from .util.io import syscall
 from . import functional
 import collections
 import glob
-import itertools
 import logging
+import numpy as np
 import os
 import pprint
 import re
@@ -34,15 +35,10 @@ Stats = collections.namedtuple(
 
 def get_fasta_readlengths(fasta_file):
     """
-    Get a sorted list of contig lengths
-    :return: (tuple)
+    Get the sorted contig lengths, scanning only the line-breaks.
+    :return: (numpy.ndarray of int64)
     """
-    lens = []
-    with open_fasta_reader(fasta_file) as f:
-        for record in f:
-            lens.append(len(record.sequence))
-    lens.sort()
-    return lens
+    return np.sort(fasta_lengths(fasta_file))
 
 
 def get_db_readlengths(fn):
@@ -65,7 +61,7 @@ class FastaContainer(object):
         #        nreads, total = _compute_values(file_name)
         read_lens = get_fasta_readlengths(file_name)
         nreads = len(read_lens)
-        total = sum(read_lens)
+        total = int(read_lens.sum())
         return FastaContainer(nreads, total, file_name)
 
     def __str__(self):
@@ -82,27 +78,30 @@ def _validate_file(file_name):
 
 
 def cutoff_reads(read_lens, min_read_len):
-    return [rl for rl in read_lens if rl >= min_read_len]
+    read_lens = np.asarray(read_lens, dtype=np.int64)
+    return read_lens[read_lens >= min_read_len]
 
 
 def read_len_above(read_lens, threshold):
-    subtotal = 0
-    # Reverse-order calculation is faster.
-    for irev, rl in enumerate(reversed(read_lens)):
-        subtotal += rl
-        if subtotal >= threshold:
-            return rl
+    """Return the length of the read at which the (sorted) read_lens,
+    summed from the longest, reach threshold; None if they never do.
+    """
+    rev_lens = np.asarray(read_lens, dtype=np.int64)[::-1]
+    i = np.searchsorted(np.cumsum(rev_lens), threshold)
+    if i < len(rev_lens):
+        return int(rev_lens[i])
 
 
 def percentile(read_lens, p):
     # TODO: Fix this when p=1.0
-    return read_lens[int(len(read_lens) * p)]
+    return int(read_lens[int(len(read_lens) * p)])
 
 
 def stats_from_sorted_readlengths(read_lens):
+    read_lens = np.asarray(read_lens, dtype=np.int64)
     nreads = len(read_lens)
-    total = sum(read_lens)
-    sum_squares = sum(r * r for r in read_lens)
+    total = int(read_lens.sum())
+    sum_squares = int(np.dot(read_lens, read_lens))
     n50 = read_len_above(read_lens, int(total * 0.50))
     p95 = percentile(read_lens, 0.95)
     esize = sum_squares / total
@@ -111,12 +110,49 @@ def stats_from_sorted_readlengths(read_lens):
     return Stats(nreads=nreads, total=total, n50=n50, p95=p95, esize=esize)
 
 
-def read_lens_from_fofn(fofn_fn):
-    """Return sorted list.
+def get_fasta_readlength_histogram(fasta_file):
+    """
+    Get the number of contigs of each length.
+    :return: (numpy.ndarray of int64, indexed by length)
+    """
+    return np.bincount(fasta_lengths(fasta_file)).astype(np.int64)
+
+
+def sorted_readlengths_from_histograms(hists):
+    """Return the sorted lengths counted by the sum of histograms 'hists'
+    (an iterable), adding each into a running total as it comes.
+    """
+    total = np.zeros(0, dtype=np.int64)
+    for h in hists:
+        if len(h) > len(total):
+            grown = np.zeros(len(h), dtype=np.int64)
+            grown[:len(total)] = total
+            total = grown
+        total[:len(h)] += h
+    return np.repeat(np.arange(len(total), dtype=np.int64), total)
+
+
+def read_lens_from_fofn(fofn_fn, n_core=0):
+    """Return sorted numpy array.
+    With n_core, the files are scanned by a pool of that many processes,
+    each returning just a length histogram, which are summed.
     """
     fns = [fn.strip() for fn in open(fofn_fn) if fn.strip()]
-    # get_fasta_readlengths() returns sorted, so sorting the chain is roughly linear.
-    return list(sorted(itertools.chain.from_iterable(get_fasta_readlengths(fn) for fn in fns)))
+    n_core = min(n_core, len(fns))
+    if n_core < 2:
+        return sorted_readlengths_from_histograms(
+            get_fasta_readlength_histogram(fn) for fn in fns)
+    exe_pool = Pool(n_core)
+    try:
+        read_lens = sorted_readlengths_from_histograms(
+            exe_pool.imap_unordered(get_fasta_readlength_histogram, fns))
+    except:
+        exe_pool.terminate()
+        raise
+    else:
+        exe_pool.close()
+        exe_pool.join()
+    return read_lens
 
 
 def read_lens_from_db(db_fn):
@@ -213,14 +249,15 @@ def make_dict(
     length_cutoff,
     fragmentation=-1,
     truncation=-1,
+    n_core=0,
 ):
-    raw_reads = read_lens_from_fofn(i_raw_reads_fofn_fn)
+    raw_reads = read_lens_from_fofn(i_raw_reads_fofn_fn, n_core)
     stats_raw_reads = stats_from_sorted_readlengths(raw_reads)
 
     seed_reads = cutoff_reads(raw_reads, length_cutoff)
     stats_seed_reads = stats_from_sorted_readlengths(seed_reads)
 
-    preads = read_lens_from_fofn(i_preads_fofn_fn)
+    preads = read_lens_from_fofn(i_preads_fofn_fn, n_core)
     stats_preads = stats_from_sorted_readlengths(preads)
     report_dict = stats_dict(
         stats_raw_reads=stats_raw_reads,
@@ -239,6 +276,7 @@ def calc_dict(
     i_raw_reads_db_fn,
     genome_length,
     length_cutoff,
+    n_core=0,
 ):
     try:
         frag = metric_fragmentation(i_preads_fofn_fn)
@@ -257,7 +295,7 @@ def calc_dict(
     seed_reads = cutoff_reads(raw_reads, length_cutoff)
     stats_seed_reads = stats_from_sorted_readlengths(seed_reads)
 
-    preads = read_lens_from_fofn(i_preads_fofn_fn)
+    preads = read_lens_from_fofn(i_preads_fofn_fn, n_core)
     stats_preads = stats_from_sorted_readlengths(preads)
     report_dict = stats_dict(
         stats_raw_reads=stats_raw_reads,
@@ -0,0 +1,274 @@
+"""Lightweight directed graphs for the unitig/contig stage of
+fc_ovlp_to_graph, in place of networkx.
+
+DiGraph and MultiDiGraph have the subset of the networkx (1.x) interface
+which that stage uses, and ego_graph() and shortest_path() work like
+their networkx namesakes. The adjacency is the same dict-of-dicts
+(succ/pred, plus 'node' for node attributes), built and edited by the
+same sequence of dict operations, so nodes and edges come out in the
+same order as from networkx, and so does the assembly. What they save is
+the generality: copy() rebuilds the dicts directly rather than through
+deepcopy(), and edge attributes are kept but never copied (they are
+shared between a graph and its copies).
+"""
+from __future__ import absolute_import
+
+from builtins import object
+
+
+class Graph(object):
+    """The parts common to DiGraph and MultiDiGraph.
+    """
+
+    def nodes(self):
+        return list(self.node)
+
+    def add_node(self, n):
+        if n not in self.succ:
+            self.succ[n] = {}
+            self.pred[n] = {}
+            self.node[n] = {}
+
+    def in_degree(self, n):
+        return len(self.in_edges(n))
+
+    def out_degree(self, n):
+        return len(self.out_edges(n))
+
+    def subgraph(self, nbunch):
+        """Return the subgraph on the nodes in 'nbunch', sharing edge data
+        with this graph.
+        """
+        H = self.__class__()
+        for n in nbunch:
+            if n in self.succ:
+                H.node[n] = self.node[n]
+        H_succ = H.succ
+        H_pred = H.pred
+        for n in H.node:
+            H_succ[n] = {}
+            H_pred[n] = {}
+        for u in H_succ:
+            Hnbrs = H_succ[u]
+            for v, datadict in self.succ[u].items():
+                if v in H_succ:
+                    datadict = self._copy_adj_value(datadict)
+                    Hnbrs[v] = datadict
+                    H_pred[v][u] = datadict
+        return H
+
+    def copy(self):
+        """Return a copy, with the dicts rebuilt in iteration order (as
+        by deepcopy()), but sharing edge data with this graph.
+        """
+        H = self.__class__()
+        H.node = dict((n, d.copy()) for n, d in self.node.items())
+        H.succ = dict((u, dict((v, self._rebuild_adj_value(d)) for v, d in nbrs.items()))
+                      for u, nbrs in self.succ.items())
+        H.pred = dict((v, dict((u, H.succ[u][v]) for u in nbrs))
+                      for v, nbrs in self.pred.items())
+        return H
+
+    def __contains__(self, n):
+        return n in self.node
+
+    def __iter__(self):
+        return iter(self.node)
+
+    def __len__(self):
+        return len(self.node)
+
+    def __getitem__(self, n):
+        return self.succ[n]
+
+    def __init__(self):
+        self.node = {}  # node -> attributes
+        self.succ = {}  # u -> v -> edge data
+        self.pred = {}  # v -> u -> edge data, shared with succ
+
+
+class DiGraph(Graph):
+    """A directed graph, with at most one edge u->v.
+    """
+
+    def add_edge(self, u, v, **attr):
+        self.add_node(u)
+        self.add_node(v)
+        datadict = self.succ[u].get(v, {})
+        datadict.update(attr)
+        self.succ[u][v] = datadict
+        self.pred[v][u] = datadict
+
+    def edges(self):
+        return [(u, v) for u, nbrs in self.succ.items() for v in nbrs]
+
+    def out_edges(self, n):
+        return [(n, v) for v in self.succ.get(n, ())]
+
+    def in_edges(self, n):
+        return [(u, n) for u in self.pred.get(n, ())]
+
+    @staticmethod
+    def _copy_adj_value(datadict):
+        return datadict
+
+    @staticmethod
+    def _rebuild_adj_value(datadict):
+        return datadict
+
+
+class MultiDiGraph(Graph):
+    """A directed graph, with any number of edges u->v, told apart by key.
+    """
+
+    def add_edge(self, u, v, key=None, **attr):
+        self.add_node(u)
+        self.add_node(v)
+        if v in self.succ[u]:
+            keydict = self.succ[u][v]
+            if key is None:
+                key = len(keydict)
+                while key in keydict:
+                    key += 1
+            datadict = keydict.get(key, {})
+            datadict.update(attr)
+            keydict[key] = datadict
+        else:
+            if key is None:
+                key = 0
+            keydict = {key: attr}
+            self.succ[u][v] = keydict
+            self.pred[v][u] = keydict
+
+    def remove_edge(self, u, v, key=None):
+        """Remove edge u->v with 'key' (or any one of them, if 'key' is
+        None). Raise KeyError if there is no such edge.
+        """
+        try:
+            keydict = self.succ[u][v]
+        except KeyError:
+            raise KeyError('The edge {}-{} is not in the graph.'.format(u, v))
+        if key is None:
+            keydict.popitem()
+        else:
+            try:
+                del keydict[key]
+            except KeyError:
+                raise KeyError('The edge {}-{} with key {} is not in the graph.'.format(u, v, key))
+        if len(keydict) == 0:
+            del self.succ[u][v]
+            del self.pred[v][u]
+
+    def edges(self, keys=False):
+        if keys:
+            return [(u, v, k) for u, nbrs in self.succ.items()
+                    for v, keydict in nbrs.items() for k in keydict]
+        return [(u, v) for u, nbrs in self.succ.items()
+                for v, keydict in nbrs.items() for k in keydict]
+
+    def out_edges(self, n, keys=False):
+        nbrs = self.succ.get(n, {})
+        if keys:
+            return [(n, v, k) for v, keydict in nbrs.items() for k in keydict]
+        return [(n, v) for v, keydict in nbrs.items() for k in keydict]
+
+    def in_edges(self, n, keys=False):
+        nbrs = self.pred.get(n, {})
+        if keys:
+            return [(u, n, k) for u, keydict in nbrs.items() for k in keydict]
+        return [(u, n) for u, keydict in nbrs.items() for k in keydict]
+
+    def in_degree(self, n):
+        return sum([len(keydict) for keydict in self.pred[n].values()])
+
+    def out_degree(self, n):
+        return sum([len(keydict) for keydict in self.succ[n].values()])
+
+    @staticmethod
+    def _copy_adj_value(keydict):
+        return keydict.copy()
+
+    @staticmethod
+    def _rebuild_adj_value(keydict):
+        return dict((k, d) for k, d in keydict.items())
+
+
+def single_source_shortest_path_length(G, source, cutoff=None):
+    """Return {node: number of hops from 'source'}, for the nodes at most
+    'cutoff' hops away.
+    """
+    seen = {}
+    level = 0
+    nextlevel = {source: 1}
+    while nextlevel:
+        thislevel = nextlevel
+        nextlevel = {}
+        for v in thislevel:
+            if v not in seen:
+                seen[v] = level
+                nextlevel.update(G.succ[v])
+        if cutoff is not None and cutoff <= level:
+            break
+        level = level + 1
+    return seen
+
+
+def ego_graph(G, n, radius=1):
+    """Return a copy of the subgraph of G on the nodes at most 'radius'
+    hops (along out-edges) from 'n'.
+    """
+    sp = single_source_shortest_path_length(G, n, cutoff=radius)
+    return G.subgraph(sp).copy()
+
+
+def shortest_path(G, source, target):
+    """Return a list of the nodes on a path from 'source' to 'target' with
+    the fewest edges, by bidirectional breadth-first search.
+    Raise ValueError if there is no such path.
+    """
+    if target == source:
+        return [source]
+    pred = {source: None}
+    succ = {target: None}
+    forward_fringe = [source]
+    reverse_fringe = [target]
+    w = None
+    while w is None and forward_fringe and reverse_fringe:
+        if len(forward_fringe) <= len(reverse_fringe):
+            this_level = forward_fringe
+            forward_fringe = []
+            for v in this_level:
+                for x in G.succ[v]:
+                    if x not in pred:
+                        forward_fringe.append(x)
+                        pred[x] = v
+                    if x in succ:
+                        w = x
+                        break
+                if w is not None:
+                    break
+        else:
+            this_level = reverse_fringe
+            reverse_fringe = []
+            for v in this_level:
+                for x in G.pred[v]:
+                    if x not in succ:
+                        succ[x] = v
+                        reverse_fringe.append(x)
+                    if x in pred:
+                        w = x
+                        break
+                if w is not None:
+                    break
+    if w is None:
+        raise ValueError('No path between {} and {}.'.format(source, target))
+    path = []
+    while w is not None:
+        path.append(w)
+        w = pred[w]
+    path.reverse()
+    w = succ[path[-1]]
+    while w is not None:
+        path.append(w)
+        w = succ[w]
+    return path
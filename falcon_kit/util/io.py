@@ -32,10 +32,11 @@ def write_with_pid(*args):
 LOG = write_with_pid
 
 
-def logstats():
+def logstats(label=''):
     """This is useful 'atexit'.
     """
-    LOG('maxrss:%9d' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+    LOG('maxrss:%9d%s' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                          ' ' + label if label else ''))
 
 
 def reprarg(arg):
@@ -67,9 +68,9 @@ def run_func(args):
     args = args[1:]
     try:
         LOG('starting %s(%s)' % (func_name, ', '.join(reprarg(a) for a in args)))
-        logstats()
+        logstats('before ' + func_name)
         ret = func(*args)
-        logstats()
+        logstats('after ' + func_name)
         LOG('finished %s(%s)' % (func_name, ', '.join(reprarg(a) for a in args)))
         return ret
     except Exception:
@@ -228,6 +229,49 @@ class StreamedProcessReaderContext(ProcessReaderContext):
             yield line.rstrip()
 
 
+class BufferedProcessReaderContext(ProcessReaderContext):
+    def readlines(self):
+        """Usage:
+
+            cmd = 'ls -l'
+            reader = BufferedProcessReaderContext(cmd)
+            with reader:
+                for line in reader.readlines():
+                    print line
+
+        Like StreamedProcessReaderContext, memory is bounded by 'bufsize'
+        rather than by all the output of 'cmd', but lines are split a
+        whole block at a time.
+        Any exception within the 'with-block' is propagated.
+        Otherwise, after all lines are read, if 'cmd' failed, Exception is raised.
+        """
+        for block in self.readblocks():
+            for line in block.split('\n'):
+                yield line
+
+    def readblocks(self):
+        """Generate blocks of whole lines, without the final newline.
+        """
+        read = self.proc.stdout.read
+        partial = ''
+        while True:
+            block = read(self.bufsize)
+            if not block:
+                break
+            end = block.rfind('\n')
+            if end < 0:
+                partial += block
+                continue
+            yield partial + block[:end]
+            partial = block[end + 1:]
+        if partial:
+            yield partial
+
+    def __init__(self, cmd, bufsize=1 << 20):
+        super(BufferedProcessReaderContext, self).__init__(cmd)
+        self.bufsize = bufsize
+
+
 def filesize(fn):
     """In bytes.
     Raise if fn does not exist.
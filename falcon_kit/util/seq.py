@@ -0,0 +1,37 @@
+"""DNA sequence utilities
+Not specific to FALCON.
+
+Complementing is one str.translate() (or bytes.translate()) over a
+256-entry table, rather than a dict lookup per base. Characters other
+than ACGTN and '-' (either case) are left as they are.
+"""
+from __future__ import absolute_import
+
+_BASES = 'ACGTNacgtn-'
+_COMPLEMENTS = 'TGCANtgcan-'
+
+
+def _bytes_table():
+    table = bytearray(range(256))
+    for (base, comp) in zip(bytearray(_BASES.encode('ascii')), bytearray(_COMPLEMENTS.encode('ascii'))):
+        table[base] = comp
+    return bytes(table)
+
+
+_BYTES_TABLE = _bytes_table()
+# For text: unicode in Python 2, str in Python 3.
+_TEXT_TABLE = dict((ord(base), ord(comp)) for (base, comp) in zip(_BASES, _COMPLEMENTS))
+
+
+def complement(seq):
+    """Return the complement of 'seq', which is str or bytes.
+    """
+    if isinstance(seq, bytes):
+        return seq.translate(_BYTES_TABLE)
+    return seq.translate(_TEXT_TABLE)
+
+
+def revcomp(seq):
+    """Return the reverse complement of 'seq', which is str or bytes.
+    """
+    return complement(seq)[::-1]
@@ -13,6 +13,7 @@ install_requires = [
     #"pbcore >= 0.6.3",
     "pypeFLOW >= 2.0.0",
     "edlib",
+    "numpy",
 ]
 
 scripts = []
@@ -62,6 +63,7 @@ setup(name='falcon_kit',
           'fc_run=falcon_kit.mains.run1:main',
           'fc_run1=falcon_kit.mains.run1:main',
           'fc_fasta2fasta=falcon_kit.mains.fasta2fasta:main',
+          'fc_fasta_index=falcon_kit.mains.fasta_index:main',
           'fc_fetch_reads=falcon_kit.mains.fetch_reads:main',
           'fc_get_read_ctg_map=falcon_kit.mains.get_read_ctg_map:main',
           'fc_pr_ctg_track=falcon_kit.mains.pr_ctg_track:main',
@@ -125,6 +125,13 @@ typedef struct {
     int * eqv;
 } consensus_data;
 
+typedef struct {
+    unsigned int n_piles;
+    unsigned int * offsets;  // n_piles + 1 offsets into sequence and eqv
+    char * sequence;         // all consensus sequences, back to back
+    int * eqv;
+} consensus_batch_data;
+
 kmer_lookup * allocate_kmer_lookup (seq_coor_t);
 void init_kmer_lookup ( kmer_lookup *,  seq_coor_t );
 void free_kmer_lookup(kmer_lookup *);
@@ -176,3 +183,26 @@ void free_alignment(alignment *);
 
 void free_consensus_data(consensus_data *);
 
+typedef struct msa_workspace msa_workspace_t;
+
+msa_workspace_t * allocate_msa_workspace(void);
+void free_msa_workspace(msa_workspace_t *);
+
+consensus_data * generate_consensus_ws(msa_workspace_t *,
+                                       char **,
+                                       unsigned int,
+                                       unsigned,
+                                       unsigned,
+                                       double);
+
+consensus_batch_data * generate_consensus_batch(msa_workspace_t *,
+                                                char *,
+                                                unsigned int *,
+                                                unsigned int *,
+                                                unsigned int,
+                                                unsigned,
+                                                unsigned,
+                                                double);
+
+void free_consensus_batch_data(consensus_batch_data *);
+
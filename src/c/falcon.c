@@ -103,6 +103,11 @@ typedef struct {
 
 typedef msa_delta_group_t * msa_pos_t;
 
+struct msa_workspace {
+    unsigned int size;     // number of template positions allocated
+    msa_pos_t * msa_array;
+};
+
 align_tags_t * get_align_tags( char * aln_q_seq,
                                char * aln_t_seq,
                                seq_coor_t aln_seq_len,
@@ -263,33 +268,33 @@ void update_col( align_tag_col_t * col, seq_coor_t p_t_pos, uint8_t p_delta, cha
 }
 
 
-msa_pos_t * get_msa_working_sapce(unsigned int max_t_len) {
-    msa_pos_t * msa_array;
+/*
+ * Caller-owned MSA working space, grown to the longest template seen.
+ * It is not shared, so use one per thread.
+ */
+msa_workspace_t * allocate_msa_workspace(void) {
+    return calloc( 1, sizeof(msa_workspace_t) );
+}
+
+void reserve_msa_workspace( msa_workspace_t * ws, unsigned int t_len) {
     unsigned int i;
-    msa_array = calloc(max_t_len, sizeof(msa_pos_t *));
-    for (i = 0; i < max_t_len; i++) {
-        msa_array[i] = calloc(1, sizeof(msa_delta_group_t));
-        msa_array[i]->size = 8;
-        allocate_delta_group(msa_array[i]);
+    if (t_len <= ws->size) return;
+    ws->msa_array = realloc( ws->msa_array, t_len * sizeof(msa_pos_t) );
+    for (i = ws->size; i < t_len; i++) {
+        ws->msa_array[i] = calloc(1, sizeof(msa_delta_group_t));
+        ws->msa_array[i]->size = 8;
+        allocate_delta_group(ws->msa_array[i]);
     }
-    return msa_array;
+    ws->size = t_len;
 }
 
-void clean_msa_working_space( msa_pos_t * msa_array, unsigned int max_t_len) {
+void clean_msa_working_space( msa_pos_t * msa_array, unsigned int t_len) {
     unsigned int i,j,k;
     align_tag_col_t * col;
-    for (i = 0; i < max_t_len; i++) {
+    for (i = 0; i < t_len; i++) {
         for (j =0; j < msa_array[i]->max_delta + 1; j++) {
             for (k = 0; k < 5; k++ ) {
                 col = msa_array[i]->delta[j].base + k;
-                /*
-                for (c =0; c < col->size; c++) {
-                    col->p_t_pos[c] = 0;
-                    col->p_delta[c] = 0;
-                    col->p_q_base[c] = 0;
-                    col->link_count[c] =0;
-                }
-                */
                 col->n_link = 0;
                 col->count = 0;
                 col->best_p_t_pos = 0;
@@ -302,10 +307,28 @@ void clean_msa_working_space( msa_pos_t * msa_array, unsigned int max_t_len) {
     }
 }
 
-#define STATIC_ALLOCATE
-//#undef STATIC_ALLOCATE
+void free_msa_workspace( msa_workspace_t * ws) {
+    unsigned int i;
+    for (i = 0; i < ws->size; i++) {
+        free_delta_group(ws->msa_array[i]);
+        free(ws->msa_array[i]);
+    }
+    free(ws->msa_array);
+    free(ws);
+}
+
+// For the entry points without a workspace argument. Not thread-safe.
+static msa_workspace_t * default_msa_workspace = NULL;
+
+msa_workspace_t * get_default_msa_workspace(void) {
+    if (default_msa_workspace == NULL) {
+        default_msa_workspace = allocate_msa_workspace();
+    }
+    return default_msa_workspace;
+}
 
-consensus_data * get_cns_from_align_tags( align_tags_t ** tag_seqs,
+consensus_data * get_cns_from_align_tags( msa_workspace_t * ws,
+                                          align_tags_t ** tag_seqs,
                                           unsigned n_tag_seqs,
                                           unsigned t_len,
                                           unsigned min_cov ) {
@@ -322,33 +345,9 @@ consensus_data * get_cns_from_align_tags( align_tags_t ** tag_seqs,
     coverage = calloc( t_len, sizeof(unsigned int) );
     local_nbase = calloc( t_len, sizeof(unsigned int) );
 
-#ifndef STATIC_ALLOCATE
-
-    msa_pos_t * msa_array = NULL; // For more efficiency, this should be injected.
-    msa_array = calloc(t_len, sizeof(msa_pos_t *));
-
-    for (i = 0; i < t_len; i++) {
-        msa_array[i] = calloc(1, sizeof(msa_delta_group_t));
-        msa_array[i]->size = 8;
-        allocate_delta_group(msa_array[i]);
-    }
-
-#else
-
-    unsigned const max_t_len = 128000;
-    if (t_len > max_t_len) {
-        fprintf(stderr, "t_len==%d > %d\n", t_len, max_t_len);
-        //abort();
-        return 0;
-    }
-    static msa_pos_t * msa_array = NULL;
-    if ( msa_array == NULL) {
-        msa_array = get_msa_working_sapce(max_t_len + 1);
-    }
-
-    assert(t_len <= max_t_len);
-
-#endif
+    msa_pos_t * msa_array;
+    reserve_msa_workspace(ws, t_len + 1);
+    msa_array = ws->msa_array;
 
 
     // loop through every alignment
@@ -481,6 +480,9 @@ consensus_data * get_cns_from_align_tags( align_tags_t ** tag_seqs,
         }
         if (g_best_score == -1) {
             fprintf(stderr, "In get_cns_from_align_tags(), g_best_score==-1\n");
+            clean_msa_working_space(msa_array, t_len+1);
+            free(coverage);
+            free(local_nbase);
             return 0;
         }
         assert(g_best_score != -1);
@@ -551,16 +553,7 @@ consensus_data * get_cns_from_align_tags( align_tags_t ** tag_seqs,
 
     cns_str[index] = 0;
     //printf("%s\n", cns_str);
-#ifndef STATIC_ALLOCATE
-    for (i = 0; i < t_len; i++) {
-        free_delta_group(msa_array[i]);
-        free(msa_array[i]);
-    }
-
-    free(msa_array);
-#else
     clean_msa_working_space(msa_array, t_len+1);
-#endif
 
     free(coverage);
     free(local_nbase);
@@ -574,6 +567,15 @@ consensus_data * generate_consensus( char ** input_seq,
                            unsigned min_cov,
                            unsigned K,
                            double min_idt) {
+    return generate_consensus_ws( get_default_msa_workspace(), input_seq, n_seq, min_cov, K, min_idt );
+}
+
+consensus_data * generate_consensus_ws( msa_workspace_t * ws,
+                           char ** input_seq,
+                           unsigned int n_seq,
+                           unsigned min_cov,
+                           unsigned K,
+                           double min_idt) {
     unsigned int j;
     unsigned int seq_count;
     unsigned int aligned_seq_count;
@@ -657,8 +659,7 @@ consensus_data * generate_consensus( char ** input_seq,
     }
 
     if (aligned_seq_count > 0) {
-        consensus = get_cns_from_align_tags( tags_list, aligned_seq_count, strlen(input_seq[0]), min_cov );
-        if (!consensus) return 0;
+        consensus = get_cns_from_align_tags( ws, tags_list, aligned_seq_count, strlen(input_seq[0]), min_cov );
     } else {
         // allocate an empty consensus sequence
         consensus = calloc( 1, sizeof(consensus_data) );
@@ -768,7 +769,7 @@ consensus_data * generate_utg_consensus( char ** input_seq,
     }
     free_aln_range(arange);
     if (aligned_seq_count > 0) {
-        consensus = get_cns_from_align_tags( tags_list, aligned_seq_count, utg_len, 0 );
+        consensus = get_cns_from_align_tags( get_default_msa_workspace(), tags_list, aligned_seq_count, utg_len, 0 );
         if (!consensus) return 0;
     } else {
         // allocate an empty consensus sequence
@@ -791,6 +792,82 @@ void free_consensus_data( consensus_data * consensus ){
     free(consensus);
 }
 
+/*
+ * Run generate_consensus() on many piles in one call.
+ *
+ * seq_buf holds every read of every pile, each NUL-terminated; seq_offsets
+ * gives the start of each read in seq_buf, pile by pile, and pile_n_seq
+ * the number of reads (seed first) in each pile. The consensus of pile i
+ * is sequence[offsets[i]:offsets[i+1]], with eqv in parallel. A pile that
+ * fails yields an empty consensus.
+ */
+consensus_batch_data * generate_consensus_batch( msa_workspace_t * ws,
+                                                 char * seq_buf,
+                                                 unsigned int * seq_offsets,
+                                                 unsigned int * pile_n_seq,
+                                                 unsigned int n_piles,
+                                                 unsigned min_cov,
+                                                 unsigned K,
+                                                 double min_idt) {
+    unsigned int i, j, k;
+    unsigned int n_seq, max_n_seq;
+    size_t size, capacity, len;
+    char ** input_seq;
+    consensus_data * consensus;
+    consensus_batch_data * batch;
+
+    max_n_seq = 0;
+    for (i = 0; i < n_piles; i++) {
+        if (pile_n_seq[i] > max_n_seq) max_n_seq = pile_n_seq[i];
+    }
+    input_seq = calloc( max_n_seq + 1, sizeof(char *) );
+
+    batch = calloc( 1, sizeof(consensus_batch_data) );
+    batch->n_piles = n_piles;
+    batch->offsets = calloc( n_piles + 1, sizeof(unsigned int) );
+    capacity = 1 << 16;
+    batch->sequence = calloc( capacity, sizeof(char) );
+    batch->eqv = calloc( capacity, sizeof(int) );
+
+    size = 0;
+    k = 0;
+    for (i = 0; i < n_piles; i++) {
+        batch->offsets[i] = size;
+        n_seq = pile_n_seq[i];
+        for (j = 0; j < n_seq; j++) {
+            input_seq[j] = seq_buf + seq_offsets[k + j];
+        }
+        k += n_seq;
+        if (n_seq == 0) continue;
+
+        consensus = generate_consensus_ws(ws, input_seq, n_seq, min_cov, K, min_idt);
+        if (!consensus) continue;
+
+        len = strlen(consensus->sequence);
+        if (size + len + 1 > capacity) {
+            while (size + len + 1 > capacity) capacity *= 2;
+            batch->sequence = realloc( batch->sequence, capacity * sizeof(char) );
+            batch->eqv = realloc( batch->eqv, capacity * sizeof(int) );
+        }
+        memcpy(batch->sequence + size, consensus->sequence, len * sizeof(char));
+        memcpy(batch->eqv + size, consensus->eqv, len * sizeof(int));
+        size += len;
+        free_consensus_data(consensus);
+    }
+    batch->offsets[n_piles] = size;
+    batch->sequence[size] = 0;
+
+    free(input_seq);
+    return batch;
+}
+
+void free_consensus_batch_data( consensus_batch_data * batch ){
+    free(batch->offsets);
+    free(batch->sequence);
+    free(batch->eqv);
+    free(batch);
+}
+
 /***
 void main() {
     unsigned int j;
@@ -0,0 +1,92 @@
+import falcon_kit.FastaReader as mod
+import gzip
+import io
+import pytest
+import random
+
+
+def random_fasta(seed=7, n_records=50):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_records):
+        lines.append('>read/{}/0_{} some metadata'.format(i, i))
+        seq = ''.join(rng.choice('ACGTacgt') for _ in range(rng.randint(1, 300)))
+        width = rng.choice((60, 80, len(seq)))
+        lines.extend(seq[start:start + width] for start in range(0, len(seq), width))
+    return '\n'.join(lines) + '\n'
+
+
+def old_records(fn):
+    with mod.open_fasta_reader(fn) as reader:
+        return [(r.name, r.sequence) for r in reader]
+
+
+def test_fasta_seqs_like_fasta_reader(tmpdir):
+    content = random_fasta()
+    fn = str(tmpdir.join('x.fasta'))
+    with open(fn, 'w') as stream:
+        stream.write(content)
+    expected = old_records(fn)
+    with mod.open_fasta_seqs(fn) as reader:
+        assert [tuple(r) for r in reader] == expected
+    with mod.open_fasta_seqs(fn, as_view=True) as reader:
+        assert [(r.name, bytes(r.sequence)) for r in reader] == expected
+    # Records across block boundaries, of every size.
+    for blocksize in (1, 7, 64, 1000):
+        got = mod.yield_fasta_seqs(io.BytesIO(content.encode('ascii')), fn, blocksize=blocksize)
+        assert [tuple(r) for r in got] == expected
+    gz_fn = fn + '.gz'
+    with gzip.open(gz_fn, 'wb') as stream:
+        stream.write(content.encode('ascii'))
+    with mod.open_fasta_seqs(gz_fn) as reader:
+        assert [tuple(r) for r in reader] == expected
+
+
+def test_fasta_seqs_edge_cases():
+    def records(content):
+        return [tuple(r) for r in mod.yield_fasta_seqs_from_buffer(content, 'x')]
+    assert records(b'') == []
+    assert records(b'>a\r\nAC\r\nGT\r\n>b\nTT') == [(b'a', b'ACGT'), (b'b', b'TT')]
+    assert records(b'>a\n\n>b\nT\n\n') == [(b'a', b''), (b'b', b'T')]
+    # Empty sequences, with no blank line.
+    assert records(b'>a\n>b\nACGT\n') == [(b'a', b''), (b'b', b'ACGT')]
+    assert records(b'>a\n>b\n') == [(b'a', b''), (b'b', b'')]
+    assert records(b'>a\n') == [(b'a', b'')]
+    assert records(b'>a') == [(b'a', b'')]
+    with pytest.raises(Exception):
+        records(b'AC\n>a\nAC\n')
+
+
+def test_fasta_seqs_empty_sequence(tmpdir):
+    content = '>a\n>b\nACGT\n>c\n>d\nAC\nGT\n>e\n'
+    expected = [('a', ''), ('b', 'ACGT'), ('c', ''), ('d', 'ACGT'), ('e', '')]
+    fn = str(tmpdir.join('x.fasta'))
+    with open(fn, 'w') as stream:
+        stream.write(content)
+    with mod.open_fasta_seqs(fn) as reader:
+        assert [tuple(r) for r in reader] == expected
+    for blocksize in (1, 3, 1000):
+        got = mod.yield_fasta_seqs(io.BytesIO(content.encode('ascii')), fn, blocksize=blocksize)
+        assert [tuple(r) for r in got] == expected
+    assert mod.fasta_lengths(fn).tolist() == [len(seq) for (name, seq) in expected]
+
+
+def test_fasta_lengths(tmpdir):
+    content = random_fasta()
+    fn = str(tmpdir.join('x.fasta'))
+    with open(fn, 'w') as stream:
+        stream.write(content)
+    expected = old_records(fn)
+    assert mod.fasta_lengths(fn).tolist() == [len(seq) for (name, seq) in expected]
+    # Lines across block boundaries.
+    names, lens = mod.fasta_names_and_lengths(fn, blocksize=7)
+    assert list(zip(names, lens.tolist())) == [(name.split()[0], len(seq)) for (name, seq) in expected]
+    gz_fn = fn + '.gz'
+    with gzip.open(gz_fn, 'wb') as stream:
+        stream.write(content.replace('\n', '\r\n').encode('ascii'))
+    assert mod.fasta_lengths(gz_fn, blocksize=64).tolist() == [len(seq) for (name, seq) in expected]
+    bad_fn = tmpdir.join('bad.fa')
+    bad_fn.write('AC\n>a\nAC\n')
+    with pytest.raises(Exception) as excinfo:
+        mod.fasta_lengths(str(bad_fn))
+    assert 'Invalid FASTA' in str(excinfo.value)
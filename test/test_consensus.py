@@ -1,5 +1,7 @@
 
+from ctypes import c_char_p, string_at
 import falcon_kit.mains.consensus as mod
+import random
 
 
 def test_help():
@@ -7,3 +9,124 @@ def test_help():
         mod.main(['prog', '--help'])
     except SystemExit:
         pass
+
+
+def test_get_alignment_reuses_seed_index():
+    rng = random.Random(7)
+    seeds = [''.join(rng.choice('ACGT') for _ in range(3000)) for _ in range(2)]
+    reads = [seeds[0][500:2800], seeds[0][:1200], seeds[1][100:2000], 'ACGT' * 300]
+    index = mod.get_kmer_index()
+    for seed in seeds:
+        index.index(seed)
+        for read in reads:
+            expected = mod.get_alignment(read, seed, 1000)
+            assert expected == mod.get_alignment(read, seed, 1000, index)
+    index.index(seeds[0])
+    assert mod.get_alignment(reads[0], seeds[0], 1000, index)[-1] == 'aln'
+    assert mod.get_alignment(reads[2], seeds[0], 1000, index)[-1] == 'none'
+
+
+# min_cov, K, max_n_read, min_idt, edge_tolerance, trim_size, min_cov_aln, max_cov_aln
+CONFIG = (2, 8, 500, 0.7, 1000, 50, 0, 0)
+
+
+def random_seq(rng, n):
+    return ''.join(rng.choice('ACGT') for _ in range(n))
+
+
+def noisy(rng, seq, rate=0.03):
+    return ''.join(rng.choice('ACGT') if rng.random() < rate else base for base in seq)
+
+
+def random_pile(rng, seed_len, n_reads=8, read_len=1500):
+    """Return a seed and noisy copies of parts of it, seed first.
+    """
+    seed = random_seq(rng, seed_len)
+    reads = []
+    for _ in range(n_reads):
+        start = rng.randint(0, max(0, seed_len - read_len))
+        reads.append(noisy(rng, seed[start:start + read_len]))
+    return [seed] + reads
+
+
+def test_consensus_batch_like_one_pile_at_a_time():
+    """The batch path gives the same consensus as the per-pile path, with
+    and without trimming, including for a pile with no consensus (no read
+    aligns to its seed).
+    """
+    rng = random.Random(5)
+    piles = [random_pile(rng, n) for n in (2500, 4000, 1800)]
+    piles.insert(1, [random_seq(rng, 2000) for _ in range(5)])
+    c_inputs = [(seqs, '{:09d}'.format(i), CONFIG) for (i, seqs) in enumerate(piles)]
+    for (get_one, get_batch) in [
+            (mod.get_consensus_without_trim, mod.get_consensus_batch_without_trim),
+            (mod.get_consensus_with_trim, mod.get_consensus_batch_with_trim)]:
+        expected = [get_one(c_input) for c_input in c_inputs]
+        assert expected[1] == ('', '000000001')
+        assert all(len(cns) > 1000 for (cns, seed_id) in expected[:1] + expected[2:])
+        assert get_batch(c_inputs) == expected
+        assert get_batch(c_inputs[1:2]) == expected[1:2]
+
+
+def consensus_in(ws, seqs, config=CONFIG):
+    """Return the consensus of 'seqs' (seed first), using workspace 'ws'.
+    """
+    min_cov, K, max_n_read, min_idt = config[:4]
+    seqs_ptr = (c_char_p * len(seqs))()
+    seqs_ptr[:] = seqs
+    consensus_data_ptr = mod.falcon.generate_consensus_ws(
+        ws.ptr, seqs_ptr, len(seqs), min_cov, K, min_idt)
+    consensus = string_at(consensus_data_ptr[0].sequence)[:]
+    mod.falcon.free_consensus_data(consensus_data_ptr)
+    return consensus
+
+
+def test_consensus_seed_over_128kb():
+    """Seeds used to be limited by fixed 128 kb buffers.
+    """
+    rng = random.Random(3)
+    seed = random_seq(rng, 140000)
+    reads = [noisy(rng, seed[start:start + 3000])
+             for start in range(120000, 137000, 1000) for _ in range(3)]
+    consensus, seed_id = mod.get_consensus_without_trim(([seed] + reads, 'big', CONFIG))
+    assert len(consensus) > 15000
+    assert seed[131072 - 500:131072 + 500] in consensus
+
+
+def test_get_seq_data_seed_over_128kb(tmpdir, monkeypatch):
+    """Seeds and reads read from stdin are not cut to 128 kb, unless --max-len asks.
+    """
+    rng = random.Random(3)
+    seed = random_seq(rng, 140000)
+    reads = [noisy(rng, seed[start:start + 3000])
+             for start in range(120000, 137000, 1000) for _ in range(3)]
+    fn = str(tmpdir.join('piles'))
+    with open(fn, 'w') as f:
+        f.write('big %s\n' % seed)
+        for (i, read) in enumerate(reads):
+            f.write('%d %s\n' % (i, read))
+        f.write('+ +\n- -\n')
+    monkeypatch.setattr('sys.stdin', open(fn))
+    (pile, ) = list(mod.get_seq_data(CONFIG, 10, 0))
+    assert pile[1] == 'big'
+    assert len(pile[0][0]) == 140000
+    consensus, seed_id = mod.get_consensus_without_trim(pile)
+    assert seed[131072 - 500:131072 + 500] in consensus
+
+    monkeypatch.setattr('sys.stdin', open(fn))
+    (pile, ) = list(mod.get_seq_data(CONFIG, 10, 0, max_len=130000))
+    assert len(pile[0][0]) == 130000
+    assert max(len(seq) for seq in pile[0]) == 130000
+
+
+def test_msa_workspace_reuse():
+    """A workspace reused across piles of growing and shrinking seeds gives
+    what a fresh one does.
+    """
+    rng = random.Random(9)
+    piles = [random_pile(rng, n) for n in (5000, 1500, 12000, 3000, 12000)]
+    ws = mod.falcon_kit.MsaWorkspace()
+    for seqs in piles:
+        expected = consensus_in(mod.falcon_kit.MsaWorkspace(), seqs)
+        assert len(expected) > 1000
+        assert consensus_in(ws, seqs) == expected
@@ -4,6 +4,9 @@ import pytest
 import os
 from falcon_kit.FastaReader import open_fasta_reader
 import cStringIO
+import contextlib
+import itertools
+import random
 
 def test_help():
     try:
@@ -360,6 +363,87 @@ def test_run_internal_median_filter_8(tmpdir):
     check_run(mod.run_internal_median_filter, fasta_tests[7], expected_internal_median_tests[7], str(in_fa_file))
 
 
+##########################################
+### Test the memory-bounded filters.   ###
+##########################################
+def check_bounded_run(func, fasta, expected, tmpdir):
+    in_fa_file = tmpdir.join('in.fa')
+    in_fa_file.write(fasta)
+    check_run(func, fasta, expected, str(in_fa_file))
+
+@pytest.mark.parametrize('i', [1, 2, 3, 4, 6])
+def test_run_bounded_median_filter(i, tmpdir):
+    check_bounded_run(mod.run_bounded_median_filter, fasta_tests[i], expected_tests[i], tmpdir)
+    check_bounded_run(mod.run_bounded_internal_median_filter, fasta_tests[i], expected_tests[i], tmpdir)
+
+def test_run_bounded_median_filter_internal(tmpdir):
+    check_bounded_run(mod.run_bounded_median_filter, fasta_tests[7], expected_general_median_tests[7], tmpdir)
+    check_bounded_run(mod.run_bounded_internal_median_filter, fasta_tests[7], expected_internal_median_tests[7], tmpdir)
+
+def test_run_bounded_median_filter_raises(tmpdir):
+    check_run_raises(mod.run_bounded_median_filter, fasta_tests[5], '-')
+    in_fa_file = tmpdir.join('in.fa')
+    in_fa_file.write(fasta_tests[5])
+    check_run_raises(mod.run_bounded_median_filter, fasta_tests[5], str(in_fa_file))
+
+def random_subreads(rng, n_zmws):
+    """Return FASTA text of subreads from 2 movies, in no particular ZMW
+    order, with many ties in length and position.
+    """
+    records = []
+    for zmw in range(n_zmws):
+        movie = rng.choice(['m1', 'm2'])
+        for _ in range(rng.randint(1, 9)):
+            start = rng.randint(0, 5) * 100
+            seq = 'A' * rng.randint(1, 12)
+            records.append('>{}/{}/{}_{} x\n{}\n'.format(movie, zmw, start, start + len(seq), seq))
+    rng.shuffle(records)
+    return ''.join(records)
+
+def test_select_subreads_like_median_filter(tmpdir):
+    """The same picks as run_median_filter() (which keys ZMWs by zmw_id
+    alone, so each zmw_id is in one movie here), with or without spilling
+    to sorted runs.
+    """
+    rng = random.Random(7)
+    fasta = random_subreads(rng, 300)
+    in_fa_file = tmpdir.join('in.fa')
+    in_fa_file.write(fasta)
+    fn = str(in_fa_file)
+    names = [line for line in fasta.splitlines() if line.startswith('>')]
+    for (filter_func, select_func) in [
+            (mod.run_median_filter, mod.select_median_subreads),
+            (mod.run_internal_median_filter, mod.select_internal_median_subreads)]:
+        fp_out = cStringIO.StringIO()
+        filter_func(cStringIO.StringIO(fasta), fp_out, fn)
+        expected = [line for line in fp_out.getvalue().splitlines() if line.startswith('>')]
+        for (max_rows, blocksize) in [(None, 1 << 20), (50, 256), (1, 64)]:
+            got, n_subreads = mod.select_subreads(fn, select_func, max_rows=max_rows, blocksize=blocksize)
+            assert n_subreads == len(names)
+            assert [names[i] for i in got] == expected
+
+def test_run_bounded_median_filter_empty_subread(tmpdir):
+    fasta = '>m/1/0_0\n>m/1/5_9\nACGT\n>m/2/0_3\nAAA\n'
+    check_bounded_run(mod.run_bounded_median_filter, fasta, '>m/1/5_9\nACGT\n>m/2/0_3\nAAA\n', tmpdir)
+
+def test_run_bounded_median_filter_counts_records(tmpdir, monkeypatch):
+    """The picks are by position, so the second pass must see as many
+    records as the first.
+    """
+    in_fa_file = tmpdir.join('in.fa')
+    in_fa_file.write(fasta_tests[7])
+    open_fasta_seqs = mod.FastaReader.open_fasta_seqs
+
+    @contextlib.contextmanager
+    def open_fewer_seqs(fn, **kwds):
+        with open_fasta_seqs(fn, **kwds) as records:
+            yield itertools.islice(records, 1, None)
+    monkeypatch.setattr(mod.FastaReader, 'open_fasta_seqs', open_fewer_seqs)
+    with pytest.raises(Exception) as excinfo:
+        mod.run_bounded_median_filter(None, cStringIO.StringIO(), str(in_fa_file))
+    assert 'in the first pass' in str(excinfo.value)
+
+
 ###############################
 ### Test the main commands. ###
 ###############################
@@ -392,3 +476,10 @@ def test_main_cmd_streamed_internal_median_2(tmpdir, capsys):
     in_fa_file = tmpdir.join('in.fa')
     check_main_from_file('streamed-internal-median', fasta_tests[4], expected_tests[4], in_fa_file, capsys)
 
+def test_main_cmd_bounded_median_1(tmpdir, capsys):
+    in_fa_file = tmpdir.join('in.fa')
+    check_main_from_file('bounded-median', fasta_tests[4], expected_tests[4], in_fa_file, capsys)
+
+def test_main_cmd_bounded_internal_median_1(tmpdir, capsys):
+    in_fa_file = tmpdir.join('in.fa')
+    check_main_from_file('bounded-internal-median', fasta_tests[7], expected_internal_median_tests[7], in_fa_file, capsys)
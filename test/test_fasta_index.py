@@ -0,0 +1,86 @@
+import falcon_kit.fasta_index as mod
+import falcon_kit.mains.fasta_index as main_mod
+from falcon_kit.FastaReader import open_fasta_reader
+import os
+import pytest
+import random
+
+FASTA = """\
+>a some description
+ACGTA
+CGTTT
+AC
+>b
+GGGcc
+>c
+"""
+
+
+def write_random_fasta(fn, seed=3):
+    rng = random.Random(seed)
+    with open(fn, 'w') as f:
+        for i in range(30):
+            seq = ''.join(rng.choice('ACGTacgt') for _ in range(rng.randint(1, 200)))
+            width = rng.choice((7, 60, len(seq)))
+            f.write('>{:09d} x\n'.format(i))
+            for pos in range(0, len(seq), width):
+                f.write(seq[pos:pos + width] + '\n')
+
+
+def test_fai(tmpdir):
+    fn = str(tmpdir.join('x.fa'))
+    with open(fn, 'w') as f:
+        f.write(FASTA)
+    main_mod.main(['prog', fn])
+    # As written by 'samtools faidx'.
+    assert open(fn + '.fai').read() == 'a\t12\t20\t5\t6\nb\t5\t38\t5\t6\nc\t0\t47\t0\t0\n'
+    with mod.IndexedFasta(fn) as fasta:
+        assert fasta.names() == ['a', 'b', 'c']
+        assert fasta['a'] == 'ACGTACGTTTAC'
+        assert fasta.fetch('a', 3, 11) == 'TACGTTTA'
+        assert fasta.fetch('a', 4, 5) == 'A'
+        assert fasta.fetch('a', 10) == 'AC'
+        assert fasta.fetch('b', 1, 4, reverse_complement=True) == 'gCC'
+        assert fasta['c'] == ''
+        assert 'd' not in fasta
+        with pytest.raises(KeyError):
+            fasta['d']
+    with mod.IndexedFasta(fn, names=set(['b'])) as fasta:
+        assert fasta.names() == ['b']
+
+
+def test_fetch_like_fasta_reader(tmpdir):
+    fn = str(tmpdir.join('x.fa'))
+    write_random_fasta(fn)
+    with open_fasta_reader(fn) as reader:
+        expected = [(r.id, r.sequence) for r in reader]
+    # In memory, then from the .fai.
+    for write in (False, True):
+        if write:
+            mod.write_index(fn)
+        with mod.IndexedFasta(fn) as fasta:
+            assert [(name, fasta[name]) for name in fasta.names()] == expected
+            for (name, seq) in expected:
+                assert fasta.fetch(name, 5, 150) == seq[5:150]
+
+
+def test_stale_fai(tmpdir):
+    fn = str(tmpdir.join('x.fa'))
+    with open(fn, 'w') as f:
+        f.write(FASTA)
+    mod.write_fai([mod.FaiEntry('z', 1, 0, 1, 2)], mod.fai_fn(fn))
+    mtime = os.path.getmtime(fn)
+    os.utime(mod.fai_fn(fn), (mtime - 10, mtime - 10))
+    with mod.IndexedFasta(fn) as fasta:
+        assert fasta.names() == ['a', 'b', 'c']
+    # The .fai of the target of a symlink will do.
+    mod.write_index(fn)
+    link_fn = str(tmpdir.join('link.fa'))
+    os.symlink(fn, link_fn)
+    assert mod.load_index(link_fn) == mod.read_fai(mod.fai_fn(fn))
+
+
+def test_bad_lines():
+    with pytest.raises(Exception):
+        list(mod.index_buffer(b'>a\nACG\nA\nACG\n', 'x'))
+    assert list(mod.index_buffer(b'>a\r\nACG\r\nA\r\n', 'x')) == [mod.FaiEntry('a', 4, 4, 3, 5)]
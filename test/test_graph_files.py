@@ -0,0 +1,66 @@
+import falcon_kit.graph_files as mod
+from falcon_kit.fc_asm_graph import AsmGraph
+import helpers
+import os
+import shutil
+
+
+def copy_gfa_data(tmpdir):
+    data_dir = os.path.join(helpers.get_test_data_dir(), 'gfa-1')
+    fns = []
+    for fn in ('sg_edges_list', 'utg_data', 'ctg_paths'):
+        shutil.copy(os.path.join(data_dir, fn), str(tmpdir))
+        fns.append(str(tmpdir.join(fn)))
+    return fns
+
+
+def test_sidecar_rows(tmpdir):
+    sg_fn, utg_fn, ctg_fn = copy_gfa_data(tmpdir)
+    for (fn, schema) in ((sg_fn, mod.SG_EDGES), (utg_fn, mod.UTG_DATA), (ctg_fn, mod.CTG_PATHS)):
+        expected = list(mod.iter_rows(fn, schema))
+        mod.write_sidecar(fn, schema)
+        assert mod.load_table(fn, schema) is not None
+        assert list(mod.iter_rows(fn, schema)) == expected
+    assert list(mod.iter_rows(sg_fn, mod.SG_EDGES))[0] == (
+        '000000007:B', '000000005:B', '000000005', 9, 0, 1980, 99.95, 'G')
+    assert list(mod.iter_rows(utg_fn, mod.UTG_DATA, types=('simple',)))[0][-1] == \
+        '000000007:B~000000005:B~000000016:B~000000025:B~000000018:B~000000004:B'
+    assert mod.layout_reads(sg_fn) == set(
+        '%09d' % i for i in (4, 5, 7, 16, 18, 25, 27))
+
+
+def test_compound_path():
+    builder = mod.TableBuilder(mod.UTG_DATA)
+    row = ('1:B', 'NA', '4:B', 'compound', 100, 200, '1:B~2:B~4:B|1:B~3:B~4:B')
+    builder.add(row)
+    builder.add(('1:B', '2:B', '4:B', 'simple', 50, 100, '1:B~2:B~4:B'))
+    table = builder.table()
+    assert len(table.strings) == 7
+    assert list(table.rows(table.mask(['compound']))) == [row]
+
+
+def test_stale_sidecar(tmpdir):
+    sg_fn, utg_fn, ctg_fn = copy_gfa_data(tmpdir)
+    mod.write_sidecar(sg_fn, mod.SG_EDGES)
+    records_fn = os.path.join(mod.sidecar_dir(sg_fn), 'records.npy')
+    mtime = os.path.getmtime(sg_fn)
+    os.utime(records_fn, (mtime - 10, mtime - 10))
+    assert mod.load_table(sg_fn, mod.SG_EDGES) is None
+    # The schema must match, too.
+    os.utime(records_fn, (mtime + 10, mtime + 10))
+    assert mod.load_table(sg_fn, mod.UTG_DATA) is None
+
+
+def test_asm_graph(tmpdir):
+    fns = copy_gfa_data(tmpdir)
+    expected = AsmGraph(*fns)
+    for (fn, schema) in zip(fns, (mod.SG_EDGES, mod.UTG_DATA, mod.CTG_PATHS)):
+        mod.write_sidecar(fn, schema)
+        with open(fn, 'w'):
+            pass  # so that only the sidecar has the data
+        os.utime(os.path.join(mod.sidecar_dir(fn), 'records.npy'), None)
+    got = AsmGraph(*fns)
+    helpers.equal_dict(expected.sg_edges, got.sg_edges)
+    helpers.equal_dict(expected.utg_data, got.utg_data)
+    helpers.equal_dict(expected.ctg_data, got.ctg_data)
+    helpers.equal_dict(expected.node_to_ctg, got.node_to_ctg)
@@ -1,5 +1,7 @@
 
 import falcon_kit.mains.graph_to_contig as mod
+import helpers
+import os
 
 '''
 def test_help():
@@ -8,3 +10,38 @@ def test_help():
     except SystemExit:
         pass
 '''
+
+
+def test_mmap_preads(tmpdir, monkeypatch):
+    """Fetching edge sequences from the memory-mapped reads gives the same contigs.
+    """
+    data_dir = os.path.join(helpers.get_test_data_dir(), 'gfa-1')
+    outputs = []
+    for mmap_preads in (False, True):
+        run_dir = tmpdir.mkdir('mmap' if mmap_preads else 'dict')
+        monkeypatch.chdir(run_dir)
+        mod.run(improper_p_ctg=False, proper_a_ctg=False,
+                preads_fasta_fn=os.path.join(data_dir, 'preads4falcon.fasta'),
+                sg_edges_list_fn=os.path.join(data_dir, 'sg_edges_list'),
+                utg_data_fn=os.path.join(data_dir, 'utg_data'),
+                ctg_paths_fn=os.path.join(data_dir, 'ctg_paths'),
+                mmap_preads=mmap_preads)
+        outputs.append([run_dir.join(fn).read() for fn in ('p_ctg.fa', 'p_ctg_tiling_path')])
+    assert outputs[0][0].startswith('>0 ')
+    assert outputs[0] == outputs[1]
+
+
+def test_layout_reads_edge_seq(tmpdir):
+    """An edge cut from the memory-mapped reads is the one cut from the whole read.
+    """
+    seq = 'ACGTTGCAaacgtNNacgGTTACCAGT' * 5
+    fn = str(tmpdir.join('preads.fasta'))
+    with open(fn, 'w') as f:
+        f.write('>000000001\n')
+        for i in range(0, len(seq), 20):
+            f.write(seq[i:i + 20] + '\n')
+    seqs = mod.LayoutReads(fn, set(['000000001']))
+    reads = {'000000001': seq.upper()}
+    for (s, t) in ((0, len(seq)), (7, 61), (61, 7), (len(seq), 19), (33, 34)):
+        assert seqs.edge_seq('000000001', s, t) == mod.edge_seq(reads, '000000001', s, t)
+    seqs.close()
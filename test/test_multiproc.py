@@ -0,0 +1,29 @@
+import falcon_kit.multiproc as mod
+
+
+def square(x):
+    return x * x
+
+
+def test_bounded_imap_fake():
+    pool = mod.Pool(0)
+    got = list(mod.bounded_imap(pool, square, iter(range(10)), 3))
+    assert [x * x for x in range(10)] == got
+
+
+def test_bounded_imap_in_order():
+    pool = mod.Pool(2)
+    try:
+        got = list(mod.bounded_imap(pool, square, iter(range(100)), 4))
+    finally:
+        pool.terminate()
+    assert [x * x for x in range(100)] == got
+
+
+def test_bounded_imap_threads():
+    pool = mod.ThreadPool(3)
+    try:
+        got = list(mod.bounded_imap(pool, square, iter(range(100)), 4))
+    finally:
+        pool.terminate()
+    assert [x * x for x in range(100)] == got
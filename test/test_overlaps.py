@@ -0,0 +1,76 @@
+import falcon_kit.overlaps as mod
+import pytest
+
+
+data = """\
+000000000 000000001 -1807 100.00 0 181 1988 1988 0 0 1807 1989 overlap
+000000000 000000002 -823 99.88 0 0 823 1988 0 1166 1989 1989 contains
+000000001 000000000 -1807 100.00 0 0 1807 1989 0 181 1988 1988 overlap
+000000002 000000000 -823 99.9 1 1166 1989 1989 0 0 823 1988 contained
+000000002 000000001 -642 89.99 0 1347 1989 1989 0 0 642 1989 none
+"""
+
+
+def check_records(recs):
+    assert [0, 0, 1, 2, 2] == list(recs['q_id'])
+    assert [1, 2, 0, 0, 1] == list(recs['t_id'])
+    assert [-1807, -823, -1807, -823, -642] == list(recs['score'])
+    assert [100.0, 99.88, 100.0, 99.9, 89.99] == pytest.approx(list(recs['idt']))
+    assert [0, 0, 0, 1, 0] == list(recs['q_strand'])
+    assert [1988, 1988, 1989, 1989, 1989] == list(recs['q_l'])
+    assert [1989, 1989, 1988, 1988, 1989] == list(recs['t_l'])
+    assert ['overlap', 'contains', 'overlap', 'contained', 'none'] == \
+        [mod.OVLP_TYPES[t] for t in recs['type']]
+
+
+def test_parse_lines():
+    check_records(mod.parse_lines(data.splitlines()))
+
+
+def test_parse_lines_without_fraction():
+    # Falls back to parsing every field as a float.
+    lines = [l.replace('100.00', '100') for l in data.splitlines()]
+    check_records(mod.parse_lines(lines))
+
+
+def test_parse_lines_empty():
+    assert 0 == len(mod.parse_lines([]))
+
+
+def test_parse_lines_bad():
+    with pytest.raises(ValueError):
+        mod.parse_lines(['000000000 000000001 -1807 100.00 0 181 1988 overlap'])
+
+
+def test_iter_chunks():
+    lines = data.splitlines()
+    for chunk_size in (1, 2, 100):
+        chunks = list(mod.iter_chunks(lambda: iter(lines), chunk_size))
+        assert lines == sum((c[0] for c in chunks), [])
+        q_ids = [list(c[1]['q_id']) for c in chunks]
+        assert [0, 0, 1, 2, 2] == sum(q_ids, [])
+        # No query is split across chunks.
+        assert 3 == sum(len(set(ids)) for ids in q_ids)
+
+
+def test_runs():
+    import numpy as np
+    ids = np.array([3, 3, 1, 1, 1, 3])
+    starts = mod.run_starts(ids)
+    assert [0, 2, 5] == list(starts)
+    assert [2, 3, 1] == list(mod.run_sizes(starts, len(ids)))
+    assert [0, 1, 0, 1, 2, 0] == list(mod.run_offsets(starts, len(ids)))
+    assert [0, 3, 0] == list(mod.run_sums(ids == 1, starts))
+    assert [] == list(mod.run_starts(ids[:0]))
+
+
+def test_id_bitmap():
+    ids = mod.IdBitmap(['000000003', '000000001', '000000016'])
+    assert [True, False, True, False, True, False] == \
+        list(ids.contains([1, 2, 3, 4, 16, 17]))
+    assert 3 in ids and 2 not in ids and 1000 not in ids and -1 not in ids
+    assert [1, 3, 16] == list(ids.ids())
+    assert [1, 3, 7, 16] == list((ids | mod.IdBitmap([7])).ids())
+    assert [False] == list(mod.IdBitmap().contains([1]))
+    assert 0 == len(mod.IdBitmap())
+    assert ids is mod.id_bitmap(ids)
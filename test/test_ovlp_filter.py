@@ -72,3 +72,49 @@ def test_empty():
     max_diff, max_ovlp, min_ovlp, min_len = 1000, 1000, 1, 1
     got = mod.filter_stage1(readlines, max_diff, max_ovlp, min_ovlp, min_len)
     assert_equal(expected, got)
+
+
+def test_cached_records_match_text(tmpdir):
+    data = """\
+000000000 000000001 -1807 100.00 0 181 1988 1988 0 0 1807 1989 overlap
+000000000 000000002 -823 99.88 0 0 823 1988 0 1166 1989 1989 overlap
+000000000 000000017 -823 98.36 0 0 823 1988 0 1166 1989 1989 overlap
+000000001 000000000 -1807 100.00 0 0 1807 1989 0 181 1988 1988 overlap
+000000001 000000002 -642 99.84 0 0 642 1989 0 1347 1989 1989 overlap
+000000002 000000000 -823 99.88 0 1166 1989 1989 0 0 823 1988 overlap
+000000002 000000001 -642 99.84 0 1347 1989 1989 0 0 642 1989 overlap
+000000017 000000000 -823 98.36 0 1166 1989 1989 0 0 823 1988 overlap
+000000017 000000028 -1952 99.95 0 0 1952 1989 0 0 1952 1988 contains
+"""
+    readlines = data.strip().splitlines
+    writer = mod.CacheWriter(str(tmpdir.join('cache')))
+    args = (1000, 1000, 1, 1)
+    ignore = mod.filter_stage1(lambda: writer.tee(readlines), *args)
+    assert writer.ok
+    assert_equal(9, writer.id_width)
+    contained = mod.filter_stage2(readlines, *(args + (ignore,)))
+    assert_equal(['000000028'], sorted(contained))
+    ignore_ids = mod.overlaps.IdBitmap(ignore)
+    contained_ids = mod.filter_stage2_records(mod.read_cache(writer.cache_fn), *(args + (ignore_ids,)))
+    assert_equal([28], list(contained_ids.ids()))
+    expected = mod.filter_stage3(readlines, *(args + (ignore, contained, 1)))
+    got = mod.filter_stage3_records(mod.read_cache(writer.cache_fn), 9, *(args + (ignore_ids, contained_ids, 1)))
+    assert_equal(expected, got)
+
+
+def test_stage3_pruning(monkeypatch):
+    """A read with many long-m_range overlaps is pruned before sorting,
+    with the same result.
+    """
+    lines = []
+    for i in range(600):
+        t_s = (i * 37) % 3000  # m_range > 1000 for most
+        ovlp_len = 2000 + (i * 53) % 1000
+        lines.append('000000000 %09d %d 99.00 0 0 %d 5000 0 %d %d 8000 overlap' % (
+            i + 1, -ovlp_len, ovlp_len, t_s, t_s + ovlp_len))
+    args = (1000, 1000, 1, 1, set(), set(), 5)
+    got = mod.filter_stage3(lambda: lines, *args)
+    monkeypatch.setattr(mod, 'BOUNDED_MIN_OVLPS', len(lines))
+    expected = mod.filter_stage3(lambda: lines, *args)
+    assert_equal(expected, got)
+    assert len(got) < 20
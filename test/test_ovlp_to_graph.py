@@ -1,6 +1,7 @@
 
 import falcon_kit.mains.ovlp_to_graph as mod
 import pytest
+import sys
 
 
 def test_help():
@@ -38,3 +39,240 @@ def test_reverse_end():
 
     with pytest.raises(Exception) as e_info:
         ret = mod.reverse_end(':::')
+
+
+def test_string_graph_tr():
+    """0:E->2:E is transitive, given 0:E->1:E->2:E.
+    """
+    sg = mod.StringGraph()
+    r = [sg.add_read('%09d' % i) for i in range(3)]
+    def add(v, w, length):
+        sg.add_edge(2 * v + 1, 2 * w + 1, label=(w, 0, length), length=length, score=-5000, identity=99.0)
+        sg.add_edge(2 * w, 2 * v, label=(v, length, 0), length=length, score=-5000, identity=99.0)
+    add(r[0], r[1], 1000)
+    add(r[1], r[2], 1000)
+    add(r[0], r[2], 2000)
+    sg.freeze()
+    assert list(sg.rev) == [1, 0, 3, 2, 5, 4]
+    assert sg.node_name(1) == '000000000:E'
+    sg.mark_tr_edges()
+    reduced = [(sg.node_name(v), sg.node_name(w)) for (v, w) in zip(sg.src[sg.e_reduce], sg.dst[sg.e_reduce])]
+    assert reduced == [('000000000:E', '000000002:E'), ('000000002:B', '000000000:B')]
+    sg.mark_best_overlap()
+    assert sg.node_name(sg.best_out[1]) == '000000001:E'
+
+
+def test_read_overlaps(tmpdir):
+    """Contained reads are collected, and each pair of reads gives two edges once.
+    """
+    data = """\
+000000001 000000002 -4000 99.50 0 1000 5000 5000 0 0 4000 6000 overlap
+000000002 000000001 -4000 99.50 0 0 4000 6000 0 1000 5000 5000 overlap
+000000001 000000003 -3000 99.00 0 2000 5000 5000 1 1000 4000 7000 overlap
+000000003 000000004 -2000 99.00 0 0 2000 7000 0 0 2000 2000 contains
+-
+"""
+    fn = str(tmpdir.join('preads.ovl'))
+    with open(fn, 'w') as f:
+        f.write(data)
+    ovlps, contained, names = mod.read_overlaps(fn, 2500, 96.0)
+    assert list(contained.ids()) == [4]
+    assert names == {1: '000000001', 2: '000000002', 3: '000000003'}
+    ovlps = ovlps[mod.first_of_pairs(ovlps)]
+    assert len(ovlps) == 2
+    edges = mod.overlap_edges(ovlps, ovlps['q_id'] - 1, ovlps['t_id'] - 1)
+    assert [list(col) for col in edges[:6]] == [
+        [2, 1, 5, 1],  # src
+        [0, 3, 0, 4],  # dst
+        [0, 1, 0, 2],  # rid
+        [1000, 4000, 2000, 1000],  # sp
+        [0, 6000, 0, 0],  # tp
+        [1000, 2000, 2000, 1000],  # length
+    ]
+
+
+def test_string_graph_frozen():
+    """Out-edges are sorted by length once frozen; adding an edge unfreezes.
+    """
+    sg = mod.StringGraph()
+    r = [sg.add_read('%09d' % i) for i in range(4)]
+    for (w, length) in ((1, 3000), (2, 1000), (3, 2000)):
+        sg.add_edge(1, 2 * w + 1, label=(w, 0, length), length=length, score=-length, identity=99.0)
+    sg.freeze()
+    assert list(sg.length[sg.out_edges_of(1)]) == [1000, 2000, 3000]
+    sg.mark_best_overlap()
+    assert list(sg.length[sg.out_edges_of(1)]) == [1000, 2000, 3000]
+    sg.add_edge(1, 5, label=(2, 0, 500), length=500, score=-500, identity=99.0)
+    assert not sg.frozen
+    with pytest.raises(Exception):
+        sg.mark_tr_edges()
+    sg.freeze()
+    assert list(sg.length[sg.out_edges_of(1)]) == [500, 2000, 3000]
+
+
+def test_mark_tr_edges_parallel():
+    """Shards reduced by worker processes give the same edges, and their reverses.
+    """
+    import random
+    rng = random.Random(7)
+    sg = mod.StringGraph()
+    r = [sg.add_read('%09d' % i) for i in range(60)]
+    for i in range(len(r)):
+        for j in range(i + 1, min(i + 6, len(r))):
+            length = 100 * (j - i) + rng.randint(0, 50)
+            sg.add_edge(2 * r[i] + 1, 2 * r[j] + 1, label=(r[j], 0, length), length=length, score=-length, identity=99.0)
+            sg.add_edge(2 * r[j], 2 * r[i], label=(r[i], length, 0), length=length, score=-length, identity=99.0)
+    sg.freeze()
+    sg.mark_tr_edges()
+    expected = list(sg.e_reduce)
+    assert any(expected)
+    sg.e_reduce[:] = False
+    sg.mark_tr_edges(n_core=2)
+    assert list(sg.e_reduce) == expected
+    assert all(sg.e_reduce[sg.rev[sg.e_reduce]])
+    assert len(mod.node_shards(sg.nodes, sg.out_ptr, 8)) == 8
+
+
+def test_string_graph_dict_order():
+    """Nodes are visited, and edges written, in the order of the old dict-based StringGraph.
+
+    That is the insertion order on Python 3, and the hash order on Python 2;
+    spur removal and the assembly depend on it.
+    """
+    sg = mod.StringGraph()
+    r = [sg.add_read('%09d' % i) for i in range(40)]
+    old_nodes = {}
+    old_edges = {}
+    for i in range(len(r)):
+        for j in range(i + 1, min(i + 4, len(r))):
+            for (v, w) in ((2 * r[i] + 1, 2 * r[j] + 1), (2 * r[j], 2 * r[i])):
+                sg.add_edge(v, w, label=(r[j], 0, 1000), length=1000, score=-1000, identity=99.0)
+                (v, w) = (sg.node_name(v), sg.node_name(w))
+                old_nodes[v] = old_nodes[w] = None
+                old_edges[(v, w)] = None
+    sg.freeze()
+    assert [sg.node_name(n) for n in sg.nodes] == list(old_nodes)
+    names = [sg.node_name(n) for n in range(sg.n_nodes)]
+    order = sg.edge_order(names)
+    assert [(names[v], names[w]) for (v, w) in zip(sg.src[order], sg.dst[order])] == list(old_edges)
+    if sys.version_info[0] == 2:
+        assert list(order) != list(range(len(order)))
+
+
+def synthetic_overlaps(seed=5, n_reads=120, genome=150000):
+    """Overlaps of reads tiling a genome, plus a few repeat-induced ones.
+    """
+    import random
+    rng = random.Random(seed)
+    reads = sorted((rng.randint(0, genome), rng.randint(8000, 14000)) for _ in range(n_reads))
+    lines = []
+
+    def line(q, t, qs, qe, ts, te):
+        (ql, tl) = (reads[q][1], reads[t][1])
+        lines.append('%09d %09d %d 99.00 0 %d %d %d 0 %d %d %d overlap' % (
+            q, t, -(qe - qs), qs, qe, ql, ts, te, tl))
+    for i in range(n_reads):
+        for j in range(i + 1, n_reads):
+            (si, li), (sj, lj) = reads[i], reads[j]
+            ovl = si + li - sj
+            if ovl < 3000:
+                break
+            if sj + lj <= si + li:
+                continue
+            line(i, j, sj - si, li, 0, ovl)
+            line(j, i, 0, ovl, sj - si, li)
+    for _ in range(6):
+        i, j = rng.randint(0, n_reads - 1), rng.randint(0, n_reads - 1)
+        if i != j:
+            line(i, j, reads[i][1] - 4000, reads[i][1], 0, 4000)
+            line(j, i, 0, 4000, reads[i][1] - 4000, reads[i][1])
+    return '\n'.join(lines) + '\n-\n'
+
+
+def test_native_graphs_like_networkx(tmpdir, monkeypatch):
+    """The unitig graphs of falcon_kit.unitig_graph give the same assembly as networkx.
+    """
+    ovl_fn = str(tmpdir.join('preads.ovl'))
+    with open(ovl_fn, 'w') as f:
+        f.write(synthetic_overlaps())
+    outputs = []
+    for opts in ([], ['--networkx']):
+        run_dir = tmpdir.mkdir('run{}'.format(len(outputs)))
+        monkeypatch.chdir(run_dir)
+        mod.main(['prog', '--overlap-file', ovl_fn, '--min_len', '5000'] + opts)
+        outputs.append([run_dir.join(fn).read() for fn in ('utg_data', 'c_path', 'ctg_paths')])
+    assert 'compound' in outputs[0][0]
+    assert outputs[0] == outputs[1]
+
+
+def test_ego_graph_view():
+    """EgoGraph has the nodes and the edge order of networkx's ego graph.
+    """
+    import networkx as nx
+    import random
+    rng = random.Random(3)
+    ug = nx.MultiDiGraph()
+    nodes = ['%09d:B' % i for i in range(200)]
+    for _ in range(600):
+        ug.add_edge(rng.choice(nodes), rng.choice(nodes), key=rng.choice(nodes))
+    cache = mod.BundleCache()
+    for start in rng.sample(nodes, 20):
+        expected = nx.ego_graph(ug, start, 3)
+        got = mod.EgoGraph(ug, start, 3, cache)
+        assert [n for n in nodes if got.has_node(n)] == [n for n in nodes if n in expected]
+        for n in expected.nodes():
+            assert got.ordered_in_edges(n) == expected.in_edges(n, keys=True)
+            if nx.shortest_path_length(ug, start, n) < 3:
+                assert got.out_edges(n) == expected.out_edges(n, keys=True)
+
+
+def test_find_bundle():
+    """A bubble s->{a,b}->t is a bundle, whichever of its equal-scoring edges into t wins.
+    """
+    ug = mod.unitig_graph.MultiDiGraph()
+    u_edge_data = {}
+    (s, a, b, t, x) = ('1:E', '2:E', '3:E', '4:E', '5:E')
+    for (u, w, k) in ((s, a, '6:E'), (s, b, '7:E'), (a, t, '8:E'), (b, t, '9:E'), (t, x, '10:E')):
+        ug.add_edge(u, w, key=k)
+        u_edge_data[(u, w, k)] = (1000, 500, [u, k, w], 'simple')
+    cache = mod.BundleCache()
+    coverage, data, data_r = mod.find_bundle(ug, u_edge_data, '1:E', 48, 16, 500000, cache)
+    assert coverage
+    start_node, end_node, bundle_edges, length, score, depth = data
+    assert (start_node, end_node, length, score) == ('1:E', '4:E', 2000, 1000)
+    assert len(bundle_edges) == 4
+    assert cache.n_tie_breaks == 1
+
+
+def test_overlap_store(tmpdir):
+    """The parsed overlaps are stored once per overlap file, and read back the same.
+    """
+    ovl_fn = str(tmpdir.join('preads.ovl'))
+    with open(ovl_fn, 'w') as f:
+        f.write(synthetic_overlaps())
+    cache_dir = str(tmpdir.join('cache'))
+    expected = mod.read_overlaps(ovl_fn, 9000, 96.0)
+    for _ in range(2):
+        got = mod.read_overlaps(ovl_fn, 9000, 96.0, cache_dir)
+        assert got[0].tolist() == expected[0].tolist()
+        assert list(got[1].ids()) == list(expected[1].ids())
+        assert got[2] == expected[2]
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+
+def test_sweep(tmpdir, monkeypatch):
+    """Each parameter set of a sweep gives what a run with it alone gives.
+    """
+    ovl_fn = str(tmpdir.join('preads.ovl'))
+    with open(ovl_fn, 'w') as f:
+        f.write(synthetic_overlaps())
+    tmpdir.join('sweep').write('--min_len 5000\n\n--min_len 9000 --lfc\n')
+    monkeypatch.chdir(tmpdir)
+    mod.main(['prog', '--overlap-file', ovl_fn, '--sweep', 'sweep'])
+    stats = tmpdir.join('sweep_stats').read().splitlines()
+    assert [line.split()[0] for line in stats] == ['run', 'sweep.0', 'sweep.1']
+    assert stats[2].endswith('--min_len 9000 --lfc')
+    run_dir = tmpdir.mkdir('alone')
+    monkeypatch.chdir(run_dir)
+    mod.main(['prog', '--overlap-file', ovl_fn, '--min_len', '9000', '--lfc'])
+    assert run_dir.join('ctg_paths').read() == tmpdir.join('sweep.1', 'ctg_paths').read()
@@ -1,7 +1,10 @@
 
 
+from __future__ import division
 import falcon_kit.stats_preassembly as M
 import helpers
+import numpy as np
+import random
 
 
 def test_stats_from_sorted_readlengths():
@@ -51,3 +54,43 @@ def test_stats_dict():
         'seed_esize': 0.0,
     }
     helpers.equal_dict(result, expected)
+
+
+def test_stats_like_python():
+    """The same as the sums over Python lists they replace.
+    """
+    rng = random.Random(5)
+    read_lens = sorted(rng.randint(1, 50000) for _ in range(1000))
+    total = sum(read_lens)
+    stats = M.stats_from_sorted_readlengths(read_lens)
+    assert stats.total == total
+    assert stats.esize == sum(r * r for r in read_lens) / total
+    subtotal = 0
+    for rl in reversed(read_lens):
+        subtotal += rl
+        if subtotal >= total // 2:
+            break
+    assert stats.n50 == rl
+    assert M.read_len_above(read_lens, total + 1) is None
+    assert M.cutoff_reads(read_lens, 25000).tolist() == [rl for rl in read_lens if rl >= 25000]
+
+
+def test_read_lens_from_fofn(tmpdir):
+    fns = []
+    for (i, content) in enumerate(('>a\nACGT\nAC\n>b\nA\n', '>c x\nACG\n>d\n\n')):
+        fn = tmpdir.join('{}.fa'.format(i))
+        fn.write(content)
+        fns.append(str(fn))
+    fofn = tmpdir.join('input.fofn')
+    fofn.write('\n'.join(fns) + '\n')
+    for n_core in (0, 2):
+        assert M.read_lens_from_fofn(str(fofn), n_core).tolist() == [0, 1, 3, 6]
+
+
+def test_sorted_readlengths_from_histograms():
+    rng = np.random.RandomState(7)
+    for k in (0, 1, 2, 5):
+        arrays = [rng.randint(0, 100, size=rng.randint(0, 50)) for _ in range(k)]
+        expected = np.sort(np.concatenate(arrays or [np.zeros(0, dtype=np.int64)]))
+        got = M.sorted_readlengths_from_histograms(np.bincount(a) for a in arrays)
+        assert got.tolist() == expected.tolist()
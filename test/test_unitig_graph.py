@@ -0,0 +1,72 @@
+import falcon_kit.unitig_graph as mod
+import networkx as nx
+import pytest
+import random
+
+
+def random_edges(rng, n_nodes, n_edges):
+    nodes = ['%09d:%s' % (rng.randint(0, n_nodes), rng.choice('BE')) for _ in range(n_edges)]
+    return [(u, rng.choice(nodes), rng.choice(nodes)) for u in nodes]
+
+
+def same_multigraph(G, H):
+    assert G.nodes() == H.nodes()
+    assert G.edges(keys=True) == H.edges(keys=True)
+    for n in G.nodes():
+        assert G.out_edges(n, keys=True) == H.out_edges(n, keys=True)
+        assert G.in_edges(n, keys=True) == H.in_edges(n, keys=True)
+        assert G.in_edges(n) == H.in_edges(n)
+        assert G.in_degree(n) == H.in_degree(n)
+        assert G.out_degree(n) == H.out_degree(n)
+
+
+def test_multigraph_like_networkx():
+    """The same edits give the same nodes and edges in the same order as
+    networkx, through copies, ego graphs and shortest paths.
+    """
+    rng = random.Random(11)
+    edges = random_edges(rng, 300, 1500)
+    expected = nx.MultiDiGraph()
+    got = mod.MultiDiGraph()
+    for (u, v, key) in edges:
+        expected.add_edge(u, v, key=key, length=1)
+        got.add_edge(u, v, key=key, length=1)
+    same_multigraph(expected, got)
+    for (u, v, key) in rng.sample(edges, 500):
+        try:
+            expected.remove_edge(u, v, key=key)
+        except nx.NetworkXError:
+            continue
+        got.remove_edge(u, v, key=key)
+    expected = expected.copy()
+    got = got.copy()
+    same_multigraph(expected, got)
+    for n in rng.sample(got.nodes(), 50):
+        ego = mod.ego_graph(got, n, radius=3)
+        same_multigraph(nx.ego_graph(expected, n, radius=3), ego)
+        for m in ego.nodes():
+            assert mod.shortest_path(got, n, m) == nx.shortest_path(expected, n, m)
+
+
+def test_digraph_like_networkx():
+    rng = random.Random(13)
+    expected = nx.DiGraph()
+    got = mod.DiGraph()
+    for (u, v, _) in random_edges(rng, 300, 1500):
+        expected.add_edge(u, v, label='x')
+        got.add_edge(u, v, label='x')
+    assert expected.nodes() == got.nodes()
+    assert expected.edges() == got.edges()
+    for n in got.nodes():
+        assert expected.in_edges(n) == got.in_edges(n)
+        assert expected.out_edges(n) == got.out_edges(n)
+
+
+def test_remove_missing_edge():
+    G = mod.MultiDiGraph()
+    G.add_edge('1:B', '2:B', key='3:B')
+    with pytest.raises(KeyError):
+        G.remove_edge('1:B', '2:B', key='4:B')
+    G.remove_edge('1:B', '2:B', key='3:B')
+    assert G.edges(keys=True) == []
+    assert sorted(G.nodes()) == ['1:B', '2:B']
@@ -20,7 +20,8 @@ def test_io_se1331():
 
 
 @pytest.mark.parametrize('Context',
-        [M.CapturedProcessReaderContext, M.StreamedProcessReaderContext])
+        [M.CapturedProcessReaderContext, M.StreamedProcessReaderContext,
+         M.BufferedProcessReaderContext])
 def test_str_type(Context):
     cmd = 'seq 2'
     reader = Context(cmd)
@@ -28,3 +29,19 @@ def test_str_type(Context):
         lines = list(reader.readlines())
         assert isinstance(lines[0], str)
         assert lines == ['1', '2']
+
+
+@pytest.mark.parametrize('bufsize', [1, 2, 3, 100])
+def test_buffered_blocks(bufsize):
+    cmd = 'seq 12'
+    reader = M.BufferedProcessReaderContext(cmd, bufsize)
+    with reader:
+        lines = list(reader.readlines())
+    assert lines == [str(i) for i in range(1, 13)]
+
+
+def test_buffered_failure():
+    reader = M.BufferedProcessReaderContext('false')
+    with pytest.raises(Exception):
+        with reader:
+            list(reader.readlines())
@@ -0,0 +1,22 @@
+import falcon_kit.util.seq as M
+import random
+
+RCMAP = dict(zip("ACGTacgtNn-", "TGCAtgcaNn-"))
+
+
+def test_revcomp():
+    assert M.revcomp('ACGTNacgtn-') == '-nacgtNACGT'
+    assert M.revcomp(b'AACG') == b'CGTT'
+    assert M.revcomp(u'AACG') == u'CGTT'
+    assert M.revcomp('') == ''
+    # Anything else is kept, not complemented.
+    assert M.complement('AxRy') == 'TxRy'
+
+
+def test_revcomp_like_rcmap():
+    """Same as the per-base dict lookup it replaces.
+    """
+    rng = random.Random(3)
+    seq = ''.join(rng.choice('ACGTacgtNn-') for _ in range(10000))
+    assert M.revcomp(seq) == ''.join([RCMAP[c] for c in seq[::-1]])
+    assert M.revcomp(M.revcomp(seq)) == seq